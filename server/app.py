@@ -1,6 +1,13 @@
 from flask import Flask
 from flask_cors import CORS
-from db import get_db_connection
+from db import get_db_connection, pool
+import metrics
+import slowlog
+import migrate
+import fastjson
+import httpcache
+import feed
+import ratelimit
 
 
 from routes.auth import auth_bp
@@ -8,10 +15,15 @@ from routes.user import user_bp
 from routes.product import product_bp  
 from routes.order import order_bp
 from routes.interactions import interaction_bp
-from routes.file import file_bp
+from routes.file import file_bp, static_bp, MAX_REQUEST_SIZE
 
-app = Flask(__name__)
+# 静态上传文件由 static_bp 提供 (ETag / Range / 长缓存)，关闭 Flask 默认的 static 路由
+app = Flask(__name__, static_folder=None)
 CORS(app)
+# 请求体上限: 超过时 Werkzeug 直接返回 413，不会先把整个请求体读进内存 / 临时文件
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_SIZE
+# jsonify 使用 fastjson 编码 (orjson 可用时)，datetime / Decimal 无需在路由里逐行转换
+fastjson.init_app(app)
 
 app.register_blueprint(auth_bp, url_prefix='/api')
 app.register_blueprint(user_bp, url_prefix='/api')
@@ -19,6 +31,16 @@ app.register_blueprint(product_bp, url_prefix='/api')
 app.register_blueprint(order_bp, url_prefix='/api')
 app.register_blueprint(interaction_bp, url_prefix='/api')
 app.register_blueprint(file_bp, url_prefix='/api')
+app.register_blueprint(static_bp)
+
+# 请求耗时/状态码/SQL 次数统计，Prometheus 从 /metrics 抓取
+metrics.init_app(app)
+# 按用户 / IP 限流与数据库并发上限，在耗时统计之后注册，被拒绝的请求也计入 429
+ratelimit.init_app(app)
+# 慢查询日志，按 SQL 指纹聚合，GET /metrics/slow_queries 查看
+slowlog.init_app(app)
+# 响应压缩 (br / gzip)；最后注册的 after_request 最先执行，上面的耗时统计包含压缩时间
+httpcache.init_app(app)
 
 
 if __name__ == "__main__":
@@ -26,7 +48,18 @@ if __name__ == "__main__":
         conn = get_db_connection()
         print("✅ 数据库连接成功")
         conn.close()
+        pool.warm()
+        print(f"✅ 连接池已就绪: {pool.stats()}")
     except Exception as e:
         print("❌ 数据库连接失败:", e)
+    else:
+        if migrate.AUTO_MIGRATE:
+            try:
+                migrate.apply_migrations()
+            except Exception as e:
+                print("❌ 数据库迁移失败:", e)
+        # 个性化首页的后台刷新 (BUAADB_FEED_JOB=0 时关闭，改由 python feed.py refresh 定时执行)
+        if feed.FEED_CONFIG['enabled']:
+            feed.feed_job.start()
         
     app.run(port=5000, debug=True)
\ No newline at end of file
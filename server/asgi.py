@@ -0,0 +1,227 @@
+"""异步服务模式: uvicorn asgi:app --port 5000
+
+热点只读接口由协程直接处理，通过 aiomysql 连接池访问数据库，等待 IO 时不占用线程；
+其余 /api 接口原样转交给 Flask 应用 (在线程池中执行)，对外暴露的路由与同步模式完全一致。
+缓存与 ETag 共用同步模式的实现，Redis 后端的读写经 product_cache.arun 放到线程池，不阻塞事件循环。
+同步模式 (python app.py) 不受影响。
+"""
+import asyncio
+import re
+from urllib.parse import parse_qsl
+
+import aiomysql
+from asgiref.wsgi import WsgiToAsgi
+
+import fastjson
+import feed
+import httpcache
+import migrate
+from ratelimit import RATE_LIMIT_CONFIG, rate_limiter
+from app import app as flask_app
+from db import DB_CONFIG
+from cache import product_cache
+from similar import SIMILAR_SQL, SIMILAR_LIMIT
+from routes.product import (CATEGORIES_SQL, PRODUCT_DETAIL_SQL, parse_product_page_args,
+                            product_page_query, product_page_result, product_detail_result,
+                            similar_result, similar_cache_key, categories_etag, products_etag, product_etag)
+from routes.user import TARGET_USER_SQL, target_user_result, target_user_etag
+
+ASYNC_POOL_CONFIG = {
+    'minsize': 5,
+    'maxsize': 100,
+    'pool_recycle': 3600,
+}
+
+pool = None
+wsgi_app = WsgiToAsgi(flask_app)
+
+
+class AsyncAdmissionGate:
+    """协程版的数据库并发上限 (与 ratelimit 中线程版的 db_gate 对应): 名额用完时最多排队 max_waiting 个，
+    排队超过 wait_timeout 秒返回 False，不让请求在 aiomysql 连接池上无限等待"""
+
+    def __init__(self, concurrency, max_waiting, wait_timeout):
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def acquire(self):
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            return True
+        if self.waiting >= self.max_waiting:
+            self.rejected += 1
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.wait_timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+        finally:
+            self.waiting -= 1
+
+    def release(self):
+        self._semaphore.release()
+
+
+db_gate = AsyncAdmissionGate(ASYNC_POOL_CONFIG['maxsize'], ASYNC_POOL_CONFIG['maxsize'],
+                             RATE_LIMIT_CONFIG['wait_timeout'])
+
+
+async def fetch(sql, params=(), one=False):
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(sql, params)
+            if one:
+                return await cursor.fetchone()
+            return await cursor.fetchall()
+
+
+async def get_categories(query):
+    categories = await fetch(CATEGORIES_SQL)
+    return {"categories": list(categories), "message": "获取成功"}, 200
+
+
+async def get_products(query):
+    parsed = await product_cache.arun(parse_product_page_args, query)
+    if isinstance(parsed, str):
+        return {"message": parsed}, 400
+    statuses, after, limit, key = parsed
+
+    async def load():
+        return product_page_result(list(await fetch(*product_page_query(statuses, after, limit))), limit)
+
+    page = await product_cache.aget_or_load(key, load)
+    return {**page, "message": "获取成功"}, 200
+
+
+async def get_product_detail(query, product_id):
+    async def load():
+        return product_detail_result(await fetch(PRODUCT_DETAIL_SQL, (product_id,), one=True))
+
+    async def load_similar():
+        return similar_result(await fetch(SIMILAR_SQL, (product_id, SIMILAR_LIMIT)))
+
+    data = await product_cache.aget_or_load(f"product:{product_id}", load)
+    if not data:
+        return {"message": "商品不存在"}, 404
+    similar_key = await product_cache.arun(similar_cache_key, product_id)
+    similar = await product_cache.aget_or_load(similar_key, load_similar)
+    return {**data, "similar": similar}, 200
+
+
+async def get_target_user_info(query, target_id):
+    user = await fetch(TARGET_USER_SQL, (target_id,), one=True)
+    if not user:
+        return {"message": "用户不存在"}, 404
+    return target_user_result(user), 200
+
+
+# 只接管 GET 请求，路径参数按正则分组依次传入 handler 和 ETag 函数 (与同步模式共用)
+# 最后一项为同步模式下的 endpoint 名，限流预算与同步模式共用同一个令牌桶
+ASYNC_ROUTES = [
+    (re.compile(r"^/api/get_categories$"), get_categories, categories_etag, "product.get_categories"),
+    (re.compile(r"^/api/get_products$"), get_products, products_etag, "product.get_products"),
+    (re.compile(r"^/api/product/([^/]+)$"), get_product_detail, product_etag, "product.get_product_detail"),
+    (re.compile(r"^/api/user/([^/]+)$"), get_target_user_info, target_user_etag, "user.get_target_user_info"),
+]
+
+
+async def send_json(send, status, body, etag=None, accept_encoding=None, retry_after=None):
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"access-control-allow-origin", b"*"),
+    ]
+    if retry_after is not None:
+        headers.append((b"retry-after", str(retry_after).encode("ascii")))
+    payload = b""
+    if status == 200 or status == 304:
+        headers.append((b"vary", b"Accept-Encoding"))
+        if etag:
+            headers += [(b"etag", etag.encode("ascii")), (b"cache-control", b"no-cache")]
+    if status != 304:
+        payload = fastjson.dumps(body)
+        encoding = httpcache.choose_encoding(accept_encoding) if status == 200 else None
+        if encoding and len(payload) >= httpcache.COMPRESS_CONFIG['min_size']:
+            payload = httpcache.compress(payload, encoding)
+            headers.append((b"content-encoding", encoding.encode("ascii")))
+        headers.append((b"content-length", str(len(payload)).encode("ascii")))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": payload})
+
+
+async def lifespan(receive, send):
+    global pool
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                if migrate.AUTO_MIGRATE:
+                    migrate.apply_migrations()
+                if feed.FEED_CONFIG['enabled']:
+                    feed.feed_job.start()
+                pool = await aiomysql.create_pool(
+                    host=DB_CONFIG['host'], port=DB_CONFIG['port'],
+                    user=DB_CONFIG['user'], password=DB_CONFIG['password'],
+                    db=DB_CONFIG['database'], charset=DB_CONFIG['charset'],
+                    autocommit=True, **ASYNC_POOL_CONFIG)
+                print("✅ 异步连接池已就绪")
+                await send({"type": "lifespan.startup.complete"})
+            except Exception as e:
+                print("❌ 数据库连接失败:", e)
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+        elif message["type"] == "lifespan.shutdown":
+            feed.feed_job.stop()
+            if pool is not None:
+                pool.close()
+                await pool.wait_closed()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+
+    if scope["type"] == "http" and scope["method"] == "GET":
+        for pattern, handler, etag_of, endpoint in ASYNC_ROUTES:
+            match = pattern.match(scope["path"])
+            if not match:
+                continue
+            headers = dict(scope["headers"])
+            accept_encoding = headers.get(b"accept-encoding", b"").decode("latin-1")
+
+            limited = RATE_LIMIT_CONFIG['enabled']
+            client_ip = (scope.get("client") or ("",))[0]
+            if limited and client_ip not in RATE_LIMIT_CONFIG['trusted']:
+                retry_after = await rate_limiter.acheck(endpoint, headers.get(b"authorization", b"").decode("latin-1"),
+                                                        client_ip)
+                if retry_after is not None:
+                    return await send_json(send, 429, {"message": "请求过于频繁，请稍后重试"}, retry_after=retry_after)
+            etag = None
+            if httpcache.ETAG_ENABLED:
+                try:
+                    etag = await product_cache.arun(etag_of, *match.groups())
+                except Exception as e:
+                    print(f"[ERROR] 读取版本号失败: {e}")
+            if etag and httpcache.etag_matches(headers.get(b"if-none-match", b"").decode("latin-1"), etag):
+                return await send_json(send, 304, None, etag)
+
+            if limited and not await db_gate.acquire():
+                return await send_json(send, 429, {"message": "服务器繁忙，请稍后重试"}, retry_after=1)
+            query = dict(parse_qsl(scope["query_string"].decode("utf-8", "replace")))
+            try:
+                body, status = await handler(query, *match.groups())
+            except Exception as e:
+                print(f"[ERROR] {scope['path']} 处理失败: {e}")
+                body, status = {"message": "服务器内部错误"}, 500
+            finally:
+                if limited:
+                    db_gate.release()
+            return await send_json(send, status, body, etag, accept_encoding)
+
+    return await wsgi_app(scope, receive, send)
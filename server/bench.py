@@ -0,0 +1,318 @@
+"""后端性能基准脚本，不依赖 MySQL，用法: python bench.py <名称> [参数]"""
+import argparse
+import random
+import sqlite3
+import statistics
+import time
+
+WORDS = ["二手", "手机", "教材", "高数", "耳机", "键盘", "自行车", "台灯", "书架", "显示器",
+         "iPhone", "iPad", "Switch", "考研", "英语", "九成新", "全新", "包邮", "宿舍", "运动"]
+
+
+def make_vocabulary(rng, size=5000):
+    # 常用词 + 随机汉字组成的词，按 Zipf 分布取词，接近真实标题的词频
+    vocab = list(WORDS)
+    while len(vocab) < size:
+        vocab.append("".join(chr(0x4e00 + rng.randrange(3000)) for _ in range(rng.choice((2, 3)))))
+    weights = [1 / (rank + 1) for rank in range(len(vocab))]
+    return vocab, weights
+
+
+def random_text(rng, vocab, n):
+    return "".join(rng.choices(vocab[0], vocab[1], k=n))
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{name:<28} p50={statistics.median(samples):8.3f}ms  p99={p99:8.3f}ms")
+
+
+def bench_search(args):
+    from search import SearchIndex
+
+    rng = random.Random(0)
+    vocab = make_vocabulary(rng)
+    rows = [(f"{i:032x}", random_text(rng, vocab, 3), random_text(rng, vocab, 12)) for i in range(args.rows)]
+    queries = ["手机", "教材 高数", "iPhone 九成新", "考研 英语 包邮", vocab[0][500], vocab[0][3000]]
+
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE products (product_id TEXT PRIMARY KEY, product_title TEXT, description TEXT)")
+    db.executemany("INSERT INTO products VALUES (?, ?, ?)", rows)
+
+    def like(q):
+        # 原实现: 整个关键词做前后通配匹配，按发布时间排序返回全部结果
+        pattern = f"%{q}%"
+        db.execute("SELECT product_id FROM products WHERE product_title LIKE ? OR description LIKE ? "
+                   "ORDER BY product_id DESC", (pattern, pattern)).fetchall()
+
+    start = time.perf_counter()
+    index = SearchIndex()
+    index.build(rows)
+    print(f"{args.rows} 个商品，建索引耗时 {time.perf_counter() - start:.2f}s")
+
+    for q in queries:
+        report(f"LIKE  {q}", timed(lambda: like(q), args.repeat))
+        report(f"BM25  {q}", timed(lambda: index.search(q), args.repeat))
+
+
+def bench_token(args):
+    import secrets as _secrets
+    from utils import generate_token, verify_token, revoke_token
+
+    # 旧实现: 进程内 dict 查找
+    store = {}
+    for i in range(args.rows):
+        store[_secrets.token_urlsafe(32)] = {"user_name": f"user{i}", "expire": time.time() + 3600}
+    old_token = next(iter(store))
+
+    def dict_verify():
+        data = store.get(old_token)
+        return data and time.time() <= data["expire"] and data["user_name"]
+
+    token = generate_token("bench_user")
+    revoke_token(generate_token("bench_user"))
+    n = 100000
+    for name, fn in (("dict lookup", dict_verify), ("hmac verify", lambda: verify_token(token))):
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        print(f"{name:<16} {(time.perf_counter() - start) / n * 1e6:.2f}us/次")
+
+
+def bench_metrics(args):
+    # 每个请求的埋点开销: 1 次请求直方图 + 5 条 SQL 的计时回调，对比不挂 hook 的游标
+    import db
+    from metrics import Metrics
+
+    class FakeCursor:
+        def execute(self, query, args=None):
+            return 1
+
+    m = Metrics()
+    cursor = db.TimedCursor(FakeCursor())
+    n = 100000
+
+    def plain_request():
+        for _ in range(5):
+            cursor.execute("SELECT 1")
+
+    def instrumented_request():
+        start = time.perf_counter()
+        for _ in range(5):
+            cursor.execute("SELECT 1")
+        m.observe_request("product.get_products", "GET", 200, time.perf_counter() - start, 5)
+
+    hook = lambda sql, params, seconds: m.observe_query("product.get_products", seconds)
+    for name, fn, hooks in (("no hooks", plain_request, []), ("instrumented", instrumented_request, [hook])):
+        db.query_hooks[:] = hooks
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        print(f"{name:<16} {(time.perf_counter() - start) / n * 1e6:.2f}us/请求")
+    db.query_hooks[:] = []
+    start = time.perf_counter()
+    m.render()
+    print(f"render /metrics  {(time.perf_counter() - start) * 1000:.2f}ms")
+
+
+def product_rows(n):
+    # 模拟 PRODUCT_SELECT 的结果行 (DictCursor)，逐行生成
+    import datetime
+    from decimal import Decimal
+
+    rng = random.Random(0)
+    now = datetime.datetime(2025, 1, 1)
+    for i in range(n):
+        yield {
+            "product_id": f"{i:032x}", "product_title": f"商品 {i}", "price": Decimal(f"{rng.randint(1, 99999)}.50"),
+            "img_url": f"http://127.0.0.1:5000/static/uploads/{i:032x}.png", "description": "九成新 自提" * 5,
+            "category_id": None, "owner_id": f"user{i % 100}", "seller_name": f"卖家{i % 100}", "seller_avatar": None,
+            "create_time": now - datetime.timedelta(minutes=i), "update_time": now, "status": "active",
+        }
+
+
+def bench_json(args):
+    # 10k 行商品列表的编码耗时: 原实现 (逐行 str/float + Flask 默认 json) 对比 fastjson
+    import json
+
+    import fastjson
+    from routes.product import product_from_row
+
+    rows = list(product_rows(10000))
+
+    def legacy():
+        products = [{
+            "id": p["product_id"], "name": p["product_title"], "price": float(p["price"]),
+            "image_url": p["img_url"], "description": p["description"], "category_id": p.get("category_id"),
+            "seller_id": p["owner_id"], "seller_name": p["seller_name"], "seller_avatar": p["seller_avatar"],
+            "created_at": str(p["create_time"]), "status": p["status"],
+        } for p in rows]
+        # Flask 默认 provider: ensure_ascii + sort_keys
+        return json.dumps({"products": products}, ensure_ascii=True, sort_keys=True).encode("utf-8")
+
+    def fast():
+        return fastjson.dumps({"products": [product_from_row(p) for p in rows]})
+
+    def fast_stdlib():
+        return fastjson._std_dumps({"products": [product_from_row(p) for p in rows]})
+
+    assert json.loads(legacy()) == json.loads(fast()) == json.loads(fast_stdlib())
+    print(f"10000 行, 编码器 {fastjson.ENCODER}")
+    report("legacy (str/float + json)", timed(legacy, args.repeat))
+    report("projector + stdlib json", timed(fast_stdlib, args.repeat))
+    report(f"projector + {fastjson.ENCODER}", timed(fast, args.repeat))
+
+
+def bench_stream(args):
+    # 大结果集的内存峰值: 一次性构造再编码 对比 stream_json 逐行输出 (服务端游标同样逐行给出结果)
+    import tracemalloc
+
+    import fastjson
+    from routes.product import product_from_row
+    from utils import KeysetPage
+
+    def buffered():
+        rows = list(product_rows(args.rows))
+        return [len(fastjson.dumps({"products": [product_from_row(p) for p in rows], "message": "获取成功"}))]
+
+    def streamed():
+        page = KeysetPage(product_rows(args.rows + 1), args.rows, lambda p: (p["create_time"], p["product_id"]))
+        return [len(chunk) for chunk in fastjson.stream_json(
+            "products", page, project=product_from_row, head={"message": "获取成功"},
+            tail=lambda: {"next_cursor": page.next_cursor})]
+
+    for name, fn in (("buffered", buffered), ("stream", streamed)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        size = sum(fn())
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{name:<10} {args.rows} 行 {size / 1024 / 1024:.1f}MB, 耗时 {elapsed:.2f}s, 内存峰值 {peak / 1024 / 1024:.1f}MB")
+
+
+def bench_compress(args):
+    # 商品列表各页长的响应体积与压缩耗时，以及 If-None-Match 命中时 (只读版本号，不查库不编码) 的耗时
+    import fastjson
+    import httpcache
+    from routes.product import product_page_result, products_etag
+
+    for limit in (20, 100, 1000):
+        body = fastjson.dumps({**product_page_result(list(product_rows(limit + 1)), limit), "message": "获取成功"})
+        print(f"limit={limit}: 原始 {len(body) / 1024:.1f}KB")
+        for encoding in httpcache.ENCODINGS:
+            size = len(httpcache.compress(body, encoding))
+            samples = timed(lambda: httpcache.compress(body, encoding), args.repeat)
+            report(f"  {encoding:<5} {size / 1024:7.1f}KB ({size / len(body):4.0%})", samples)
+    if "br" not in httpcache.ENCODINGS:
+        print("未安装 brotli，只测试 gzip")
+
+    rows = list(product_rows(21))
+    etag = products_etag()
+    report("304 (版本号 + 比较)", timed(lambda: httpcache.etag_matches(etag, products_etag()), args.repeat))
+    report("200 (limit=20 整理 + 编码)", timed(
+        lambda: fastjson.dumps({**product_page_result(rows, 20), "message": "获取成功"}), args.repeat))
+
+
+async def _http_get(reader, writer, host, path, headers=""):
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n{headers}\r\n".encode())
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    headers = {}
+    for line in head.split(b"\r\n")[1:]:
+        if b":" in line:
+            name, value = line.split(b":", 1)
+            headers[name.strip().lower()] = value.strip()
+    received = 0
+    if b"content-length" in headers:
+        received = len(await reader.readexactly(int(headers[b"content-length"])))
+    elif headers.get(b"transfer-encoding") == b"chunked":
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            received += size
+            if size == 0:
+                break
+    return status, received, headers.get(b"connection") == b"close" or head.startswith(b"HTTP/1.0")
+
+
+def bench_http(args):
+    # 闭环压测: concurrency 个客户端各自保持长连接，循环请求同一个 URL
+    # 服务端 CPU 可同时用 pidstat / time 观察，除以请求数即为每请求 CPU
+    # --header 可重复，例如 "Accept-Encoding: br, gzip" 或 'If-None-Match: W/"products-..."'
+    import asyncio
+    from urllib.parse import urlsplit
+
+    url = urlsplit(args.url)
+    path = url.path + (f"?{url.query}" if url.query else "")
+    extra_headers = "".join(f"{h}\r\n" for h in args.header)
+    per_client = max(1, args.requests // args.concurrency)
+    latencies, errors, total_bytes = [], 0, 0
+
+    async def client():
+        nonlocal errors, total_bytes
+        reader = writer = None
+        for _ in range(per_client):
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+                start = time.perf_counter()
+                status, received, closed = await _http_get(reader, writer, url.netloc, path, extra_headers)
+                latencies.append((time.perf_counter() - start) * 1000)
+                total_bytes += received
+                if status >= 500:
+                    errors += 1
+                if closed:
+                    writer.close()
+                    writer = None
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                errors += 1
+                writer = None
+        if writer is not None:
+            writer.close()
+
+    async def main():
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(args.concurrency)))
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(main())
+    print(f"{args.url} 并发 {args.concurrency}: {len(latencies) / elapsed:.1f} req/s, "
+          f"{total_bytes / elapsed / 1024 / 1024:.1f} MB/s, 错误 {errors}")
+    if latencies:
+        report("latency", latencies)
+
+
+BENCHES = {
+    "search": bench_search,
+    "token": bench_token,
+    "http": bench_http,
+    "metrics": bench_metrics,
+    "json": bench_json,
+    "stream": bench_stream,
+    "compress": bench_compress,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("name", choices=sorted(BENCHES))
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--url", default="http://127.0.0.1:5000/api/get_products")
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--header", action="append", default=[], help="http: 附加请求头")
+    args = parser.parse_args()
+    BENCHES[args.name](args)
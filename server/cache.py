@@ -0,0 +1,194 @@
+import asyncio
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+import fastjson
+
+# backend: memory 为进程内 LRU；redis 为多进程共享 (任何 Redis 协议兼容的服务均可)
+CACHE_CONFIG = {
+    'backend': os.environ.get("BUAADB_CACHE_BACKEND", "memory"),
+    'redis_url': os.environ.get("BUAADB_REDIS_URL", "redis://127.0.0.1:6379/0"),
+    'max_entries': 2048,
+    'ttl': 60,
+    # 服务进程数 (uvicorn --workers 同样读取 WEB_CONCURRENCY)；memory 后端多进程时不提供 ETag，见 httpcache
+    'workers': int(os.environ.get("BUAADB_WORKERS", os.environ.get("WEB_CONCURRENCY", 1))),
+}
+
+
+class MemoryBackend:
+    """进程内 LRU，条目带过期时间"""
+
+    blocking = False    # 操作只在内存中完成，事件循环中可以直接调用
+    shared = False      # 数据与版本号只在本进程内可见
+
+    def __init__(self, max_entries=2048, epoch_seconds=60):
+        self.max_entries = max_entries
+        self.epoch_seconds = epoch_seconds
+        self._data = OrderedDict()   # key -> (expire_at, value)
+        self._counters = {}          # 版本号单独存放，不参与 LRU 淘汰
+        self._token = secrets.token_hex(4)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def get_counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def epoch(self):
+        # 计数器只在本进程内有效: 进程重启后换新标识，按 TTL 周期轮换；
+        # 多 worker 时彼此看不到对方的写操作，httpcache 因此只在单进程时使用 ETag
+        return f"{self._token}{int(time.time() // self.epoch_seconds):x}"
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisBackend:
+    """通过 Redis 协议在多个 worker 之间共享缓存，值以 JSON 存储 (时间、价格按接口格式编码)"""
+
+    blocking = True     # 同步客户端，每次操作一个网络往返
+    shared = True
+
+    def __init__(self, url):
+        import redis
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._client.get(key)
+        return None if raw is None else fastjson.loads(raw)
+
+    def set(self, key, value, ttl):
+        self._client.set(key, fastjson.dumps(value), ex=ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self._client.delete(*keys)
+
+    def get_counter(self, key):
+        raw = self._client.get(key)
+        return int(raw) if raw is not None else 0
+
+    def incr(self, key):
+        return self._client.incr(key)
+
+    def epoch(self):
+        # Redis 被清空后计数器从 0 重新开始，换一个新标识避免与清空前的版本号混淆
+        raw = self._client.get("epoch")
+        if raw is None:
+            self._client.set("epoch", secrets.token_hex(4), nx=True)
+            raw = self._client.get("epoch")
+        return raw.decode("ascii")
+
+    def __len__(self):
+        return self._client.dbsize()
+
+
+class ReadThroughCache:
+    def __init__(self, backend, ttl=60):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def get_or_load(self, key, loader):
+        # loader 返回 None 表示数据不存在，不写入缓存
+        value = self._lookup(key)
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.backend.set(key, value, self.ttl)
+        return value
+
+    async def arun(self, fn, *args):
+        """异步服务模式中调用会访问 backend 的同步函数 (版本号、ETag、缓存 key 等):
+        backend 是阻塞的网络客户端时放到线程池执行，不阻塞事件循环"""
+        if not self.backend.blocking:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def aget_or_load(self, key, loader):
+        # 与 get_or_load 相同，loader 为协程函数
+        value = await self.arun(self._lookup, key)
+        if value is None:
+            value = await loader()
+            if value is not None:
+                await self.arun(self.backend.set, key, value, self.ttl)
+        return value
+
+    def record(self, hits=0, misses=0):
+        # 调用方自己批量读写 backend 时，用于补记命中统计
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def invalidate(self, *keys):
+        self.backend.delete(*keys)
+
+    def version(self, name):
+        return self.backend.get_counter(f"version:{name}")
+
+    def bump(self, name):
+        # 版本号变化后，旧版本的 key 不再被读取，随 TTL/LRU 自然淘汰
+        return self.backend.incr(f"version:{name}")
+
+    def tag(self, name):
+        # 数据标识 + 版本号，用作 ETag: 只读计数器，不需要查询数据
+        return f"{self.backend.epoch()}.{self.version(name)}"
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self.backend),
+        }
+
+
+def make_backend(config=CACHE_CONFIG):
+    if config['backend'] == 'redis':
+        return RedisBackend(config['redis_url'])
+    return MemoryBackend(config['max_entries'], config['ttl'])
+
+
+product_cache = ReadThroughCache(make_backend(), CACHE_CONFIG['ttl'])
@@ -1,14 +1,321 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
 import pymysql
 
 
+# 可用 BUAADB_DB_* 环境变量指向本地数据库 (例如压测时)，未设置时使用默认配置
 DB_CONFIG = {
-    'host': '124.70.86.207',
-    'port': 3306,
-    'user': 'u23371131',
-    'password': 'Aa085277',
-    'database': 'h_db23371131',
+    'host': os.environ.get('BUAADB_DB_HOST', '124.70.86.207'),
+    'port': int(os.environ.get('BUAADB_DB_PORT', 3306)),
+    'user': os.environ.get('BUAADB_DB_USER', 'u23371131'),
+    'password': os.environ.get('BUAADB_DB_PASSWORD', 'Aa085277'),
+    'database': os.environ.get('BUAADB_DB_NAME', 'h_db23371131'),
     'charset': 'utf8mb4'
 }
 
+# 连接池参数 (时间单位: 秒)
+POOL_CONFIG = {
+    'min_size': 2,            # 空闲回收时至少保留的连接数
+    'max_size': 20,           # 同时存在的最大连接数 (空闲 + 借出)
+    'checkout_timeout': 10,   # 池满时等待空闲连接的最长时间
+    'idle_timeout': 300,      # 空闲超过该时间的连接会被回收
+    'max_lifetime': 3600,     # 连接最长存活时间，超过后归还时直接断开
+    'ping_interval': 30,      # 空闲超过该时间的连接在借出前先 ping 一次
+}
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# 每条 SQL 执行后依次调用 hook(sql, params, seconds)，用于指标统计等
+query_hooks = []
+
+
+class TimedCursor:
+    """包装游标，execute/executemany 计时后回调 query_hooks，其余属性透传"""
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._raw.close()
+
+    def _timed(self, method, sql, args):
+        start = time.perf_counter()
+        try:
+            return method(sql, args)
+        finally:
+            elapsed = time.perf_counter() - start
+            for hook in query_hooks:
+                hook(sql, args, elapsed)
+
+    def execute(self, query, args=None):
+        if not query_hooks:
+            return self._raw.execute(query, args)
+        return self._timed(self._raw.execute, query, args)
+
+    def executemany(self, query, args):
+        if not query_hooks:
+            return self._raw.executemany(query, args)
+        return self._timed(self._raw.executemany, query, args)
+
+
+class PooledConnection:
+    """连接池借出的连接，close() 时归还连接池而不是断开"""
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args):
+        return TimedCursor(self._raw.cursor(*args))
+
+    def close(self):
+        if self._released:
+            return
+        self._released = True
+        self._pool.release(self._raw, self._created_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConnectionPool:
+    def __init__(self, creator, min_size=2, max_size=20, checkout_timeout=10,
+                 idle_timeout=300, max_lifetime=3600, ping_interval=30):
+        self._creator = creator
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+
+        # 空闲连接: (raw, created_at, last_used)，后进先出，冷连接自然沉底被回收
+        self._idle = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+
+    def acquire(self):
+        start = time.monotonic()
+        deadline = start + self.checkout_timeout
+        while True:
+            raw, created_at, last_used = self._reserve(deadline)
+            if raw is None:
+                try:
+                    raw = self._creator()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                created_at = time.monotonic()
+                with self._cond:
+                    self._created += 1
+            elif time.monotonic() - last_used > self.ping_interval and not self._is_alive(raw):
+                self._discard(raw)
+                continue
+
+            waited = time.monotonic() - start
+            with self._cond:
+                self._checkouts += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            return PooledConnection(self, raw, created_at)
+
+    def _reserve(self, deadline):
+        # 取出一个空闲连接，或占用一个新建名额 (返回 raw=None)
+        with self._cond:
+            while True:
+                stale = self._evict_locked()
+                if stale:
+                    break
+                if self._idle:
+                    return self._idle.pop()
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None, None, None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"等待数据库连接超时 ({self.checkout_timeout}s)")
+                self._cond.wait(remaining)
+        # 在锁外断开过期连接，然后重新尝试
+        for raw in stale:
+            self._close_quietly(raw)
+        return self._reserve(deadline)
+
+    def _evict_locked(self):
+        now = time.monotonic()
+        stale = []
+        kept = deque()
+        for item in self._idle:
+            raw, created_at, last_used = item
+            expired = now - created_at > self.max_lifetime
+            idle_too_long = now - last_used > self.idle_timeout
+            if expired or (idle_too_long and self._size - len(stale) > self.min_size):
+                stale.append(raw)
+            else:
+                kept.append(item)
+        if stale:
+            self._idle = kept
+            self._size -= len(stale)
+            self._discarded += len(stale)
+            self._cond.notify(len(stale))
+        return stale
+
+    def release(self, raw, created_at):
+        try:
+            # 结束借出期间残留的事务，避免下一个使用者看到旧快照
+            raw.rollback()
+        except Exception:
+            self._discard(raw)
+            return
+        now = time.monotonic()
+        if now - created_at > self.max_lifetime:
+            self._discard(raw)
+            return
+        with self._cond:
+            self._idle.append((raw, created_at, now))
+            self._cond.notify()
+
+    def _discard(self, raw):
+        self._close_quietly(raw)
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_quietly(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_alive(raw):
+        try:
+            if hasattr(raw, 'ping'):
+                raw.ping(reconnect=False)
+            else:
+                raw.execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    def warm(self):
+        # 预先建立 min_size 个连接
+        conns = [self.acquire() for _ in range(max(self.min_size - self._size, 0))]
+        for conn in conns:
+            conn.close()
+
+    def close_all(self):
+        with self._cond:
+            idle = [item[0] for item in self._idle]
+            self._idle = deque()
+            self._size -= len(idle)
+            self._discarded += len(idle)
+            self._cond.notify_all()
+        for raw in idle:
+            self._close_quietly(raw)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "max_size": self.max_size,
+                "checkouts": self._checkouts,
+                "avg_wait_ms": self._wait_total / self._checkouts * 1000 if self._checkouts else 0.0,
+                "max_wait_ms": self._wait_max * 1000,
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "discarded": self._discarded,
+            }
+
+
+def _connect():
+    return pymysql.connect(**DB_CONFIG)
+
+
+pool = ConnectionPool(_connect, **POOL_CONFIG)
+
+
 def get_db_connection():
-    return pymysql.connect(**DB_CONFIG)
\ No newline at end of file
+    return pool.acquire()
+
+
+class StreamingQuery:
+    """服务端 (无缓冲) 游标逐行读取大结果集，客户端内存占用与结果行数无关
+
+    构造时立即执行 SQL，出错直接抛出；迭代结束或 close() 时关闭游标并归还连接。
+    """
+
+    def __init__(self, sql, params=None):
+        self._conn = get_db_connection()
+        self._cursor = self._conn.cursor(pymysql.cursors.SSDictCursor)
+        try:
+            self._cursor.execute(sql, params)
+        except BaseException:
+            self.close()
+            raise
+
+    def __iter__(self):
+        try:
+            for row in self._cursor:
+                yield row
+        finally:
+            self.close()
+
+    def close(self):
+        if self._cursor is None:
+            return
+        cursor, self._cursor = self._cursor, None
+        try:
+            # 未读完时 SSCursor.close 会读掉剩余结果，连接才能复用
+            cursor.close()
+        finally:
+            self._conn.close()
+
+
+@contextmanager
+def db_cursor(cursor_class=None):
+    """借出一个连接和游标，退出时关闭游标并归还连接"""
+    conn = get_db_connection()
+    cursor = conn.cursor(cursor_class) if cursor_class else conn.cursor()
+    try:
+        yield conn, cursor
+    finally:
+        cursor.close()
+        conn.close()
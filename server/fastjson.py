@@ -0,0 +1,124 @@
+"""响应 JSON 编码: 有 orjson 时用 orjson，否则退回标准库 json
+
+datetime / date / Decimal 由编码器统一处理，路由里不需要再逐行 str() / float()；
+时间仍输出为 "YYYY-MM-DD HH:MM:SS" (与 str(datetime) 相同)，保持接口格式不变；
+Decimal 输出为数字，与商品接口原来的 float(price) 一致。原先由 Flask 输出为字符串的价格
+(订单列表、收藏夹商品) 在 SQL 中 CAST 为字符串，格式不变。
+"""
+import datetime
+import json
+from decimal import Decimal
+from operator import itemgetter
+
+# encoder: auto 优先 orjson；json 强制使用标准库
+JSON_CONFIG = {
+    'encoder': 'auto',
+}
+
+
+# 按精确类型查表，比逐个 isinstance 判断快，列表接口里每个时间/价格字段都会经过这里
+_CONVERTERS = {
+    datetime.datetime: str,
+    datetime.date: str,
+    datetime.time: str,
+    datetime.timedelta: str,
+    Decimal: float,
+    bytes: lambda value: value.decode("utf-8", "replace"),
+    set: list,
+    frozenset: list,
+}
+
+
+def _default(value):
+    convert = _CONVERTERS.get(type(value))
+    if convert is None:
+        for base, convert in _CONVERTERS.items():
+            if isinstance(value, base):
+                break
+        else:
+            raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+    return convert(value)
+
+
+def _std_dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None and JSON_CONFIG['encoder'] != 'json':
+    # orjson 原生输出的时间带 "T"，交给 default 以保持原有格式
+    _ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj):
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+
+    loads = orjson.loads
+    ENCODER = "orjson"
+else:
+    dumps = _std_dumps
+    loads = json.loads
+    ENCODER = "json"
+
+
+def projector(fields):
+    """fields 为 (输出字段名, 列名) 序列，返回把一行 (dict) 映射为输出 dict 的函数"""
+    names = tuple(name for name, _ in fields)
+    getter = itemgetter(*(column for _, column in fields))
+    if len(names) == 1:
+        return lambda row: {names[0]: getter(row)}
+    return lambda row: dict(zip(names, getter(row)))
+
+
+def stream_json(key, rows, project=None, head=None, tail=None, chunk_size=64 * 1024):
+    """逐行编码 {**head, key: [...rows], **tail()}，攒够 chunk_size 字节产出一次
+
+    tail 为无参函数，在所有行产出之后调用 (例如根据最后一行生成分页游标)。
+    """
+    buf = bytearray(dumps(head)[:-1] + b"," if head else b"{")
+    buf += dumps(key) + b":["
+    first = True
+    for row in rows:
+        if not first:
+            buf += b","
+        first = False
+        buf += dumps(project(row) if project else row)
+        if len(buf) >= chunk_size:
+            yield bytes(buf)
+            buf.clear()
+    buf += b"]"
+    extra = tail() if tail else None
+    buf += b"," + dumps(extra)[1:] if extra else b"}"
+    yield bytes(buf)
+
+
+def stream_response(query, key, rows=None, **kwargs):
+    """query 为 db.StreamingQuery，rows 可传入对其结果做过滤/截断后的迭代器"""
+    from flask import Response
+
+    response = Response(stream_json(key, query if rows is None else rows, **kwargs),
+                        mimetype="application/json")
+    # 响应未被完整迭代 (客户端断开、HEAD 请求) 时也要归还连接
+    response.call_on_close(query.close)
+    return response
+
+
+def init_app(app):
+    """替换 Flask 的 JSON provider，jsonify 走同一个编码器"""
+    from flask.json.provider import DefaultJSONProvider
+
+    class FastJSONProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            return dumps(obj).decode("utf-8")
+
+        def loads(self, s, **kwargs):
+            return loads(s)
+
+        def response(self, *args, **kwargs):
+            obj = self._prepare_response_obj(args, kwargs)
+            return self._app.response_class(dumps(obj), mimetype=self.mimetype)
+
+    app.json = FastJSONProvider(app)
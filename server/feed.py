@@ -0,0 +1,235 @@
+"""个性化首页: 按用户收藏 / 评论 / 购买过的分类给在售商品排序，结果预先写入 user_feed
+
+favorite_item / comment / orders 上的触发器把相关用户标记为待刷新 (user_feed_state.dirty = 1)，
+后台任务每 interval 秒取一批待刷新的用户重算；每 full_refresh 秒把所有用户重新标记一次，让新发布的商品进入推荐。
+请求时只按 (user_id, position) 主键顺序读取 user_feed，不做实时聚合。
+
+手动刷新: python feed.py refresh [--all] [--user 用户名]
+"""
+import argparse
+import heapq
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from db import db_cursor
+
+FEED_CONFIG = {
+    'size': 100,                    # 每个用户物化的推荐条数
+    'categories': 5,                # 只取亲和度最高的前几个分类
+    'per_category': 200,            # 每个分类取最新的多少件在售商品作为候选
+    'weights': {'favorite': 3.0, 'comment': 2.0, 'order': 4.0},
+    'half_life_days': 30,           # 行为权重的半衰期，越早的行为影响越小
+    'fresh_half_life_hours': 72,    # 商品新鲜度的半衰期
+    'boost': 4.0,                   # 最偏好分类的商品相对同样新的其他商品的加权倍数
+    'interval': 30,                 # 后台任务检查待刷新用户的间隔 (秒)
+    'batch': 200,                   # 每批刷新的用户数
+    'full_refresh': 3600,           # 全量刷新间隔 (秒)
+    'enabled': os.environ.get("BUAADB_FEED_JOB", "1") != "0",
+}
+LOCK_NAME = "buaadb_feed"
+
+# 用户的行为: 收藏 / 评论 / 购买过的商品及其分类
+ACTIVITY_SQL = """
+    SELECT e.product_id, p.category_id, e.kind, e.event_time
+    FROM (
+        SELECT fi.product_id, 'favorite' AS kind, fi.created_time AS event_time
+        FROM favorites f JOIN favorite_item fi ON fi.favorite_id = f.favorite_id
+        WHERE f.user_id = %s
+        UNION ALL
+        SELECT product_id, 'comment', time FROM comment WHERE user_id = %s
+        UNION ALL
+        SELECT product_id, 'order', created_time FROM orders WHERE buyer_id = %s
+    ) e
+    JOIN products p ON p.product_id = e.product_id
+"""
+
+# 候选商品，同一次刷新的所有用户共用
+CATEGORY_CANDIDATES_SQL = """
+    SELECT product_id, category_id, owner_id, create_time FROM products
+    WHERE status = 'active' AND category_id = %s
+    ORDER BY create_time DESC
+    LIMIT %s
+"""
+LATEST_CANDIDATES_SQL = """
+    SELECT product_id, category_id, owner_id, create_time FROM products
+    WHERE status = 'active'
+    ORDER BY create_time DESC
+    LIMIT %s
+"""
+
+# 请求时的读取: user_feed 主键范围扫描 + 按主键取商品，已售出 / 下架的商品直接跳过
+FEED_SQL = """
+    SELECT f.position, p.*, u.nickname as seller_name, u.avatar_url as seller_avatar
+    FROM user_feed f
+    JOIN products p ON p.product_id = f.product_id
+    LEFT JOIN users u ON p.owner_id = u.user_name
+    WHERE f.user_id = %s AND f.position > %s AND p.status = 'active'
+    ORDER BY f.position
+    LIMIT %s
+"""
+
+
+def _decay(age_seconds, half_life_seconds):
+    return 0.5 ** (max(age_seconds, 0) / half_life_seconds)
+
+
+class CandidatePool:
+    """一次刷新内按分类缓存候选商品，多个用户偏好同一分类时只查一次"""
+
+    def __init__(self, cursor, config=FEED_CONFIG):
+        self._cursor = cursor
+        self._config = config
+        self._by_category = {}
+        self._latest = None
+
+    def category(self, category_id):
+        rows = self._by_category.get(category_id)
+        if rows is None:
+            self._cursor.execute(CATEGORY_CANDIDATES_SQL, (category_id, self._config['per_category']))
+            rows = self._by_category[category_id] = self._cursor.fetchall()
+        return rows
+
+    def latest(self):
+        if self._latest is None:
+            self._cursor.execute(LATEST_CANDIDATES_SQL, (self._config['size'],))
+            self._latest = self._cursor.fetchall()
+        return self._latest
+
+
+def category_affinity(activity, now, config=FEED_CONFIG):
+    """activity: (product_id, category_id, kind, event_time)，返回 (分类 -> 亲和度, 已互动过的商品)"""
+    half_life = config['half_life_days'] * 86400
+    affinity = defaultdict(float)
+    seen = set()
+    for product_id, category_id, kind, event_time in activity:
+        seen.add(product_id)
+        if category_id:
+            affinity[category_id] += config['weights'][kind] * _decay((now - event_time).total_seconds(), half_life)
+    return affinity, seen
+
+
+def rank_feed(user_id, affinity, seen, pool, now, config=FEED_CONFIG):
+    """返回按得分排序的 [(product_id, score)]: 得分 = 新鲜度 * (1 + boost * 分类亲和度占比)"""
+    top = heapq.nlargest(config['categories'], affinity, key=affinity.get)
+    peak = affinity[top[0]] if top else 1.0
+    fresh_half_life = config['fresh_half_life_hours'] * 3600
+
+    rows = [row for category_id in top for row in pool.category(category_id)]
+    rows += pool.latest()
+    scores = {}
+    for product_id, category_id, owner_id, create_time in rows:
+        if product_id in scores or product_id in seen or owner_id == user_id:
+            continue
+        share = affinity.get(category_id, 0.0) / peak if category_id in top else 0.0
+        scores[product_id] = _decay((now - create_time).total_seconds(), fresh_half_life) * (1 + config['boost'] * share)
+    return heapq.nlargest(config['size'], scores.items(), key=lambda item: item[1])
+
+
+def refresh_user(conn, cursor, user_id, pool, now):
+    # 调用时不能有未结束的事务。先清除标记再读取行为: UPDATE 锁住状态行，尚未提交的行为 (触发器已锁住该行)
+    # 会先提交，读取行为的快照在 UPDATE 之后建立，一定包含它们；此后的新行为要等本事务提交才能重新标记，不会被覆盖
+    cursor.execute("UPDATE user_feed_state SET dirty = 0, built_at = NOW() WHERE user_id = %s", (user_id,))
+    cursor.execute(ACTIVITY_SQL, (user_id, user_id, user_id))
+    affinity, seen = category_affinity(cursor.fetchall(), now)
+    ranked = rank_feed(user_id, affinity, seen, pool, now)
+
+    cursor.execute("DELETE FROM user_feed WHERE user_id = %s", (user_id,))
+    if ranked:
+        cursor.executemany("INSERT INTO user_feed (user_id, position, product_id, score) VALUES (%s, %s, %s, %s)",
+                           [(user_id, i + 1, product_id, score) for i, (product_id, score) in enumerate(ranked)])
+    conn.commit()
+
+
+def refresh(limit=None, users=None):
+    """刷新指定用户，或按标记先后刷新至多 limit 个待刷新用户；返回刷新的用户数
+
+    多个进程同时运行时只有拿到锁的一个执行，其余直接返回 0。
+    """
+    with db_cursor() as (conn, cursor):
+        cursor.execute("SELECT GET_LOCK(%s, 0)", (LOCK_NAME,))
+        if cursor.fetchone()[0] != 1:
+            return 0
+        try:
+            if users is None:
+                cursor.execute("SELECT user_id FROM user_feed_state WHERE dirty = 1 ORDER BY changed_at LIMIT %s",
+                               (limit or FEED_CONFIG['batch'],))
+                users = [row[0] for row in cursor.fetchall()]
+            pool = CandidatePool(cursor)
+            conn.commit()   # 结束读取候选池的事务，每个用户在新事务中刷新
+            now = datetime.now()
+            for user_id in users:
+                try:
+                    refresh_user(conn, cursor, user_id, pool, now)
+                except Exception as e:
+                    conn.rollback()
+                    print(f"[ERROR] 刷新用户 {user_id} 的首页推荐失败: {e}")
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+    return len(users)
+
+
+def mark_all_dirty():
+    with db_cursor() as (conn, cursor):
+        cursor.execute("UPDATE user_feed_state SET dirty = 1, changed_at = NOW() WHERE dirty = 0")
+        conn.commit()
+        return cursor.rowcount
+
+
+class FeedJob:
+    """后台线程: 定期刷新待刷新的用户，并按 full_refresh 间隔全量重新标记"""
+
+    def __init__(self, config=FEED_CONFIG):
+        self.config = config
+        self.last_full = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.config['interval']):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"[ERROR] 刷新首页推荐失败: {e}")
+
+    def run_once(self):
+        if time.monotonic() - self.last_full >= self.config['full_refresh']:
+            mark_all_dirty()
+            self.last_full = time.monotonic()
+        # 一批刷满说明还有积压，继续处理直到清空
+        while refresh(self.config['batch']) == self.config['batch']:
+            pass
+
+
+feed_job = FeedJob()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="刷新个性化首页推荐")
+    parser.add_argument("command", choices=["refresh"])
+    parser.add_argument("--all", action="store_true", help="先把所有用户标记为待刷新")
+    parser.add_argument("--user", action="append", help="只刷新指定用户，可重复")
+    args = parser.parse_args()
+
+    if args.user:
+        print(f"✅ 刷新了 {refresh(users=args.user)} 个用户")
+    else:
+        if args.all:
+            print(f"标记了 {mark_all_dirty()} 个用户")
+        total = 0
+        while True:
+            count = refresh(FEED_CONFIG['batch'])
+            total += count
+            if count < FEED_CONFIG['batch']:
+                break
+        print(f"✅ 刷新了 {total} 个用户")
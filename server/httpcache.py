@@ -0,0 +1,153 @@
+"""条件请求 (ETag / 304) 与响应压缩
+
+只读接口的弱 ETag 由缓存中的版本号生成 (写接口会 bump 对应版本号)，If-None-Match 命中时
+不执行查询直接返回 304；响应体超过 min_size 时按 Accept-Encoding 选择 br / gzip 压缩，
+stream=1 的流式响应逐块压缩。同步模式 (init_app / conditional) 与异步模式 (asgi.py) 共用这些函数。
+"""
+import zlib
+from functools import wraps
+
+from cache import CACHE_CONFIG, product_cache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_CONFIG = {
+    'min_size': 1024,           # 小于该字节数的响应不压缩，省下的流量抵不过压缩开销
+    'gzip_level': 6,
+    'brotli_quality': 4,        # 动态内容用中等质量，高质量档位压缩耗时成倍增加
+    'mimetypes': {"application/json", "text/plain", "text/html", "text/css", "application/javascript"},
+}
+
+# ETag 由缓存中的版本号生成，版本号必须在所有进程间一致: 内存缓存后端的计数器只在本进程内有效，
+# 多 worker 时写操作只递增处理它的进程的计数器，其他进程仍对旧 ETag 返回 304，因此只在单进程时启用
+ETAG_ENABLED = product_cache.backend.shared or CACHE_CONFIG['workers'] <= 1
+if not ETAG_ENABLED:
+    print("[WARN] 多 worker 部署使用进程内缓存，已关闭 ETag / 304；设置 BUAADB_CACHE_BACKEND=redis 后启用")
+
+# 服务端偏好顺序，客户端给出的 q 值相同时取靠前的
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def weak_etag(name, tag):
+    return f'W/"{name}-{tag}"'
+
+
+def etag_matches(if_none_match, etag):
+    # If-None-Match 使用弱比较，忽略 W/ 前缀
+    if not if_none_match:
+        return False
+    opaque = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == opaque:
+            return True
+    return False
+
+
+def choose_encoding(accept_encoding):
+    if not accept_encoding:
+        return None
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        params = params.replace(" ", "")
+        q = 1.0
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        qualities[coding.strip().lower()] = q
+    best, best_q = None, 0.0
+    for coding in ENCODINGS:
+        q = qualities.get(coding, qualities.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def _gzip_compressor():
+    # wbits=31: 带 gzip 头尾的 deflate 流
+    return zlib.compressobj(COMPRESS_CONFIG['gzip_level'], zlib.DEFLATED, 31)
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESS_CONFIG['brotli_quality'])
+    compressor = _gzip_compressor()
+    return compressor.compress(body) + compressor.flush()
+
+
+def compress_stream(chunks, encoding):
+    # 每块之后 flush，客户端可以边收边解压，不用等整个响应结束
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=COMPRESS_CONFIG['brotli_quality'])
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+    else:
+        compressor = _gzip_compressor()
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+
+def conditional(etag_of):
+    """GET 视图装饰器: etag_of 接收与视图相同的参数，只读版本号；If-None-Match 命中时不调用视图"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import current_app, make_response, request
+
+            if not ETAG_ENABLED:
+                return view(*args, **kwargs)
+            try:
+                etag = etag_of(*args, **kwargs)
+            except Exception as e:
+                print(f"[ERROR] 读取版本号失败: {e}")
+                return view(*args, **kwargs)
+            if etag_matches(request.headers.get("If-None-Match"), etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.headers["ETag"] = etag
+            # 浏览器可以缓存，但每次使用前都要带 If-None-Match 回来确认
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    from flask import request
+
+    @app.after_request
+    def compress_response(response):
+        if response.status_code == 304:
+            if "ETag" in response.headers:
+                response.vary.add("Accept-Encoding")
+            return response
+        if (response.status_code != 200 or response.direct_passthrough
+                or "Content-Encoding" in response.headers
+                or response.mimetype not in COMPRESS_CONFIG['mimetypes']):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+        if encoding is None:
+            return response
+        if response.is_streamed:
+            response.response = compress_stream(response.iter_encoded(), encoding)
+            response.headers.pop("Content-Length", None)
+        else:
+            body = response.get_data()
+            if len(body) < COMPRESS_CONFIG['min_size']:
+                return response
+            response.set_data(compress(body, encoding))
+        response.headers["Content-Encoding"] = encoding
+        return response
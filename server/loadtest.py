@@ -0,0 +1,515 @@
+"""端到端并发压测: 把 test.py 里的业务流程作为按权重抽样的场景反复执行
+
+闭环 (固定并发):   python loadtest.py run --concurrency 50 --duration 60 --out base.json
+开环 (固定到达率): python loadtest.py run --rate 200 --concurrency 200 --duration 60 --out new.json
+对比两次结果:      python loadtest.py diff base.json new.json --threshold 10
+抢购争用:          python loadtest.py flashsale --buyers 1000 --rounds 5
+
+服务端建议连到本地数据库 (见 db.py 的 BUAADB_DB_* 环境变量)，避免压到共享库上。
+所有虚拟用户从同一个 IP 注册，服务端需关闭限流 (BUAADB_RATE_LIMIT=0) 或把压测机加入白名单
+(BUAADB_RATE_LIMIT_TRUSTED=127.0.0.1)，否则注册很快被 429 拒绝。
+开环模式下场景按泊松过程到达，不等待上一个完成；场景耗时从计划到达时刻算起，包含排队时间。
+"""
+import argparse
+import json
+import random
+import string
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BASE_URL = "http://127.0.0.1:5000/api"
+RATE_LIMIT_HINT = ("注册/登录失败，请检查服务是否在运行，以及是否已关闭限流 "
+                   "(BUAADB_RATE_LIMIT=0 或 BUAADB_RATE_LIMIT_TRUSTED=127.0.0.1)")
+KEYWORDS = ["手机", "教材", "耳机", "键盘", "自行车", "台灯", "显示器", "考研"]
+
+
+def get_random_string(length=6):
+    return ''.join(random.choice(string.ascii_lowercase) for i in range(length))
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+class Recorder:
+    """按接口 (方法 + 路由模板) 记录每次请求的耗时和结果"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)          # 5xx 与网络错误
+        self.client_errors = defaultdict(int)   # 4xx，例如商品已被别人买走的 409
+
+    def add(self, label, seconds, status):
+        with self._lock:
+            self.latencies[label].append(seconds)
+            if status is None or status >= 500:
+                self.errors[label] += 1
+            elif status >= 400:
+                self.client_errors[label] += 1
+
+    def summary(self, elapsed):
+        result = {}
+        with self._lock:
+            labels = sorted(self.latencies)
+            for label in labels:
+                values = sorted(self.latencies[label])
+                count = len(values)
+                result[label] = {
+                    "count": count,
+                    "rps": round(count / elapsed, 2),
+                    "errors": self.errors[label],
+                    "client_errors": self.client_errors[label],
+                    "error_rate": round(self.errors[label] / count, 4),
+                    "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+                    "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+                    "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+                    "max_ms": round(values[-1] * 1000, 2),
+                }
+        return result
+
+
+class Client:
+    """每个线程一个 Session 复用长连接；所有请求经 call() 计时"""
+
+    _local = threading.local()
+
+    def __init__(self, base_url, recorder, timeout=30):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.timeout = timeout
+
+    @property
+    def session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def call(self, method, path, label=None, token=None, **kwargs):
+        headers = {"Authorization": token} if token else {}
+        start = time.perf_counter()
+        try:
+            resp = self.session.request(method, f"{self.base_url}{path}", headers=headers,
+                                        timeout=self.timeout, **kwargs)
+            status = resp.status_code
+        except requests.RequestException:
+            resp, status = None, None
+        if self.recorder is not None:
+            self.recorder.add(f"{method} {label or path}", time.perf_counter() - start, status)
+        return resp
+
+    def json(self, *args, **kwargs):
+        resp = self.call(*args, **kwargs)
+        if resp is None or resp.status_code >= 400:
+            return None
+        try:
+            return resp.json()
+        except ValueError:
+            return None
+
+
+class World:
+    """压测期间共享的用户和商品，供各场景随机选取"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.users = []        # (token, user_name, folder_id)
+        self.products = []     # 仍可能在售的商品 id
+
+    def add_user(self, user):
+        with self._lock:
+            self.users.append(user)
+
+    def add_product(self, product_id):
+        with self._lock:
+            self.products.append(product_id)
+
+    def take_product(self):
+        # 购买场景取走一个商品，避免大量请求集中在已售出的商品上
+        with self._lock:
+            if not self.products:
+                return None
+            i = random.randrange(len(self.products))
+            self.products[i], self.products[-1] = self.products[-1], self.products[i]
+            return self.products.pop()
+
+    def random_user(self):
+        return random.choice(self.users)
+
+    def two_users(self):
+        return random.sample(self.users, 2)
+
+    def random_product(self):
+        with self._lock:
+            return random.choice(self.products) if self.products else None
+
+
+def register_and_login(client, world, prefix="load"):
+    username = f"{prefix}_{get_random_string(10)}"
+    password = "password123"
+    client.call("POST", "/register", json={"username": username, "password": password})
+    data = client.json("POST", "/login", json={"username": username, "password": password})
+    if not data or not data.get("token"):
+        return None
+    token = data["token"]
+    folder = client.json("POST", "/create_favorite_folder", token=token, json={"name": "压测收藏夹"})
+    user = (token, username, folder and folder.get("id"))
+    world.add_user(user)
+    return user
+
+
+def create_product(client, world, token):
+    data = client.json("POST", "/create_product", token=token, json={
+        "name": f"{random.choice(KEYWORDS)} {get_random_string()}",
+        "price": random.randint(1, 500),
+        "image_url": "test.png",
+        "description": f"压测商品 {random.choice(KEYWORDS)}",
+    })
+    if data and data.get("product_id"):
+        world.add_product(data["product_id"])
+
+
+# ---- 场景: 每个函数执行一段完整的用户流程 ----
+
+def scenario_register(client, world):
+    register_and_login(client, world)
+
+
+def scenario_browse(client, world):
+    data = client.json("GET", "/get_products", params={"limit": 20})
+    products = (data or {}).get("products") or []
+    if data and data.get("next_cursor"):
+        client.call("GET", "/get_products", params={"limit": 20, "cursor": data["next_cursor"]})
+    product_id = products[0]["id"] if products and "id" in products[0] else world.random_product()
+    if product_id:
+        client.call("GET", f"/product/{product_id}", label="/product/<id>")
+        client.call("GET", f"/get_comments/{product_id}", label="/get_comments/<id>")
+
+
+def scenario_search(client, world):
+    client.call("GET", "/search_products", params={"keyword": random.choice(KEYWORDS)})
+
+
+def scenario_publish(client, world):
+    token, _, _ = world.random_user()
+    create_product(client, world, token)
+
+
+def scenario_buy(client, world):
+    token, _, _ = world.random_user()
+    product_id = world.take_product()
+    if product_id:
+        client.call("POST", f"/buy_product/{product_id}", label="/buy_product/<id>", token=token)
+        client.call("GET", "/get_orders", token=token)
+
+
+def scenario_comment(client, world):
+    token, _, _ = world.random_user()
+    product_id = world.random_product()
+    if product_id:
+        client.call("POST", "/publish_comment", token=token, json={
+            "product_id": product_id, "content": "这个东西真的好用吗？", "rate": random.randint(1, 5)})
+        client.call("GET", f"/get_comments/{product_id}", label="/get_comments/<id>")
+
+
+def scenario_favorite(client, world):
+    token, _, folder_id = world.random_user()
+    product_id = world.random_product()
+    if product_id and folder_id:
+        client.call("POST", "/favorite_product", token=token,
+                    json={"product_id": product_id, "folder_id": folder_id})
+        client.call("GET", f"/get_favorites/{folder_id}", label="/get_favorites/<id>", token=token)
+
+
+def scenario_message(client, world):
+    (token, _, _), (_, receiver, _) = world.two_users()
+    client.call("POST", "/send_msg", token=token, json={"receiver_id": receiver, "content": "老板，可以便宜点吗？"})
+    client.call("GET", "/get_msgs", token=token)
+
+
+SCENARIOS = {
+    "browse": (scenario_browse, 40),
+    "search": (scenario_search, 10),
+    "message": (scenario_message, 15),
+    "comment": (scenario_comment, 10),
+    "favorite": (scenario_favorite, 10),
+    "publish": (scenario_publish, 8),
+    "buy": (scenario_buy, 5),
+    "register": (scenario_register, 2),
+}
+
+
+def parse_weights(spec):
+    # "browse=40,buy=5"；未列出的场景使用默认权重
+    weights = {name: weight for name, (_, weight) in SCENARIOS.items()}
+    for item in filter(None, (spec or "").split(",")):
+        name, _, value = item.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"未知场景: {name}")
+        weights[name] = float(value)
+    return {name: w for name, w in weights.items() if w > 0}
+
+
+def setup(base_url, users, products, concurrency):
+    # 准备阶段的请求不计入结果
+    client = Client(base_url, None)
+    world = World()
+    with ThreadPoolExecutor(max_workers=min(concurrency, 32)) as executor:
+        list(executor.map(lambda _: register_and_login(client, world), range(users)))
+        if len(world.users) < 2:
+            raise SystemExit(RATE_LIMIT_HINT)
+        list(executor.map(lambda _: create_product(client, world, world.random_user()[0]), range(products)))
+    return world
+
+
+def run(args):
+    weights = parse_weights(args.weights)
+    names, values = list(weights), list(weights.values())
+    world = setup(args.url, args.users, args.products, args.concurrency)
+    print(f"准备完成: {len(world.users)} 个用户, {len(world.products)} 个商品")
+
+    recorder = Recorder()
+    scenario_recorder = Recorder()
+    client = Client(args.url, recorder)
+    rng = random.Random(args.seed)
+
+    def run_scenario(name, scheduled):
+        status = 200
+        try:
+            SCENARIOS[name][0](client, world)
+        except Exception as e:
+            print(f"[ERROR] 场景 {name} 出错: {e}")
+            status = None
+        scenario_recorder.add(name, time.perf_counter() - scheduled, status)
+
+    start = time.perf_counter()
+    deadline = start + args.duration
+    if args.rate:
+        # 开环: 按泊松过程安排到达时刻，服务变慢时排队时间计入场景耗时
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            next_at = start
+            while True:
+                next_at += rng.expovariate(args.rate)
+                if next_at >= deadline:
+                    break
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(run_scenario, rng.choices(names, values)[0], next_at)
+    else:
+        # 闭环: concurrency 个虚拟用户各自循环执行场景
+        def worker(seed):
+            local_rng = random.Random(seed)
+            while time.perf_counter() < deadline:
+                run_scenario(local_rng.choices(names, values)[0], time.perf_counter())
+
+        threads = [threading.Thread(target=worker, args=(rng.random(),)) for _ in range(args.concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    elapsed = time.perf_counter() - start
+
+    endpoints = recorder.summary(elapsed)
+    total = sum(e["count"] for e in endpoints.values())
+    errors = sum(e["errors"] for e in endpoints.values())
+    result = {
+        "config": {
+            "url": args.url, "mode": "open" if args.rate else "closed", "rate": args.rate,
+            "concurrency": args.concurrency, "duration": args.duration, "weights": weights,
+        },
+        "elapsed": round(elapsed, 2),
+        "total": {"count": total, "rps": round(total / elapsed, 2), "errors": errors,
+                  "error_rate": round(errors / total, 4) if total else 0.0},
+        "endpoints": endpoints,
+        "scenarios": scenario_recorder.summary(elapsed),
+    }
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+        print_table(result)
+        print(f"结果已写入 {args.out}")
+    else:
+        print(text)
+
+
+def print_table(result):
+    print(f"{'endpoint':<36} {'count':>7} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'err%':>6}")
+    for label, e in result["endpoints"].items():
+        print(f"{label:<36} {e['count']:>7} {e['rps']:>8.1f} {e['p50_ms']:>8.1f} {e['p95_ms']:>8.1f} "
+              f"{e['p99_ms']:>8.1f} {e['error_rate'] * 100:>6.2f}")
+    t = result["total"]
+    print(f"{'TOTAL':<36} {t['count']:>7} {t['rps']:>8.1f} {'':>8} {'':>8} {'':>8} {t['error_rate'] * 100:>6.2f}")
+
+
+def flashsale(args):
+    """buyers 个买家在同一时刻抢购同一个商品 (或 products 个商品)，每轮检查恰好成交一单"""
+    client = Client(args.url, None)
+    world = World()
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        list(executor.map(lambda _: register_and_login(client, world, prefix="flash"), range(args.buyers + 1)))
+    if len(world.users) < args.buyers + 1:
+        raise SystemExit(f"只注册了 {len(world.users)}/{args.buyers + 1} 个用户。" + RATE_LIMIT_HINT)
+    seller, buyers = world.users[0], world.users[1:]
+    print(f"准备完成: {len(buyers)} 个买家")
+
+    # 买家线程在各轮之间保持长连接；主线程也参与屏障，用来发令和收集结果
+    start_barrier = threading.Barrier(len(buyers) + 1)
+    done_barrier = threading.Barrier(len(buyers) + 1)
+    lock = threading.Lock()
+    state = {"products": [], "samples": [], "stop": False}
+
+    def buyer(i, token):
+        while True:
+            start_barrier.wait()
+            if state["stop"]:
+                return
+            product_id = state["products"][i % len(state["products"])]
+            begin = time.perf_counter()
+            resp = client.call("POST", f"/buy_product/{product_id}", token=token)
+            sample = (time.perf_counter() - begin, resp.status_code if resp is not None else None)
+            with lock:
+                state["samples"].append(sample)
+            done_barrier.wait()
+
+    threads = [threading.Thread(target=buyer, args=(i, token), daemon=True)
+               for i, (token, _, _) in enumerate(buyers)]
+    for t in threads:
+        t.start()
+
+    rounds, all_latencies, total_orders, total_elapsed, oversold = [], [], 0, 0.0, 0
+    for n in range(args.rounds):
+        world.products.clear()
+        for _ in range(args.products):
+            create_product(client, world, seller[0])
+        if len(world.products) < args.products:
+            raise SystemExit("发布商品失败")
+        state["products"], state["samples"] = list(world.products), []
+
+        start_barrier.wait()
+        begin = time.perf_counter()
+        done_barrier.wait()
+        elapsed = time.perf_counter() - begin
+
+        statuses = Counter(status for _, status in state["samples"])
+        latencies = sorted(seconds for seconds, _ in state["samples"])
+        orders = statuses.get(200, 0)
+        oversold += max(0, orders - args.products)
+        total_orders += orders
+        total_elapsed += elapsed
+        all_latencies += latencies
+        rounds.append({
+            "orders": orders, "elapsed": round(elapsed, 3),
+            "statuses": {str(k): v for k, v in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        })
+        print(f"第 {n + 1} 轮: 成交 {orders}/{args.products}, 耗时 {elapsed * 1000:.0f}ms, "
+              f"p50 {rounds[-1]['p50_ms']}ms, p99 {rounds[-1]['p99_ms']}ms, 状态码 {rounds[-1]['statuses']}")
+
+    state["stop"] = True
+    start_barrier.wait()
+
+    all_latencies.sort()
+    result = {
+        "config": {"url": args.url, "buyers": len(buyers), "products": args.products, "rounds": args.rounds},
+        "orders": total_orders,
+        "oversold": oversold,
+        "orders_per_sec": round(total_orders / total_elapsed, 2) if total_elapsed else 0.0,
+        "requests_per_sec": round(len(all_latencies) / total_elapsed, 2) if total_elapsed else 0.0,
+        "p50_ms": round(percentile(all_latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(all_latencies, 0.99) * 1000, 2),
+        "rounds": rounds,
+    }
+    print(f"合计: {result['orders_per_sec']} 单/秒, {result['requests_per_sec']} 请求/秒, "
+          f"p50 {result['p50_ms']}ms, p99 {result['p99_ms']}ms, 超卖 {oversold}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.out}")
+    if oversold:
+        sys.exit(1)
+
+
+# 指标变化方向: 1 表示越大越好，-1 表示越小越好
+DIFF_METRICS = (("rps", 1), ("p50_ms", -1), ("p95_ms", -1), ("p99_ms", -1), ("error_rate", -1))
+
+
+def diff(args):
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+
+    if base["config"] != new["config"]:
+        # 开环的吞吐由到达率决定，配置不同时 rps 不具可比性
+        print(f"[WARN] 两次压测配置不同:\n  基准 {base['config']}\n  新   {new['config']}")
+
+    regressions = []
+    print(f"{'endpoint':<36} " + " ".join(f"{name:>18}" for name, _ in DIFF_METRICS))
+    for label in sorted(set(base["endpoints"]) | set(new["endpoints"])):
+        old, cur = base["endpoints"].get(label), new["endpoints"].get(label)
+        if old is None or cur is None:
+            print(f"{label:<36} {'仅出现在 ' + ('新结果' if old is None else '基准'):>18}")
+            continue
+        cells = []
+        for name, direction in DIFF_METRICS:
+            a, b = old[name], cur[name]
+            change = (b - a) / a * 100 if a else (0.0 if b == a else float("inf"))
+            worse = change * direction < -args.threshold
+            if name == "error_rate":
+                # 错误率用百分点比较 (阈值 10% 对应 1 个百分点)，避免 0 -> 0.1% 被当作无穷大
+                change = (b - a) * 100
+                worse = change > args.threshold / 10
+            if worse and old["count"] >= args.min_count:
+                regressions.append((label, name, a, b))
+            cells.append(f"{a:g}->{b:g}{'!' if worse else ' '}")
+        print(f"{label:<36} " + " ".join(f"{c:>18}" for c in cells))
+
+    if regressions:
+        print(f"\n{len(regressions)} 项退化超过阈值 ({args.threshold}%):")
+        for label, name, a, b in regressions:
+            print(f"  {label} {name}: {a} -> {b}")
+        sys.exit(1)
+    print("\n未发现超过阈值的退化")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run")
+    run_parser.add_argument("--url", default=BASE_URL)
+    run_parser.add_argument("--concurrency", type=int, default=20, help="闭环的虚拟用户数 / 开环的最大并发")
+    run_parser.add_argument("--rate", type=float, default=0, help="开环每秒到达的场景数，0 表示闭环")
+    run_parser.add_argument("--duration", type=float, default=30)
+    run_parser.add_argument("--users", type=int, default=50)
+    run_parser.add_argument("--products", type=int, default=200)
+    run_parser.add_argument("--weights", help="覆盖场景权重，例如 browse=60,buy=0")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--out")
+
+    diff_parser = sub.add_parser("diff")
+    diff_parser.add_argument("base")
+    diff_parser.add_argument("new")
+    diff_parser.add_argument("--threshold", type=float, default=10, help="退化判定阈值 (%)")
+    diff_parser.add_argument("--min-count", type=int, default=20, help="样本太少的接口不参与判定")
+
+    flash_parser = sub.add_parser("flashsale")
+    flash_parser.add_argument("--url", default=BASE_URL)
+    flash_parser.add_argument("--buyers", type=int, default=1000)
+    flash_parser.add_argument("--products", type=int, default=1, help="每轮同时抢购的商品数")
+    flash_parser.add_argument("--rounds", type=int, default=5)
+    flash_parser.add_argument("--out")
+
+    args = parser.parse_args()
+    {"run": run, "diff": diff, "flashsale": flashsale}[args.command](args)
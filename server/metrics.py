@@ -0,0 +1,166 @@
+"""请求/数据库指标，以 Prometheus 文本格式暴露在 /metrics"""
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, has_request_context, request
+
+import db
+from cache import product_cache
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# 单个请求执行的 SQL 条数，用于发现 N+1 查询
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """固定分桶直方图，每次观测只做一次二分查找和一次加锁累加"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = {}        # (endpoint, method) -> Histogram
+        self.status = {}         # (endpoint, method, status) -> count
+        self.db_time = {}        # endpoint -> Histogram (单条 SQL 耗时)
+        self.db_queries = {}     # endpoint -> Histogram (每个请求的 SQL 条数)
+        self.in_flight = 0
+
+    def _histogram(self, table, key, buckets=LATENCY_BUCKETS):
+        hist = table.get(key)
+        if hist is None:
+            with self._lock:
+                hist = table.setdefault(key, Histogram(buckets))
+        return hist
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def observe_request(self, endpoint, method, status, seconds, queries=0):
+        self._histogram(self.latency, (endpoint, method)).observe(seconds)
+        self._histogram(self.db_queries, endpoint, QUERY_COUNT_BUCKETS).observe(queries)
+        key = (endpoint, method, status)
+        with self._lock:
+            self.status[key] = self.status.get(key, 0) + 1
+
+    def observe_query(self, endpoint, seconds):
+        self._histogram(self.db_time, endpoint).observe(seconds)
+
+    def render(self):
+        lines = []
+
+        def histogram(name, help_text, table, label_names):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, hist in sorted(table.items()):
+                key = key if isinstance(key, tuple) else (key,)
+                labels = ",".join(f'{n}="{v}"' for n, v in zip(label_names, key))
+                counts, total = hist.snapshot()
+                cumulative = 0
+                for bound, count in zip(hist.buckets + ("+Inf",), counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{labels}}} {total}")
+                lines.append(f"{name}_count{{{labels}}} {cumulative}")
+
+        def simple(name, kind, help_text, values):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in values:
+                lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+
+        histogram("http_request_duration_seconds", "请求处理耗时", self.latency, ("endpoint", "method"))
+        simple("http_requests_total", "counter", "按状态码统计的请求数",
+               [(f'endpoint="{e}",method="{m}",status="{s}"', v) for (e, m, s), v in sorted(self.status.items())])
+        simple("http_requests_in_flight", "gauge", "正在处理的请求数", [("", self.in_flight)])
+        histogram("db_query_duration_seconds", "单条 SQL 执行耗时", self.db_time, ("endpoint",))
+        histogram("db_queries_per_request", "每个请求执行的 SQL 条数", self.db_queries, ("endpoint",))
+
+        pool_stats = db.pool.stats()
+        simple("db_pool_connections", "gauge", "连接池连接数",
+               [('state="idle"', pool_stats["idle"]), ('state="in_use"', pool_stats["in_use"])])
+        simple("db_pool_checkout_wait_seconds_max", "gauge", "借出连接的最长等待时间",
+               [("", pool_stats["max_wait_ms"] / 1000)])
+        simple("db_pool_checkout_timeouts_total", "counter", "借出连接超时次数", [("", pool_stats["timeouts"])])
+
+        cache_stats = product_cache.stats()
+        simple("product_cache_requests_total", "counter", "商品缓存读取次数",
+               [('result="hit"', cache_stats["hits"]), ('result="miss"', cache_stats["misses"])])
+
+        from routes.order import purchase_gate
+        gate_stats = purchase_gate.stats()
+        simple("purchase_queue_waiting", "gauge", "购买准入队列中等待的请求数", [("", gate_stats["waiting"])])
+        simple("purchase_queue_rejected_total", "counter", "购买准入队列已满或超时被拒绝的请求数",
+               [("", gate_stats["rejected"])])
+
+        from ratelimit import rate_limiter
+        limit_stats = rate_limiter.stats()
+        simple("rate_limited_total", "counter", "被限流或并发上限拒绝的请求数",
+               [('reason="rate"', limit_stats["limited"]), ('reason="busy"', limit_stats["busy"])])
+        simple("db_admission_waiting", "gauge", "等待数据库并发名额的请求数", [("", limit_stats["waiting"])])
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def _endpoint():
+    return request.endpoint or "unmatched"
+
+
+def on_query(sql, params, seconds):
+    # db 层在每条 SQL 执行后回调；只统计请求上下文中的查询
+    if has_request_context():
+        metrics.observe_query(_endpoint(), seconds)
+        g.db_queries = g.get("db_queries", 0) + 1
+        g.db_time = g.get("db_time", 0.0) + seconds
+
+
+def init_app(app):
+    db.query_hooks.append(on_query)
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+        metrics.request_started()
+
+    @app.after_request
+    def record_request(response):
+        start = g.get("request_start")
+        if start is not None:
+            metrics.observe_request(_endpoint(), request.method, response.status_code,
+                                    time.perf_counter() - start, g.get("db_queries", 0))
+        response.headers["X-DB-Queries"] = str(g.get("db_queries", 0))
+        response.headers["X-DB-Time-Ms"] = f"{g.get('db_time', 0.0) * 1000:.2f}"
+        return response
+
+    @app.teardown_request
+    def finish_request(exc):
+        if g.get("request_start") is not None:
+            metrics.request_finished()
+
+    @app.route("/metrics", methods=["GET"])
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
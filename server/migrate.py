@@ -0,0 +1,223 @@
+"""数据库迁移: python migrate.py [up|status|check]
+
+migrations/ 下的 NNNN_名称.sql 按编号依次执行，执行过的版本记录在 schema_migrations 表中。
+课程数据库里的表、触发器和索引可能已经手工建过，执行时遇到“对象已存在”的错误视为已完成，
+因此对新库和已有库都可以重复执行。服务启动时会自动执行 (BUAADB_AUTO_MIGRATE=0 关闭)。
+
+check: 对 routes/ 中的热点查询执行 EXPLAIN，确认每条查询都走索引。
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+
+import pymysql
+
+from db import db_cursor
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+AUTO_MIGRATE = os.environ.get("BUAADB_AUTO_MIGRATE", "1") != "0"
+LOCK_NAME = "buaadb_migrate"
+
+# 表 / 列 / 索引 / 存储过程 / 触发器 / 外键 已存在
+ALREADY_EXISTS_ERRORS = {1050, 1060, 1061, 1304, 1359, 1826}
+
+MIGRATION_FILE_RE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+
+def load_migrations():
+    migrations = []
+    for name in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = MIGRATION_FILE_RE.match(name)
+        if not match:
+            continue
+        with open(os.path.join(MIGRATIONS_DIR, name), encoding="utf-8") as f:
+            text = f.read()
+        migrations.append({
+            "version": match.group(1),
+            "name": match.group(2),
+            "checksum": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+            "statements": split_statements(text),
+        })
+    return migrations
+
+
+def split_statements(text):
+    """按分号切分语句，支持 mysql 客户端的 DELIMITER 指令 (触发器体内含分号)"""
+    statements = []
+    delimiter = ";"
+    buffer = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.upper().startswith("DELIMITER "):
+            delimiter = stripped.split(None, 1)[1]
+            continue
+        if not buffer and (not stripped or stripped.startswith("--")):
+            continue
+        buffer.append(line)
+        if stripped.endswith(delimiter):
+            buffer[-1] = line[:line.rstrip().rfind(delimiter)]
+            statement = "\n".join(buffer).strip()
+            if statement:
+                statements.append(statement)
+            buffer = []
+    if "\n".join(buffer).strip():
+        statements.append("\n".join(buffer).strip())
+    return statements
+
+
+def ensure_history_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version    varchar(16)  NOT NULL,
+            name       varchar(128) NOT NULL,
+            checksum   char(64)     NOT NULL,
+            applied_at timestamp    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (version)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+
+
+def applied_migrations(cursor):
+    ensure_history_table(cursor)
+    cursor.execute("SELECT version, checksum, applied_at FROM schema_migrations")
+    return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+
+def apply_migrations():
+    """执行所有未执行的迁移，返回本次执行的版本号列表"""
+    applied = []
+    with db_cursor() as (conn, cursor):
+        # 多个进程同时启动时只允许一个执行迁移
+        cursor.execute("SELECT GET_LOCK(%s, 60)", (LOCK_NAME,))
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("等待迁移锁超时")
+        try:
+            done = applied_migrations(cursor)
+            for migration in load_migrations():
+                version = migration["version"]
+                if version in done:
+                    if done[version][0] != migration["checksum"]:
+                        print(f"[WARN] 迁移 {version}_{migration['name']} 执行后文件又被修改，不会重新执行")
+                    continue
+                for statement in migration["statements"]:
+                    try:
+                        cursor.execute(statement)
+                    except pymysql.MySQLError as e:
+                        if e.args and e.args[0] in ALREADY_EXISTS_ERRORS:
+                            print(f"[MIGRATE] {version} 跳过已存在的对象: {e.args[1]}")
+                            continue
+                        conn.rollback()
+                        raise
+                cursor.execute("INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                               (version, migration["name"], migration["checksum"]))
+                conn.commit()
+                applied.append(version)
+                print(f"[MIGRATE] 已执行 {version}_{migration['name']}")
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+    return applied
+
+
+def status():
+    with db_cursor() as (conn, cursor):
+        done = applied_migrations(cursor)
+    for migration in load_migrations():
+        record = done.get(migration["version"])
+        if record is None:
+            state = "待执行"
+        elif record[0] != migration["checksum"]:
+            state = f"已执行 {record[1]} (文件已修改)"
+        else:
+            state = f"已执行 {record[1]}"
+        print(f"{migration['version']}_{migration['name']:<24} {state}")
+
+
+def hot_queries(cursor):
+    # 与 routes/ 中实际执行的 SQL 相同；最后一项为必须走索引的表别名
+    from routes.interactions import FOLDER_ITEMS_SQL, comments_page_query, msgs_query
+    from feed import FEED_SQL
+    from routes.order import ORDERS_SQL
+    from sales import DAILY_SALES_SQL, LISTING_BASE_SQL
+    from similar import SIMILAR_SQL
+    from routes.product import PRODUCT_DETAIL_SQL, browse_query, parse_browse_args, product_page_query
+
+    def sample(sql, default="0" * 32):
+        # 尽量用库里真实存在的值，避免优化器直接判定“无匹配行”
+        cursor.execute(sql)
+        row = cursor.fetchone()
+        return row[0] if row else default
+
+    product = sample("SELECT product_id FROM products ORDER BY create_time DESC LIMIT 1")
+    user = sample("SELECT receiver_id FROM message ORDER BY time DESC LIMIT 1")
+    buyer = sample("SELECT buyer_id FROM orders ORDER BY created_time DESC LIMIT 1")
+    folder = sample("SELECT favorite_id FROM favorite_item ORDER BY created_time DESC LIMIT 1")
+    category = sample("SELECT category_id FROM categories LIMIT 1")
+    seller = sample("SELECT owner_id FROM products ORDER BY create_time DESC LIMIT 1")
+    ts = "2000-01-01 00:00:00"
+
+    return [
+        ("get_products", *product_page_query(["active"], None, 20), {"p"}),
+        ("get_products 翻页", *product_page_query(["active", "sold"], [ts, product], 20), {"p"}),
+        ("product 详情", PRODUCT_DETAIL_SQL, (product,), {"p"}),
+        ("get_comments", *comments_page_query(product, None, 20), {"c"}),
+        ("get_comments 翻页", *comments_page_query(product, [ts, "0" * 32], 20), {"c"}),
+        ("get_msgs", *msgs_query(user), {"m"}),
+        ("get_msgs 增量", *msgs_query(user, [ts, ""]), {"m"}),
+        ("get_orders", ORDERS_SQL, (buyer,), {"o"}),
+        ("get_favorites", FOLDER_ITEMS_SQL, (folder,), {"fi"}),
+        ("browse 分类", *browse_query(parse_browse_args({"category": category})), {"p"}),
+        ("browse 价格排序", *browse_query(parse_browse_args({"sort": "price_asc", "min_price": "50"})), {"p"}),
+        ("browse 分类+价格排序",
+         *browse_query(parse_browse_args({"category": category, "sort": "price_desc"})), {"p"}),
+        ("browse 卖家", *browse_query(parse_browse_args({"seller": seller})), {"p"}),
+        ("feed", FEED_SQL, (buyer, 0, 21), {"f", "p"}),
+        ("相似商品", SIMILAR_SQL, (product, 10), {"s", "p"}),
+        ("卖家看板 逐日", DAILY_SALES_SQL, (seller, ts), {"seller_sales_daily"}),
+        ("卖家看板 在售基数", LISTING_BASE_SQL, (seller, ts), {"seller_sales_daily"}),
+    ]
+
+
+def check_indexes():
+    """返回未走索引的查询数；表太小时优化器可能放弃已有索引，这种情况只给出警告"""
+    failures = 0
+    with db_cursor(pymysql.cursors.DictCursor) as (conn, cursor):
+        raw = conn.cursor()
+        try:
+            queries = hot_queries(raw)
+        finally:
+            raw.close()
+        for name, sql, params, aliases in queries:
+            cursor.execute("EXPLAIN " + sql, params)
+            plan = [row for row in cursor.fetchall() if row.get("table") in aliases]
+            if not plan:
+                print(f"SKIP  {name}: 优化器判定无匹配行，无法判断")
+                continue
+            for row in plan:
+                detail = f"table={row['table']} type={row['type']} key={row['key']} rows={row['rows']}"
+                extra = row.get("Extra") or ""
+                if row["key"]:
+                    level = "WARN" if "filesort" in extra else "OK"
+                elif row["possible_keys"]:
+                    level = "WARN"
+                    detail += f" possible_keys={row['possible_keys']} (数据量小时优化器会选择全表扫描)"
+                else:
+                    level = "FAIL"
+                    failures += 1
+                print(f"{level:<5} {name}: {detail} {extra}".rstrip())
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="数据库迁移")
+    parser.add_argument("command", nargs="?", default="up", choices=["up", "status", "check"])
+    args = parser.parse_args()
+
+    if args.command == "up":
+        applied = apply_migrations()
+        print(f"✅ 执行了 {len(applied)} 个迁移" if applied else "✅ 数据库已是最新")
+    elif args.command == "status":
+        status()
+    else:
+        sys.exit(1 if check_indexes() else 0)
@@ -0,0 +1,87 @@
+-- 基本表，字段定义见 doc/系统实现报告.md 第一章
+CREATE TABLE IF NOT EXISTS `users` (
+    `user_name`    varchar(32)  NOT NULL,
+    `password_md5` varchar(32)  NOT NULL,
+    `nickname`     varchar(32)  DEFAULT NULL,
+    `avatar_url`   varchar(256) DEFAULT NULL,
+    `phone`        varchar(32)  DEFAULT NULL,
+    `intro`        text,
+    `create_time`  timestamp    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (`user_name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS `categories` (
+    `category_id`   varchar(32) NOT NULL,
+    `category_name` varchar(32) NOT NULL,
+    PRIMARY KEY (`category_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS `products` (
+    `product_id`    varchar(32)   NOT NULL,
+    `product_title` varchar(32)   NOT NULL,
+    `description`   text,
+    `img_url`       varchar(256)  DEFAULT NULL,
+    `price`         decimal(10,2) NOT NULL,
+    `status`        varchar(32)   NOT NULL DEFAULT 'active',
+    `owner_id`      varchar(32)   NOT NULL,
+    `category_id`   varchar(32)   DEFAULT NULL,
+    `create_time`   timestamp     NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    `update_time`   timestamp     NULL DEFAULT NULL,
+    PRIMARY KEY (`product_id`),
+    CONSTRAINT `fk_products_owner` FOREIGN KEY (`owner_id`) REFERENCES `users` (`user_name`),
+    CONSTRAINT `fk_products_category` FOREIGN KEY (`category_id`) REFERENCES `categories` (`category_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS `orders` (
+    `order_id`     varchar(32) NOT NULL,
+    `order_status` varchar(32) NOT NULL,
+    `buyer_id`     varchar(32) NOT NULL,
+    `seller_id`    varchar(32) NOT NULL,
+    `product_id`   varchar(32) NOT NULL,
+    `created_time` timestamp   NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (`order_id`),
+    CONSTRAINT `fk_orders_buyer` FOREIGN KEY (`buyer_id`) REFERENCES `users` (`user_name`),
+    CONSTRAINT `fk_orders_seller` FOREIGN KEY (`seller_id`) REFERENCES `users` (`user_name`),
+    CONSTRAINT `fk_orders_product` FOREIGN KEY (`product_id`) REFERENCES `products` (`product_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS `message` (
+    `message_id`  varchar(32) NOT NULL,
+    `sender_id`   varchar(32) NOT NULL,
+    `receiver_id` varchar(32) NOT NULL,
+    `time`        timestamp   NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    `content`     text,
+    PRIMARY KEY (`message_id`),
+    CONSTRAINT `fk_message_sender` FOREIGN KEY (`sender_id`) REFERENCES `users` (`user_name`),
+    CONSTRAINT `fk_message_receiver` FOREIGN KEY (`receiver_id`) REFERENCES `users` (`user_name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS `comment` (
+    `comment_id` varchar(32)  NOT NULL,
+    `user_id`    varchar(32)  NOT NULL,
+    `product_id` varchar(32)  NOT NULL,
+    `time`       timestamp    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    `rating`     int unsigned NOT NULL DEFAULT 5,
+    `content`    text,
+    PRIMARY KEY (`comment_id`),
+    CONSTRAINT `fk_comment_user` FOREIGN KEY (`user_id`) REFERENCES `users` (`user_name`),
+    CONSTRAINT `fk_comment_product` FOREIGN KEY (`product_id`) REFERENCES `products` (`product_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS `favorites` (
+    `favorite_id`  varchar(32) NOT NULL,
+    `user_id`      varchar(32) NOT NULL,
+    `created_time` timestamp   NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    `name`         varchar(64) NOT NULL,
+    PRIMARY KEY (`favorite_id`),
+    CONSTRAINT `fk_favorites_user` FOREIGN KEY (`user_id`) REFERENCES `users` (`user_name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS `favorite_item` (
+    `favorite_id`  varchar(32) NOT NULL,
+    `product_id`   varchar(32) NOT NULL,
+    `created_time` timestamp   NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (`favorite_id`, `product_id`),
+    CONSTRAINT `fk_favorite_item_folder` FOREIGN KEY (`favorite_id`) REFERENCES `favorites` (`favorite_id`),
+    CONSTRAINT `fk_favorite_item_product` FOREIGN KEY (`product_id`) REFERENCES `products` (`product_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
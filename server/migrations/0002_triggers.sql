@@ -0,0 +1,42 @@
+-- 触发器，设计说明见 doc/系统实现报告.md 2.1 节
+
+DELIMITER $$
+
+-- 下单后将商品标记为已售出
+CREATE TRIGGER `after_order_insert`
+AFTER INSERT ON `orders`
+FOR EACH ROW
+BEGIN
+    UPDATE products
+    SET status = 'sold'
+    WHERE product_id = NEW.product_id;
+END$$
+
+-- 商品软删除后级联清理收藏和评论
+CREATE TRIGGER `after_product_delete`
+AFTER UPDATE ON `products`
+FOR EACH ROW
+BEGIN
+    IF NEW.status = 'deleted' THEN
+        DELETE FROM favorite_item WHERE product_id = NEW.product_id;
+        DELETE FROM comment WHERE product_id = NEW.product_id;
+    END IF;
+END$$
+
+-- 商品修改时自动维护 update_time
+CREATE TRIGGER `before_product_update`
+BEFORE UPDATE ON `products`
+FOR EACH ROW
+BEGIN
+    SET NEW.update_time = NOW();
+END$$
+
+-- 删除收藏夹前先清空其中的收藏项
+CREATE TRIGGER `before_favorite_delete`
+BEFORE DELETE ON `favorites`
+FOR EACH ROW
+BEGIN
+    DELETE FROM favorite_item WHERE favorite_id = OLD.favorite_id;
+END$$
+
+DELIMITER ;
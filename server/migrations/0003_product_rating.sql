@@ -0,0 +1,64 @@
+-- 商品评分汇总表：由 comment 表上的触发器增量维护，查询评分只需按主键读一行
+CREATE TABLE IF NOT EXISTS `product_rating` (
+    `product_id`   varchar(32) NOT NULL,
+    `rating_count` int unsigned NOT NULL DEFAULT 0,
+    `rating_sum`   int unsigned NOT NULL DEFAULT 0,
+    `star1`        int unsigned NOT NULL DEFAULT 0,
+    `star2`        int unsigned NOT NULL DEFAULT 0,
+    `star3`        int unsigned NOT NULL DEFAULT 0,
+    `star4`        int unsigned NOT NULL DEFAULT 0,
+    `star5`        int unsigned NOT NULL DEFAULT 0,
+    PRIMARY KEY (`product_id`)
+);
+
+-- 评论分页按 (product_id, time) 有序读取
+CREATE INDEX `idx_comment_product_time` ON `comment` (`product_id`, `time`);
+
+DELIMITER $$
+
+-- 发表评论后累加
+CREATE TRIGGER `after_comment_insert`
+AFTER INSERT ON `comment`
+FOR EACH ROW
+BEGIN
+    INSERT INTO product_rating (product_id, rating_count, rating_sum, star1, star2, star3, star4, star5)
+    VALUES (NEW.product_id, 1, NEW.rating,
+            NEW.rating = 1, NEW.rating = 2, NEW.rating = 3, NEW.rating = 4, NEW.rating = 5)
+    ON DUPLICATE KEY UPDATE
+        rating_count = rating_count + 1,
+        rating_sum = rating_sum + NEW.rating,
+        star1 = star1 + (NEW.rating = 1),
+        star2 = star2 + (NEW.rating = 2),
+        star3 = star3 + (NEW.rating = 3),
+        star4 = star4 + (NEW.rating = 4),
+        star5 = star5 + (NEW.rating = 5);
+END$$
+
+-- 删除评论后扣减 (包括 after_product_delete 触发器级联删除的评论)
+CREATE TRIGGER `after_comment_delete`
+AFTER DELETE ON `comment`
+FOR EACH ROW
+BEGIN
+    UPDATE product_rating
+    SET rating_count = rating_count - 1,
+        rating_sum = rating_sum - OLD.rating,
+        star1 = star1 - (OLD.rating = 1),
+        star2 = star2 - (OLD.rating = 2),
+        star3 = star3 - (OLD.rating = 3),
+        star4 = star4 - (OLD.rating = 4),
+        star5 = star5 - (OLD.rating = 5)
+    WHERE product_id = OLD.product_id;
+END$$
+
+DELIMITER ;
+
+-- 根据已有评论初始化汇总
+INSERT INTO product_rating (product_id, rating_count, rating_sum, star1, star2, star3, star4, star5)
+SELECT product_id, COUNT(*), SUM(rating),
+       SUM(rating = 1), SUM(rating = 2), SUM(rating = 3), SUM(rating = 4), SUM(rating = 5)
+FROM comment
+GROUP BY product_id
+ON DUPLICATE KEY UPDATE
+    rating_count = VALUES(rating_count), rating_sum = VALUES(rating_sum),
+    star1 = VALUES(star1), star2 = VALUES(star2), star3 = VALUES(star3),
+    star4 = VALUES(star4), star5 = VALUES(star5);
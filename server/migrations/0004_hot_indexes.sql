@@ -0,0 +1,15 @@
+-- 热点查询的索引，migrate.py check 会对这些查询做 EXPLAIN 校验
+-- (comment(product_id, time) 已在 0003 中创建)
+
+-- 商品列表: WHERE status IN (...) ORDER BY create_time DESC, product_id DESC 键集分页
+CREATE INDEX `idx_products_status_time` ON `products` (`status`, `create_time`, `product_id`);
+
+-- 消息: receiver_id / sender_id 两路 UNION，各自按时间增量拉取
+CREATE INDEX `idx_message_receiver_time` ON `message` (`receiver_id`, `time`);
+CREATE INDEX `idx_message_sender_time` ON `message` (`sender_id`, `time`);
+
+-- 我的订单: WHERE buyer_id = ? ORDER BY created_time DESC
+CREATE INDEX `idx_orders_buyer_time` ON `orders` (`buyer_id`, `created_time`);
+
+-- 收藏夹内容: WHERE favorite_id = ? ORDER BY created_time DESC
+CREATE INDEX `idx_favorite_item_folder_time` ON `favorite_item` (`favorite_id`, `created_time`);
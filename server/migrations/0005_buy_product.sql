@@ -0,0 +1,40 @@
+-- 原子购买: 条件更新商品状态 + 插入订单，一次 CALL 完成，返回本次购买的结果
+-- ok 购买成功 / sold 已被买走或未上架 / own 购买自己的商品 / not_found 商品不存在
+-- 行锁只在存储过程内部持有，不随客户端网络往返延长
+
+DELIMITER $$
+
+CREATE PROCEDURE `buy_product`(IN p_order_id varchar(32), IN p_buyer_id varchar(32), IN p_product_id varchar(32))
+BEGIN
+    DECLARE v_owner varchar(32) DEFAULT NULL;
+    DECLARE v_status varchar(32) DEFAULT NULL;
+    DECLARE CONTINUE HANDLER FOR NOT FOUND SET v_status = NULL;
+    DECLARE EXIT HANDLER FOR SQLEXCEPTION
+    BEGIN
+        ROLLBACK;
+        RESIGNAL;
+    END;
+
+    START TRANSACTION;
+    UPDATE products
+    SET status = 'sold'
+    WHERE product_id = p_product_id AND status = 'active' AND owner_id <> p_buyer_id;
+
+    IF ROW_COUNT() = 1 THEN
+        INSERT INTO orders (order_id, order_status, buyer_id, seller_id, product_id, created_time)
+        SELECT p_order_id, 'completed', p_buyer_id, owner_id, product_id, NOW()
+        FROM products WHERE product_id = p_product_id;
+        COMMIT;
+        SELECT 'ok' AS result;
+    ELSE
+        ROLLBACK;
+        SELECT owner_id, status INTO v_owner, v_status FROM products WHERE product_id = p_product_id;
+        SELECT CASE
+            WHEN v_status IS NULL THEN 'not_found'
+            WHEN v_status <> 'active' THEN 'sold'
+            ELSE 'own'
+        END AS result;
+    END IF;
+END$$
+
+DELIMITER ;
@@ -0,0 +1,62 @@
+-- 商品分面计数表：按 (状态, 分类, 价格档) 统计商品数，由 products 上的触发器增量维护，
+-- 分类 / 价格档的筛选计数只需读取这张小表，不扫描 products
+-- price_bucket = INTERVAL(price, 10, 50, 100, 200, 500, 1000, 5000)，与 routes/product.py 的 PRICE_EDGES 一致
+CREATE TABLE IF NOT EXISTS `product_facet_count` (
+    `status`        varchar(32)      NOT NULL,
+    `category_id`   varchar(32)      NOT NULL DEFAULT '',   -- 未分类记为 ''
+    `price_bucket`  tinyint unsigned NOT NULL,
+    `product_count` int              NOT NULL DEFAULT 0,
+    PRIMARY KEY (`status`, `category_id`, `price_bucket`)
+);
+
+-- /browse_products 的筛选排序: 分类 + 时间、价格、分类 + 价格、卖家 + 时间
+CREATE INDEX `idx_products_status_category_time` ON `products` (`status`, `category_id`, `create_time`, `product_id`);
+CREATE INDEX `idx_products_status_price` ON `products` (`status`, `price`, `product_id`);
+CREATE INDEX `idx_products_status_category_price` ON `products` (`status`, `category_id`, `price`, `product_id`);
+CREATE INDEX `idx_products_owner_status_time` ON `products` (`owner_id`, `status`, `create_time`, `product_id`);
+
+DELIMITER $$
+
+CREATE TRIGGER `after_product_facet_insert`
+AFTER INSERT ON `products`
+FOR EACH ROW
+BEGIN
+    INSERT INTO product_facet_count (status, category_id, price_bucket, product_count)
+    VALUES (NEW.status, IFNULL(NEW.category_id, ''), INTERVAL(NEW.price, 10, 50, 100, 200, 500, 1000, 5000), 1)
+    ON DUPLICATE KEY UPDATE product_count = product_count + 1;
+END$$
+
+-- 状态 / 分类 / 价格档任一变化时，从旧格子移到新格子
+CREATE TRIGGER `after_product_facet_update`
+AFTER UPDATE ON `products`
+FOR EACH ROW
+BEGIN
+    IF NOT (OLD.status <=> NEW.status AND OLD.category_id <=> NEW.category_id
+            AND INTERVAL(OLD.price, 10, 50, 100, 200, 500, 1000, 5000)
+                = INTERVAL(NEW.price, 10, 50, 100, 200, 500, 1000, 5000)) THEN
+        UPDATE product_facet_count SET product_count = product_count - 1
+        WHERE status = OLD.status AND category_id = IFNULL(OLD.category_id, '')
+          AND price_bucket = INTERVAL(OLD.price, 10, 50, 100, 200, 500, 1000, 5000);
+        INSERT INTO product_facet_count (status, category_id, price_bucket, product_count)
+        VALUES (NEW.status, IFNULL(NEW.category_id, ''), INTERVAL(NEW.price, 10, 50, 100, 200, 500, 1000, 5000), 1)
+        ON DUPLICATE KEY UPDATE product_count = product_count + 1;
+    END IF;
+END$$
+
+CREATE TRIGGER `after_product_facet_delete`
+AFTER DELETE ON `products`
+FOR EACH ROW
+BEGIN
+    UPDATE product_facet_count SET product_count = product_count - 1
+    WHERE status = OLD.status AND category_id = IFNULL(OLD.category_id, '')
+      AND price_bucket = INTERVAL(OLD.price, 10, 50, 100, 200, 500, 1000, 5000);
+END$$
+
+DELIMITER ;
+
+-- 根据已有商品初始化计数
+INSERT INTO product_facet_count (status, category_id, price_bucket, product_count)
+SELECT status, IFNULL(category_id, ''), INTERVAL(price, 10, 50, 100, 200, 500, 1000, 5000), COUNT(*)
+FROM products
+GROUP BY status, IFNULL(category_id, ''), INTERVAL(price, 10, 50, 100, 200, 500, 1000, 5000)
+ON DUPLICATE KEY UPDATE product_count = VALUES(product_count);
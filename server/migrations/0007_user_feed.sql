@@ -0,0 +1,62 @@
+-- 个性化首页：feed.py 预先计算每个用户的推荐列表，请求时按 (user_id, position) 主键顺序读取
+CREATE TABLE IF NOT EXISTS `user_feed` (
+    `user_id`    varchar(32)       NOT NULL,
+    `position`   smallint unsigned NOT NULL,
+    `product_id` varchar(32)       NOT NULL,
+    `score`      double            NOT NULL,
+    PRIMARY KEY (`user_id`, `position`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 收藏 / 评论 / 购买后由触发器把用户标记为待刷新 (dirty = 1)，后台任务按 changed_at 先后重算
+CREATE TABLE IF NOT EXISTS `user_feed_state` (
+    `user_id`    varchar(32) NOT NULL,
+    `dirty`      tinyint(1)  NOT NULL DEFAULT 1,
+    `changed_at` timestamp   NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    `built_at`   timestamp   NULL DEFAULT NULL,
+    PRIMARY KEY (`user_id`),
+    KEY `idx_user_feed_state_dirty` (`dirty`, `changed_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+DELIMITER $$
+
+CREATE TRIGGER `after_favorite_item_feed_insert`
+AFTER INSERT ON `favorite_item`
+FOR EACH ROW
+BEGIN
+    INSERT INTO user_feed_state (user_id, dirty, changed_at)
+    SELECT user_id, 1, NOW() FROM favorites WHERE favorite_id = NEW.favorite_id
+    ON DUPLICATE KEY UPDATE dirty = 1, changed_at = NOW();
+END$$
+
+CREATE TRIGGER `after_favorite_item_feed_delete`
+AFTER DELETE ON `favorite_item`
+FOR EACH ROW
+BEGIN
+    INSERT INTO user_feed_state (user_id, dirty, changed_at)
+    SELECT user_id, 1, NOW() FROM favorites WHERE favorite_id = OLD.favorite_id
+    ON DUPLICATE KEY UPDATE dirty = 1, changed_at = NOW();
+END$$
+
+CREATE TRIGGER `after_comment_feed_insert`
+AFTER INSERT ON `comment`
+FOR EACH ROW
+BEGIN
+    INSERT INTO user_feed_state (user_id, dirty, changed_at) VALUES (NEW.user_id, 1, NOW())
+    ON DUPLICATE KEY UPDATE dirty = 1, changed_at = NOW();
+END$$
+
+CREATE TRIGGER `after_order_feed_insert`
+AFTER INSERT ON `orders`
+FOR EACH ROW
+BEGIN
+    INSERT INTO user_feed_state (user_id, dirty, changed_at) VALUES (NEW.buyer_id, 1, NOW())
+    ON DUPLICATE KEY UPDATE dirty = 1, changed_at = NOW();
+END$$
+
+DELIMITER ;
+
+-- 已有行为的用户全部待刷新
+INSERT IGNORE INTO user_feed_state (user_id)
+SELECT f.user_id FROM favorites f JOIN favorite_item fi ON fi.favorite_id = f.favorite_id
+UNION SELECT user_id FROM comment
+UNION SELECT buyer_id FROM orders;
@@ -0,0 +1,8 @@
+-- 相似商品 ("收藏了这件的人还收藏了")：similar.py 离线计算每个商品的前 K 个邻居，详情接口按 (product_id, position) 主键顺序读取
+CREATE TABLE IF NOT EXISTS `product_similar` (
+    `product_id` varchar(32)      NOT NULL,
+    `position`   tinyint unsigned NOT NULL,
+    `similar_id` varchar(32)      NOT NULL,
+    `score`      double           NOT NULL,
+    PRIMARY KEY (`product_id`, `position`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,70 @@
+-- 卖家销售汇总表：按 (卖家, 日期, 分类) 记录销售额、售出件数和在售商品数的净变化，
+-- 由 orders / products 上的触发器在下单、上下架的同一事务中增量维护，卖家看板只按主键范围读取这张表
+-- 某天结束时的在售商品数 = 截至当天所有 listing_delta 之和
+-- 已有历史数据由 python sales.py backfill 分批重建
+CREATE TABLE IF NOT EXISTS `seller_sales_daily` (
+    `seller_id`     varchar(32)   NOT NULL,
+    `day`           date          NOT NULL,
+    `category_id`   varchar(32)   NOT NULL DEFAULT '',   -- 未分类记为 ''
+    `revenue`       decimal(14,2) NOT NULL DEFAULT 0,
+    `units`         int unsigned  NOT NULL DEFAULT 0,
+    `listing_delta` int           NOT NULL DEFAULT 0,
+    PRIMARY KEY (`seller_id`, `day`, `category_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+DELIMITER $$
+
+-- 下单 (buy_product 存储过程或条件更新) 后累加卖家当天的销售额
+CREATE TRIGGER `after_order_sales_insert`
+AFTER INSERT ON `orders`
+FOR EACH ROW
+BEGIN
+    INSERT INTO seller_sales_daily (seller_id, day, category_id, revenue, units)
+    SELECT NEW.seller_id, DATE(NEW.created_time), IFNULL(category_id, ''), price, 1
+    FROM products WHERE product_id = NEW.product_id
+    ON DUPLICATE KEY UPDATE revenue = revenue + VALUES(revenue), units = units + 1;
+END$$
+
+CREATE TRIGGER `after_product_listing_insert`
+AFTER INSERT ON `products`
+FOR EACH ROW
+BEGIN
+    IF NEW.status = 'active' THEN
+        INSERT INTO seller_sales_daily (seller_id, day, category_id, listing_delta)
+        VALUES (NEW.owner_id, DATE(NEW.create_time), IFNULL(NEW.category_id, ''), 1)
+        ON DUPLICATE KEY UPDATE listing_delta = listing_delta + 1;
+    END IF;
+END$$
+
+-- 上架 / 下架 / 售出 / 删除，以及在售商品换分类
+CREATE TRIGGER `after_product_listing_update`
+AFTER UPDATE ON `products`
+FOR EACH ROW
+BEGIN
+    IF NOT ((OLD.status = 'active') <=> (NEW.status = 'active') AND OLD.category_id <=> NEW.category_id
+            AND OLD.owner_id <=> NEW.owner_id) THEN
+        IF OLD.status = 'active' THEN
+            INSERT INTO seller_sales_daily (seller_id, day, category_id, listing_delta)
+            VALUES (OLD.owner_id, CURDATE(), IFNULL(OLD.category_id, ''), -1)
+            ON DUPLICATE KEY UPDATE listing_delta = listing_delta - 1;
+        END IF;
+        IF NEW.status = 'active' THEN
+            INSERT INTO seller_sales_daily (seller_id, day, category_id, listing_delta)
+            VALUES (NEW.owner_id, CURDATE(), IFNULL(NEW.category_id, ''), 1)
+            ON DUPLICATE KEY UPDATE listing_delta = listing_delta + 1;
+        END IF;
+    END IF;
+END$$
+
+CREATE TRIGGER `after_product_listing_delete`
+AFTER DELETE ON `products`
+FOR EACH ROW
+BEGIN
+    IF OLD.status = 'active' THEN
+        INSERT INTO seller_sales_daily (seller_id, day, category_id, listing_delta)
+        VALUES (OLD.owner_id, CURDATE(), IFNULL(OLD.category_id, ''), -1)
+        ON DUPLICATE KEY UPDATE listing_delta = listing_delta - 1;
+    END IF;
+END$$
+
+DELIMITER ;
@@ -0,0 +1,42 @@
+-- 重建 buy_product: 0005 中用 INSERT INTO orders ... SELECT ... FROM products 写订单，
+-- 而 orders 上的 after_order_insert 触发器 (0002) 会 UPDATE products，MySQL 不允许触发器修改调用语句正在读取的表 (错误 1442)，
+-- 购买因此全部失败。改为条件更新成功后先读出卖家 (该行已被本事务锁住)，再用 INSERT ... VALUES 写订单
+
+DROP PROCEDURE IF EXISTS `buy_product`;
+
+DELIMITER $$
+
+CREATE PROCEDURE `buy_product`(IN p_order_id varchar(32), IN p_buyer_id varchar(32), IN p_product_id varchar(32))
+BEGIN
+    DECLARE v_owner varchar(32) DEFAULT NULL;
+    DECLARE v_status varchar(32) DEFAULT NULL;
+    DECLARE CONTINUE HANDLER FOR NOT FOUND SET v_status = NULL;
+    DECLARE EXIT HANDLER FOR SQLEXCEPTION
+    BEGIN
+        ROLLBACK;
+        RESIGNAL;
+    END;
+
+    START TRANSACTION;
+    UPDATE products
+    SET status = 'sold'
+    WHERE product_id = p_product_id AND status = 'active' AND owner_id <> p_buyer_id;
+
+    IF ROW_COUNT() = 1 THEN
+        SELECT owner_id INTO v_owner FROM products WHERE product_id = p_product_id;
+        INSERT INTO orders (order_id, order_status, buyer_id, seller_id, product_id, created_time)
+        VALUES (p_order_id, 'completed', p_buyer_id, v_owner, p_product_id, NOW());
+        COMMIT;
+        SELECT 'ok' AS result;
+    ELSE
+        ROLLBACK;
+        SELECT owner_id, status INTO v_owner, v_status FROM products WHERE product_id = p_product_id;
+        SELECT CASE
+            WHEN v_status IS NULL THEN 'not_found'
+            WHEN v_status <> 'active' THEN 'sold'
+            ELSE 'own'
+        END AS result;
+    END IF;
+END$$
+
+DELIMITER ;
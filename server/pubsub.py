@@ -0,0 +1,90 @@
+import threading
+import time
+
+from cache import CACHE_CONFIG
+
+# 最近事件时间只保留这么久，更早的等待者直接回源数据库
+EVENT_RETENTION_SECONDS = 300
+
+
+class MessageHub:
+    """按频道 (用户名) 唤醒长轮询的等待者
+
+    每个频道记录最近一次事件的时间戳，等待者带上自己上次看到的时间戳，
+    有更新的事件才被唤醒，因此在开始等待之前发生的事件也不会丢失。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last = {}        # channel -> 最近一次事件的时间戳
+        self._waiters = {}     # channel -> (Condition, 等待者数量)
+        self.horizon = time.time()
+
+    def publish(self, channel):
+        self._notify_local(channel)
+
+    def _notify_local(self, channel):
+        now = time.time()
+        with self._lock:
+            self._last[channel] = now
+            if len(self._last) > 1024 and now - self.horizon > EVENT_RETENTION_SECONDS:
+                cutoff = now - EVENT_RETENTION_SECONDS
+                self._last = {k: v for k, v in self._last.items() if v > cutoff}
+                self.horizon = cutoff
+            waiter = self._waiters.get(channel)
+        if waiter:
+            with waiter[0]:
+                waiter[0].notify_all()
+
+    def now(self):
+        return time.time()
+
+    def wait(self, channel, after, timeout):
+        """after 之后频道有新事件返回 True，超时返回 False；after 早于保留窗口时直接返回 True"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            if after < self.horizon or self._last.get(channel, 0) > after:
+                return True
+            cond, count = self._waiters.get(channel, (None, 0))
+            if cond is None:
+                cond = threading.Condition()
+            self._waiters[channel] = (cond, count + 1)
+
+        try:
+            with cond:
+                while self._last.get(channel, 0) <= after:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    cond.wait(remaining)
+                return True
+        finally:
+            with self._lock:
+                cond, count = self._waiters[channel]
+                if count <= 1:
+                    del self._waiters[channel]
+                else:
+                    self._waiters[channel] = (cond, count - 1)
+
+
+class RedisMessageHub(MessageHub):
+    """多 worker 部署: 通过 Redis PUBLISH 广播事件，每个进程一个后台线程接收后唤醒本地等待者"""
+
+    CHANNEL = "buaadb:msg"
+
+    def __init__(self, url):
+        super().__init__()
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{self.CHANNEL: self._on_message})
+        self._pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def publish(self, channel):
+        self._client.publish(self.CHANNEL, channel)
+
+    def _on_message(self, message):
+        self._notify_local(message["data"].decode("utf-8"))
+
+
+message_hub = RedisMessageHub(CACHE_CONFIG['redis_url']) if CACHE_CONFIG['backend'] == 'redis' else MessageHub()
@@ -0,0 +1,194 @@
+"""请求限流与数据库并发准入
+
+每个请求按 token 中的用户 (未登录时按客户端 IP) 和接口各占一个令牌桶，桶空时返回 429 与 Retry-After；
+访问数据库的请求另受全局并发上限约束，超出的短暂排队，队列满或等待超时同样返回 429，
+不会让单个客户端占满连接池、拖慢所有人。
+令牌桶默认在进程内，多 worker 部署时设 BUAADB_RATE_LIMIT_BACKEND=redis 共享；并发上限按进程计 (每个进程有自己的连接池)。
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+
+from cache import CACHE_CONFIG
+from db import POOL_CONFIG
+from utils import AdmissionGate, RedisRevokedTokens, revoked_tokens, verify_token
+
+RATE_LIMIT_CONFIG = {
+    'enabled': os.environ.get("BUAADB_RATE_LIMIT", "1") != "0",
+    'backend': os.environ.get("BUAADB_RATE_LIMIT_BACKEND", CACHE_CONFIG['backend']),
+    'redis_url': CACHE_CONFIG['redis_url'],
+    # (每秒补充的令牌数, 桶容量)：容量为允许的突发请求数
+    'default': (20, 40),
+    'routes': {
+        'product.search_products': (5, 20),
+        'interaction.send_msg': (2, 10),
+        'interaction.publish_comment': (1, 5),
+        'order.buy_product': (2, 10),
+        'auth.login': (0.5, 10),            # 未登录，按 IP 计，限制暴力尝试
+        'auth.register': (0.1, 5),
+        'file.upload_file': (1, 10),
+    },
+    # 不受令牌桶限制的客户端 IP (逗号分隔)，例如从本机发起的压测: BUAADB_RATE_LIMIT_TRUSTED=127.0.0.1
+    # 默认为空: 反向代理部署时所有请求都来自本机，不能默认放行回环地址
+    'trusted': {ip for ip in os.environ.get("BUAADB_RATE_LIMIT_TRUSTED", "").split(",") if ip},
+    # 不受限流的接口 (监控抓取、静态文件)
+    'exempt': {'prometheus_metrics', 'slow_queries', 'static_uploads.serve_upload'},
+    # 全局并发: 同时访问数据库的请求数，默认与连接池上限一致，超出的最多再排队 max_waiting 个
+    'max_concurrent': POOL_CONFIG['max_size'],
+    'max_waiting': POOL_CONFIG['max_size'],
+    'wait_timeout': 1.0,
+    # 不占用数据库并发名额的接口: 长轮询大部分时间只在进程内等待
+    'not_db_bound': {'interaction.poll_msgs'},
+}
+
+
+class TokenBuckets:
+    """进程内令牌桶，已回满的桶定期清除，内存只与最近活跃的 (客户端, 接口) 数有关"""
+
+    def __init__(self):
+        self._buckets = {}      # key -> (令牌数, 上次更新时间, 回满时间)
+        self._lock = threading.Lock()
+        self._next_purge = 0
+
+    def take(self, key, rate, burst):
+        """取一个令牌，返回 (是否允许, 需要等待的秒数)"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            tokens = burst if bucket is None else min(burst, bucket[0] + (now - bucket[1]) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            if now >= self._next_purge:
+                self._buckets = {k: v for k, v in self._buckets.items() if v[2] > now}
+                self._next_purge = now + 60
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+
+class RedisTokenBuckets:
+    """多 worker 共享的令牌桶，取令牌在 Lua 脚本中原子完成，桶回满后由 key 过期自动清除"""
+
+    SCRIPT = """
+        local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+        local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+        local tokens = tonumber(bucket[1]) or burst
+        local ts = tonumber(bucket[2]) or now
+        tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+        local allowed = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+            allowed = 1
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+        redis.call('EXPIRE', KEYS[1], math.ceil((burst - tokens) / rate) + 1)
+        return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(self.SCRIPT)
+
+    def take(self, key, rate, burst):
+        allowed, tokens = self._take(keys=[f"ratelimit:{key}"], args=[rate, burst, time.time()])
+        return bool(allowed), 0.0 if allowed else (1 - float(tokens)) / rate
+
+
+def make_buckets(config=RATE_LIMIT_CONFIG):
+    if config['backend'] == 'redis':
+        return RedisTokenBuckets(config['redis_url'])
+    return TokenBuckets()
+
+
+class RateLimiter:
+    def __init__(self, config=RATE_LIMIT_CONFIG):
+        self.config = config
+        self.buckets = make_buckets(config)
+        self.db_gate = AdmissionGate(config['max_concurrent'], config['max_waiting'], config['wait_timeout'])
+        self.limited = 0        # 因令牌桶被拒绝的请求数
+        self._lock = threading.Lock()
+
+    def check(self, endpoint, client):
+        """返回 None 表示允许，否则返回建议的 Retry-After 秒数"""
+        rate, burst = self.config['routes'].get(endpoint, self.config['default'])
+        try:
+            allowed, wait = self.buckets.take(f"{endpoint}:{client}", rate, burst)
+        except Exception as e:
+            # 共享存储不可用时放行，限流故障不应让整个服务不可用
+            print(f"[ERROR] 限流检查失败: {e}")
+            return None
+        if allowed:
+            return None
+        with self._lock:
+            self.limited += 1
+        return max(1, math.ceil(wait))
+
+    async def acheck(self, endpoint, authorization, remote_addr):
+        """异步服务模式使用: Redis 令牌桶和 token 注销检查是阻塞调用，放到线程池执行，不阻塞事件循环"""
+        def check():
+            return self.check(endpoint, client_key(authorization, remote_addr))
+        if isinstance(self.buckets, TokenBuckets) and not isinstance(revoked_tokens, RedisRevokedTokens):
+            return check()
+        return await asyncio.get_running_loop().run_in_executor(None, check)
+
+    def stats(self):
+        gate = self.db_gate.stats()
+        return {"limited": self.limited, "busy": gate["rejected"], "waiting": gate["waiting"]}
+
+
+rate_limiter = RateLimiter()
+
+
+def client_key(authorization, remote_addr):
+    user_name = verify_token(authorization)
+    return f"user:{user_name}" if user_name else f"ip:{remote_addr}"
+
+
+def init_app(app):
+    from flask import g, jsonify, request
+
+    if not RATE_LIMIT_CONFIG['enabled']:
+        return
+
+    def too_many(message, retry_after):
+        response = jsonify({"message": message})
+        response.status_code = 429
+        response.headers["Retry-After"] = str(retry_after)
+        return response
+
+    @app.before_request
+    def limit_request():
+        endpoint = request.endpoint
+        if endpoint is None or endpoint in RATE_LIMIT_CONFIG['exempt'] or request.method == "OPTIONS":
+            return None
+
+        if request.remote_addr not in RATE_LIMIT_CONFIG['trusted']:
+            retry_after = rate_limiter.check(endpoint, client_key(request.headers.get("Authorization"),
+                                                                 request.remote_addr))
+            if retry_after is not None:
+                return too_many("请求过于频繁，请稍后重试", retry_after)
+
+        if endpoint not in RATE_LIMIT_CONFIG['not_db_bound']:
+            if rate_limiter.db_gate.acquire("db"):
+                return too_many("服务器繁忙，请稍后重试", 1)
+            g.db_slot = True
+        return None
+
+    def release_slot():
+        rate_limiter.db_gate.release("db")
+
+    @app.after_request
+    def hold_slot_until_sent(response):
+        # stream=1 的响应在视图返回后才边查边输出，期间一直占用连接，名额要到响应发送完才归还
+        if g.pop("db_slot", False):
+            response.call_on_close(release_slot)
+        return response
+
+    @app.teardown_request
+    def release_unsent_slot(exc):
+        # 异常未生成响应 (after_request 没有执行) 时在这里归还
+        if g.pop("db_slot", False):
+            release_slot()
@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify
 from db import get_db_connection
-from utils import md5, generate_token, token_store
+from utils import md5, generate_token, revoke_token
 import pymysql
 
 auth_bp = Blueprint('auth', __name__)
@@ -78,7 +78,6 @@ def register():
 @auth_bp.route("/logout", methods=["POST"])
 def logout():
     token = request.headers.get("Authorization")
-    if token and token in token_store:
-        del token_store[token]
+    if revoke_token(token):
         return jsonify({"message": "已成功退出登录"}), 200
     return jsonify({"message": "token 无效或已过期"}), 400
\ No newline at end of file
@@ -1,45 +1,345 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, send_file, abort
+from werkzeug.security import safe_join
+from utils import verify_token
+import hashlib
 import os
+import re
+import threading
+import time
 import uuid
 
 file_bp = Blueprint('file', __name__)
+# 上传文件的静态访问，不带 /api 前缀
+static_bp = Blueprint('static_uploads', __name__)
 
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'static', 'uploads')
+# 分片上传的临时文件目录
+PARTIAL_FOLDER = os.path.join(UPLOAD_FOLDER, '.partial')
 
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+PARTIAL_EXPIRE_SECONDS = 24 * 3600
+# 整个请求体的上限 (app.config['MAX_CONTENT_LENGTH'])，留出 multipart 边界和表单字段的余量；
+# Werkzeug 在读取请求体时按它截断，chunked 请求同样生效
+MAX_REQUEST_SIZE = MAX_UPLOAD_SIZE + CHUNK_SIZE
+# 每个用户同时未完成的分片上传数
+MAX_PENDING_UPLOADS = 5
+# 分片写入锁超过该时间视为进程异常退出留下的，可以清除
+CHUNK_LOCK_TIMEOUT = 300
 
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+# 按文件头魔数识别格式，不信任扩展名
+MAGIC_NUMBERS = [
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+]
 
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+for folder in (UPLOAD_FOLDER, PARTIAL_FOLDER):
+    if not os.path.exists(folder):
+        os.makedirs(folder)
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def detect_format(head):
+    for magic, ext in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return ext
+    return None
+
+def file_url(filename):
+    return f"{request.host_url}static/uploads/{filename}"
+
+def find_by_hash(digest):
+    # 文件以内容哈希命名，同样的内容只保存一份
+    for ext in ('png', 'jpg', 'gif'):
+        filename = f"{digest}.{ext}"
+        if os.path.exists(os.path.join(UPLOAD_FOLDER, filename)):
+            return filename
+    return None
+
+def commit_file(tmp_path, digest, ext):
+    # 返回 (文件名, 是否命中已有文件)
+    filename = f"{digest}.{ext}"
+    final_path = os.path.join(UPLOAD_FOLDER, filename)
+    if os.path.exists(final_path):
+        os.remove(tmp_path)
+        return filename, True
+    os.replace(tmp_path, final_path)
+    return filename, False
+
+def read_chunks(stream):
+    return iter(lambda: stream.read(CHUNK_SIZE), b'')
+
+def digest_chunks(chunks, sink=None):
+    """边读边计算哈希并校验格式和大小，返回 (sha256, 扩展名)"""
+    sha256 = hashlib.sha256()
+    size = 0
+    ext = None
+    for chunk in chunks:
+        if ext is None:
+            ext = detect_format(chunk)
+            if ext is None:
+                raise UploadError("不支持的文件格式 (仅支持 png, jpg, jpeg, gif)")
+        size += len(chunk)
+        if size > MAX_UPLOAD_SIZE:
+            raise UploadError(f"文件过大 (最大 {MAX_UPLOAD_SIZE // 1024 // 1024}MB)", 413)
+        sha256.update(chunk)
+        if sink:
+            sink(chunk)
+    if ext is None:
+        raise UploadError("文件为空")
+    return sha256.hexdigest(), ext
+
+def store_stream(stream):
+    # 分块写入临时文件，超过大小上限立即中止
+    tmp_path = os.path.join(PARTIAL_FOLDER, f"{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, 'wb') as out:
+            digest, ext = digest_chunks(read_chunks(stream), out.write)
+        return commit_file(tmp_path, digest, ext)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def upload_response(filename, dedup):
+    return jsonify({
+        "url": file_url(filename),
+        "dedup": dedup,
+        "message": "上传成功"
+    }), 200 if dedup else 201
+
+def current_user():
+    return verify_token(request.headers.get("Authorization"))
 
 @file_bp.route("/upload", methods=["POST"])
 def upload_file():
+    if not current_user():
+        return jsonify({"message": "未登录"}), 403
+    if request.content_length and request.content_length > MAX_UPLOAD_SIZE + CHUNK_SIZE:
+        return jsonify({"message": f"文件过大 (最大 {MAX_UPLOAD_SIZE // 1024 // 1024}MB)"}), 413
+
     if 'file' not in request.files:
         return jsonify({"message": "未检测到文件"}), 400
-    
+
     file = request.files['file']
-    file_type = request.form.get('type', 'common') 
+    file_type = request.form.get('type', 'common')
 
     if file.filename == '':
         return jsonify({"message": "未选择文件"}), 400
 
-    if file and allowed_file(file.filename):
-        ext = file.filename.rsplit('.', 1)[1].lower()
-        filename = f"{uuid.uuid4().hex}.{ext}"
-        
-        save_path = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(save_path)
+    try:
+        filename, dedup = store_stream(file.stream)
+    except UploadError as e:
+        return jsonify({"message": e.message}), e.status
+
+    return upload_response(filename, dedup)
+
+# 秒传: 客户端先提交内容的 sha256，已存在则直接返回地址，无需上传
+@file_bp.route("/upload/check/<digest>", methods=["GET"])
+def check_upload(digest):
+    filename = find_by_hash(digest.lower()) if re.fullmatch(r"[0-9a-fA-F]{64}", digest) else None
+    if not filename:
+        return jsonify({"exists": False}), 200
+    return jsonify({"exists": True, "url": file_url(filename)}), 200
+
+# 分片/断点续传:
+# 1. POST /upload/init 获取 upload_id
+# 2. PUT /upload/chunk/<upload_id>?offset=n 请求体为原始字节，offset 必须等于已接收的字节数
+# 3. 中断后 GET /upload/status/<upload_id> 查询已接收字节数，从该位置继续
+# 4. POST /upload/complete/<upload_id> 校验格式并按内容哈希入库
+# 都需要登录，upload_id 只能由创建它的用户使用 (<upload_id>.owner 记录用户名，多 worker 共享)
+def partial_path(upload_id):
+    if not re.fullmatch(r"[0-9a-f]{32}", upload_id):
+        raise UploadError("无效的 upload_id")
+    return os.path.join(PARTIAL_FOLDER, f"{upload_id}.part")
+
+def owner_path(upload_id):
+    return os.path.join(PARTIAL_FOLDER, f"{upload_id}.owner")
+
+def read_owner(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def owned_partial(upload_id):
+    """校验登录用户与 upload_id，返回分片文件路径；任务不存在或不属于该用户时抛出 UploadError"""
+    user_name = current_user()
+    if not user_name:
+        raise UploadError("未登录", 403)
+    path = partial_path(upload_id)
+    if not os.path.exists(path) or read_owner(owner_path(upload_id)) != user_name:
+        raise UploadError("上传任务不存在或已过期", 404)
+    return path
+
+def remove_partial(upload_id):
+    for path in (partial_path(upload_id), owner_path(upload_id)):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def lock_partial(path):
+    # O_EXCL 创建锁文件是原子的 (跨进程、跨平台)，同一任务同时只允许一个分片写入
+    lock_path = f"{path}.lock"
+    for _ in range(2):
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return lock_path
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) <= CHUNK_LOCK_TIMEOUT:
+                    return None
+                os.remove(lock_path)
+            except OSError:
+                pass
+    return None
+
+def cleanup_partials():
+    now = time.time()
+    for name in os.listdir(PARTIAL_FOLDER):
+        path = os.path.join(PARTIAL_FOLDER, name)
+        try:
+            if now - os.path.getmtime(path) > PARTIAL_EXPIRE_SECONDS:
+                os.remove(path)
+        except OSError:
+            pass
+
+@file_bp.route("/upload/init", methods=["POST"])
+def init_upload():
+    user_name = current_user()
+    if not user_name:
+        return jsonify({"message": "未登录"}), 403
+    cleanup_partials()
+    pending = sum(1 for name in os.listdir(PARTIAL_FOLDER)
+                  if name.endswith(".owner") and read_owner(os.path.join(PARTIAL_FOLDER, name)) == user_name)
+    if pending >= MAX_PENDING_UPLOADS:
+        return jsonify({"message": f"未完成的上传任务过多 (最多 {MAX_PENDING_UPLOADS} 个)"}), 429
+
+    upload_id = uuid.uuid4().hex
+    with open(owner_path(upload_id), 'w', encoding='utf-8') as f:
+        f.write(user_name)
+    open(partial_path(upload_id), 'wb').close()
+    return jsonify({"upload_id": upload_id, "chunk_size": CHUNK_SIZE * 16, "max_size": MAX_UPLOAD_SIZE}), 201
+
+@file_bp.route("/upload/status/<upload_id>", methods=["GET"])
+def upload_status(upload_id):
+    try:
+        path = owned_partial(upload_id)
+    except UploadError as e:
+        return jsonify({"message": e.message}), e.status
+    return jsonify({"received": os.path.getsize(path)}), 200
+
+@file_bp.route("/upload/chunk/<upload_id>", methods=["PUT"])
+def upload_chunk(upload_id):
+    try:
+        path = owned_partial(upload_id)
+        offset = int(request.args.get("offset", -1))
+    except UploadError as e:
+        return jsonify({"message": e.message}), e.status
+    except ValueError:
+        return jsonify({"message": "参数错误"}), 400
+    if request.content_length and offset + request.content_length > MAX_UPLOAD_SIZE:
+        return jsonify({"message": f"文件过大 (最大 {MAX_UPLOAD_SIZE // 1024 // 1024}MB)"}), 413
+
+    # 检查 offset 与追加写入必须在同一把锁内，否则两个并发分片可能都通过检查
+    lock_path = lock_partial(path)
+    if lock_path is None:
+        return jsonify({"message": "该上传任务正在写入其他分片", "received": os.path.getsize(path)}), 409
+    try:
+        received = os.path.getsize(path)
+        if offset != received:
+            return jsonify({"message": "offset 与已接收字节数不一致", "received": received}), 409
+
+        with open(path, 'ab') as out:
+            for chunk in read_chunks(request.stream):
+                received += len(chunk)
+                if received > MAX_UPLOAD_SIZE:
+                    out.close()
+                    remove_partial(upload_id)
+                    return jsonify({"message": f"文件过大 (最大 {MAX_UPLOAD_SIZE // 1024 // 1024}MB)"}), 413
+                out.write(chunk)
+    finally:
+        os.remove(lock_path)
+
+    return jsonify({"received": received}), 200
+
+@file_bp.route("/upload/complete/<upload_id>", methods=["POST"])
+def complete_upload(upload_id):
+    try:
+        path = owned_partial(upload_id)
+    except UploadError as e:
+        return jsonify({"message": e.message}), e.status
+
+    lock_path = lock_partial(path)
+    if lock_path is None:
+        return jsonify({"message": "该上传任务正在写入分片"}), 409
+    try:
+        with open(path, 'rb') as f:
+            digest, ext = digest_chunks(read_chunks(f))
+        filename, dedup = commit_file(path, digest, ext)
+    except UploadError as e:
+        os.remove(path)
+        return jsonify({"message": e.message}), e.status
+    finally:
+        os.remove(lock_path)
+        try:
+            os.remove(owner_path(upload_id))
+        except OSError:
+            pass
+
+    return upload_response(filename, dedup)
+
+
+# 静态访问 /static/uploads/<filename>
+# send_file 负责 If-None-Match -> 304 和 Range -> 206，部署在 gunicorn 等支持
+# wsgi.file_wrapper 的服务器上时由 sendfile 零拷贝发送，配合 nginx 可开启 USE_X_SENDFILE
+CONTENT_ADDRESSED_RE = re.compile(r"[0-9a-f]{64}\.(png|jpg|gif)")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+LEGACY_CACHE = "public, max-age=86400"
+
+# 旧的随机文件名没有内容哈希，首次访问时计算并缓存: path -> (mtime, size, sha256)
+_legacy_etags = {}
+_legacy_lock = threading.Lock()
+
+def legacy_etag(path):
+    stat = os.stat(path)
+    with _legacy_lock:
+        cached = _legacy_etags.get(path)
+    if cached and cached[:2] == (stat.st_mtime, stat.st_size):
+        return cached[2]
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in read_chunks(f):
+            sha256.update(chunk)
+    with _legacy_lock:
+        _legacy_etags[path] = (stat.st_mtime, stat.st_size, sha256.hexdigest())
+    return sha256.hexdigest()
 
-        file_url = f"{request.host_url}static/uploads/{filename}"
+@static_bp.route("/static/uploads/<path:filename>", methods=["GET", "HEAD"])
+def serve_upload(filename):
+    path = safe_join(UPLOAD_FOLDER, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    # 按规范化后的相对路径逐段检查，x/../.partial/<id> 这类路径同样不能访问隐藏目录 / 文件
+    if any(part.startswith('.') for part in os.path.relpath(path, UPLOAD_FOLDER).split(os.sep)):
+        abort(404)
 
-        return jsonify({
-            "url": file_url, 
-            "message": "上传成功"
-        }), 201
+    content_addressed = CONTENT_ADDRESSED_RE.fullmatch(filename)
+    # 内容寻址的文件名本身就是内容哈希，直接作为强 ETag
+    etag = filename.split('.', 1)[0] if content_addressed else legacy_etag(path)
 
-    return jsonify({"message": "不支持的文件格式 (仅支持 png, jpg, jpeg, gif)"}), 400
\ No newline at end of file
+    response = send_file(path, conditional=True, etag=etag)
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE if content_addressed else LEGACY_CACHE
+    return response
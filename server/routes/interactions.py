@@ -1,6 +1,9 @@
 from flask import Blueprint, request, jsonify
-from db import get_db_connection
-from utils import verify_token
+from db import get_db_connection, StreamingQuery
+from utils import verify_token, encode_cursor, decode_cursor, parse_limit, KeysetPage, STREAM_MAX_LIMIT
+from fastjson import stream_response
+from pubsub import message_hub
+import math
 import pymysql
 import uuid
 
@@ -25,6 +28,10 @@ def publish_comment():
     if not product_id or not content:
         return jsonify({"message": "参数不完整"}), 400
 
+    # 评分汇总按 1~5 星分桶统计
+    if not isinstance(rate, int) or not 1 <= rate <= 5:
+        return jsonify({"message": "评分必须是 1~5 的整数"}), 400
+
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -50,26 +57,70 @@ def publish_comment():
         conn.close()
 
 # 2. 获取某商品的评论
+# 参数: limit, cursor (上一页返回的 next_cursor)，按 (time, comment_id) 倒序做键集分页
+# 第一页同时返回评分汇总 (product_rating 表由 comment 上的触发器维护，见 migrations/0003_product_rating.sql)
+def load_rating(cursor, product_id):
+    cursor.execute("""
+        SELECT rating_count, rating_sum, star1, star2, star3, star4, star5
+        FROM product_rating WHERE product_id = %s
+    """, (product_id,))
+    r = cursor.fetchone()
+    if not r or not r['rating_count']:
+        return {"count": 0, "average": None, "histogram": {str(i): 0 for i in range(1, 6)}}
+    return {
+        "count": r['rating_count'],
+        "average": round(r['rating_sum'] / r['rating_count'], 2),
+        "histogram": {str(i): r[f'star{i}'] for i in range(1, 6)},
+    }
+
+def comments_page_query(product_id, after, limit):
+    keyset = "AND (c.time < %s OR (c.time = %s AND c.comment_id < %s))" if after else ""
+    params = [product_id] + ([after[0], after[0], after[1]] if after else []) + [limit + 1]
+    sql = f"""
+        SELECT c.*, u.nickname, u.avatar_url 
+        FROM comment c
+        JOIN users u ON c.user_id = u.user_name
+        WHERE c.product_id = %s {keyset}
+        ORDER BY c.time DESC, c.comment_id DESC
+        LIMIT %s
+    """
+    return sql, params
+
 @interaction_bp.route("/get_comments/<product_id>", methods=["GET"])
 def get_comments(product_id):
+    # stream=1 时用服务端游标边查边输出，limit 上限为 STREAM_MAX_LIMIT
+    stream = request.args.get("stream") == "1"
+    limit = parse_limit(request.args.get("limit"), maximum=STREAM_MAX_LIMIT if stream else 100)
+    after = None
+    if request.args.get("cursor"):
+        after = decode_cursor(request.args["cursor"], 2)
+        if not after:
+            return jsonify({"message": "无效的分页游标"}), 400
+
     conn = get_db_connection()
     cursor = conn.cursor(pymysql.cursors.DictCursor)
     try:
-        sql = """
-            SELECT c.*, u.nickname, u.avatar_url 
-            FROM comment c
-            JOIN users u ON c.user_id = u.user_name
-            WHERE c.product_id = %s
-            ORDER BY c.time DESC
-        """
-        cursor.execute(sql, (product_id,))
+        if stream:
+            head = {"message": "获取成功"}
+            if not after:
+                head["rating"] = load_rating(cursor, product_id)
+            query = StreamingQuery(*comments_page_query(product_id, after, limit))
+            page = KeysetPage(query, limit, lambda c: (c['time'], c['comment_id']))
+            return stream_response(query, "comments", rows=page, head=head,
+                                   tail=lambda: {"next_cursor": page.next_cursor})
+
+        cursor.execute(*comments_page_query(product_id, after, limit))
         comments = cursor.fetchall()
-        
-        # 时间转字符串
-        for c in comments:
-            c['time'] = str(c['time'])
-            
-        return jsonify({"comments": comments, "message": "获取成功"}), 200
+
+        next_cursor = None
+        if len(comments) > limit:
+            comments = comments[:limit]
+            next_cursor = encode_cursor(comments[-1]['time'], comments[-1]['comment_id'])
+
+        result = {"comments": comments, "next_cursor": next_cursor, "message": "获取成功"}
+        if not after:
+            result["rating"] = load_rating(cursor, product_id)
+        return jsonify(result), 200
     except Exception as e:
         print(f"[ERROR] 获取评论失败: {e}")
         return jsonify({"message": "服务器错误"}), 500
@@ -77,6 +128,20 @@ def get_comments(product_id):
         cursor.close()
         conn.close()
 
+# 获取商品评分汇总 (评论数、平均分、1~5 星分布)
+@interaction_bp.route("/get_rating/<product_id>", methods=["GET"])
+def get_rating(product_id):
+    conn = get_db_connection()
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        return jsonify({"rating": load_rating(cursor, product_id), "message": "获取成功"}), 200
+    except Exception as e:
+        print(f"[ERROR] 获取评分失败: {e}")
+        return jsonify({"message": "服务器错误"}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
 # 3. 删除评论
 # API: DELETE /api/delete_comment/<comment_id>
 @interaction_bp.route("/delete_comment/<comment_id>", methods=["DELETE"])
@@ -124,9 +189,6 @@ def get_favorite_folders():
         sql = "SELECT favorite_id as id, name, created_time as created_at FROM favorites WHERE user_id = %s ORDER BY created_time DESC"
         cursor.execute(sql, (user_name,))
         folders = cursor.fetchall()
-        
-        for f in folders:
-            f['created_at'] = str(f['created_at'])
 
         return jsonify({"folders": folders}), 200
     except Exception as e:
@@ -265,6 +327,15 @@ def add_favorite_product():
         cursor.close()
         conn.close()
 
+# price 保持原来的字符串格式 ("12.50")；商品接口的 price 一直是数字，由 fastjson 把 Decimal 转为 float
+FOLDER_ITEMS_SQL = """
+    SELECT fi.product_id, p.product_title as name, CAST(p.price AS CHAR) AS price, p.img_url, fi.created_time
+    FROM favorite_item fi
+    JOIN products p ON fi.product_id = p.product_id
+    WHERE fi.favorite_id = %s
+    ORDER BY fi.created_time DESC
+"""
+
 @interaction_bp.route("/get_favorites/<folder_id>", methods=["GET"])
 def get_folder_items(folder_id):
     token = request.headers.get("Authorization")
@@ -279,18 +350,8 @@ def get_folder_items(folder_id):
         if not cursor.fetchone():
             return jsonify({"message": "收藏夹不存在或无权限"}), 404
 
-        sql = """
-            SELECT fi.product_id, p.product_title as name, p.price, p.img_url, fi.created_time
-            FROM favorite_item fi
-            JOIN products p ON fi.product_id = p.product_id
-            WHERE fi.favorite_id = %s
-            ORDER BY fi.created_time DESC
-        """
-        cursor.execute(sql, (folder_id,))
+        cursor.execute(FOLDER_ITEMS_SQL, (folder_id,))
         favorites = cursor.fetchall()
-        
-        for f in favorites:
-            f['created_time'] = str(f['created_time'])
 
         return jsonify({"favorites": favorites}), 200
     except Exception as e:
@@ -331,6 +392,128 @@ def delete_favorite_item(folder_id, product_id):
         conn.close()
 
 
+# 批量收藏操作: 一次请求、一个事务、一次归属校验，按集合执行 SQL
+# 每个商品返回各自的处理结果
+MAX_BATCH_ITEMS = 200
+
+def parse_product_ids(data):
+    ids = data.get("product_ids")
+    if not isinstance(ids, list) or not ids or not all(isinstance(i, str) for i in ids):
+        return None
+    return list(dict.fromkeys(ids))
+
+def owned_folders(cursor, user_name, folder_ids):
+    placeholders = ", ".join(["%s"] * len(folder_ids))
+    cursor.execute(f"SELECT favorite_id FROM favorites WHERE user_id = %s AND favorite_id IN ({placeholders})",
+                   (user_name, *folder_ids))
+    return {row[0] for row in cursor.fetchall()}
+
+def items_in_folder(cursor, folder_id, product_ids):
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    cursor.execute(f"SELECT product_id FROM favorite_item WHERE favorite_id = %s AND product_id IN ({placeholders})",
+                   (folder_id, *product_ids))
+    return {row[0] for row in cursor.fetchall()}
+
+def run_batch_favorite(action):
+    token = request.headers.get("Authorization")
+    user_name = verify_token(token)
+    if not user_name:
+        return jsonify({"message": "未登录"}), 403
+
+    data = request.json or {}
+    product_ids = parse_product_ids(data)
+    if product_ids is None:
+        return jsonify({"message": "product_ids 必须是非空字符串数组"}), 400
+    if len(product_ids) > MAX_BATCH_ITEMS:
+        return jsonify({"message": f"一次最多操作 {MAX_BATCH_ITEMS} 个商品"}), 400
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        result = action(cursor, user_name, data, product_ids)
+        if isinstance(result, tuple):
+            conn.rollback()
+            return jsonify({"message": result[0]}), result[1]
+        conn.commit()
+        return jsonify({"results": result, "message": "操作完成"}), 200
+    except Exception as e:
+        conn.rollback()
+        print(f"[ERROR] 批量收藏操作失败: {e}")
+        return jsonify({"message": "服务器错误"}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
+def batch_add(cursor, user_name, data, product_ids):
+    folder_id = data.get("folder_id")
+    if not folder_id or not owned_folders(cursor, user_name, [folder_id]):
+        return "收藏夹不存在", 404
+
+    existing = items_in_folder(cursor, folder_id, product_ids)
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    cursor.execute(f"SELECT product_id FROM products WHERE product_id IN ({placeholders}) AND status != 'deleted'",
+                   product_ids)
+    valid = {row[0] for row in cursor.fetchall()}
+
+    new_ids = [pid for pid in product_ids if pid in valid and pid not in existing]
+    if new_ids:
+        # 拼成一条多行 INSERT: executemany 只能合并 VALUES 中全是占位符的语句，带 NOW() 会退化为逐行执行
+        rows = ", ".join(["(%s, %s, NOW())"] * len(new_ids))
+        cursor.execute(f"INSERT IGNORE INTO favorite_item (favorite_id, product_id, created_time) VALUES {rows}",
+                       [value for pid in new_ids for value in (folder_id, pid)])
+
+    return {pid: "exists" if pid in existing else "added" if pid in valid else "product_not_found"
+            for pid in product_ids}
+
+def batch_remove(cursor, user_name, data, product_ids):
+    folder_id = data.get("folder_id")
+    if not folder_id or not owned_folders(cursor, user_name, [folder_id]):
+        return "操作失败：无权操作此收藏夹", 403
+
+    existing = items_in_folder(cursor, folder_id, product_ids)
+    if existing:
+        placeholders = ", ".join(["%s"] * len(existing))
+        cursor.execute(f"DELETE FROM favorite_item WHERE favorite_id = %s AND product_id IN ({placeholders})",
+                       (folder_id, *existing))
+
+    return {pid: "removed" if pid in existing else "not_in_folder" for pid in product_ids}
+
+def batch_move(cursor, user_name, data, product_ids):
+    source, target = data.get("from_folder_id"), data.get("to_folder_id")
+    if not source or not target or source == target:
+        return "缺少参数", 400
+    if owned_folders(cursor, user_name, [source, target]) != {source, target}:
+        return "操作失败：无权操作此收藏夹", 403
+
+    in_source = items_in_folder(cursor, source, product_ids)
+    in_target = items_in_folder(cursor, target, product_ids)
+    if in_source:
+        # 保留原收藏时间；目标收藏夹已有的商品被 INSERT IGNORE 跳过，只从源收藏夹移除
+        placeholders = ", ".join(["%s"] * len(in_source))
+        cursor.execute(f"""
+            INSERT IGNORE INTO favorite_item (favorite_id, product_id, created_time)
+            SELECT %s, product_id, created_time FROM favorite_item
+            WHERE favorite_id = %s AND product_id IN ({placeholders})
+        """, (target, source, *in_source))
+        cursor.execute(f"DELETE FROM favorite_item WHERE favorite_id = %s AND product_id IN ({placeholders})",
+                       (source, *in_source))
+
+    return {pid: "not_in_source" if pid not in in_source else "merged" if pid in in_target else "moved"
+            for pid in product_ids}
+
+@interaction_bp.route("/favorite_products/batch_add", methods=["POST"])
+def batch_add_favorites():
+    return run_batch_favorite(batch_add)
+
+@interaction_bp.route("/favorite_products/batch_remove", methods=["POST"])
+def batch_remove_favorites():
+    return run_batch_favorite(batch_remove)
+
+@interaction_bp.route("/favorite_products/batch_move", methods=["POST"])
+def batch_move_favorites():
+    return run_batch_favorite(batch_move)
+
+
 @interaction_bp.route("/send_msg", methods=["POST"])
 def send_msg():
     token = request.headers.get("Authorization")
@@ -353,6 +536,8 @@ def send_msg():
         """
         cursor.execute(sql, (msg_id, sender, receiver_id, content))
         conn.commit()
+        message_hub.publish(receiver_id)
+        message_hub.publish(sender)
         return jsonify({"message": "发送成功"}), 201
     except Exception as e:
         conn.rollback()
@@ -362,36 +547,138 @@ def send_msg():
         cursor.close()
         conn.close()
 
+# 消息按 (time, message_id) 增量拉取；OR 条件拆成两条可走索引的查询再 UNION
+# 游标记录已返回的最新时间以及该时间点上的消息 id，下次从该时间点开始并排除这些 id
+def msgs_query(user_name, since=None):
+    time_clause = "AND m.time >= %s" if since else ""
+    time_params = (since[0],) if since else ()
+    sql = f"""
+        SELECT m.*, u.nickname as sender_nickname, u.avatar_url as sender_avatar
+        FROM message m
+        JOIN users u ON m.sender_id = u.user_name
+        WHERE m.receiver_id = %s {time_clause}
+        UNION
+        SELECT m.*, u.nickname as sender_nickname, u.avatar_url as sender_avatar
+        FROM message m
+        JOIN users u ON m.sender_id = u.user_name
+        WHERE m.sender_id = %s {time_clause}
+        ORDER BY time DESC
+    """
+    return sql, (user_name, *time_params, user_name, *time_params)
+
+class MsgBatch:
+    """逐条过滤掉上次已返回的消息并标记 is_me；迭代结束后 cursor 为下次拉取用的游标
+
+    rows 按时间倒序，最新时间点上的消息排在最前面
+    """
+
+    def __init__(self, rows, user_name, since=None):
+        self._rows = rows
+        self._user_name = user_name
+        self._since = since
+        self.cursor = encode_cursor(*since) if since else None
+
+    def __iter__(self):
+        since = self._since
+        seen = set(since[1].split(",")) if since and since[1] else set()
+        latest, ids = None, []
+        for m in self._rows:
+            t = str(m['time'])
+            if since and t == since[0] and m['message_id'] in seen:
+                continue
+            if latest is None:
+                latest = t
+            if t == latest:
+                ids.append(m['message_id'])
+            m['is_me'] = (m['sender_id'] == self._user_name)
+            yield m
+        if latest is not None:
+            if since and since[0] == latest:
+                ids += sorted(seen)
+            self.cursor = encode_cursor(latest, ",".join(ids))
+
+def load_msgs(user_name, since=None):
+    conn = get_db_connection()
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        cursor.execute(*msgs_query(user_name, since))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+    batch = MsgBatch(rows, user_name, since)
+    msgs = list(batch)
+    return msgs, batch.cursor
+
+# 获取消息，参数 since 为上次返回的 cursor，不传则返回全部；stream=1 时边查边输出
 @interaction_bp.route("/get_msgs", methods=["GET"])
 def get_msgs():
     token = request.headers.get("Authorization")
     user_name = verify_token(token)
     if not user_name:
         return jsonify({"message": "未登录"}), 403
-        
-    conn = get_db_connection()
-    cursor = conn.cursor(pymysql.cursors.DictCursor)
+
+    since = None
+    if request.args.get("since"):
+        since = decode_cursor(request.args["since"], 2)
+        if not since:
+            return jsonify({"message": "无效的游标"}), 400
+
     try:
-        sql = """
-            SELECT m.*, u.nickname as sender_nickname, u.avatar_url as sender_avatar
-            FROM message m
-            JOIN users u ON m.sender_id = u.user_name
-            WHERE m.receiver_id = %s OR m.sender_id = %s
-            ORDER BY m.time DESC
-        """
-        
-        cursor.execute(sql, (user_name, user_name))
-        
-        msgs = cursor.fetchall()
-        
-        for m in msgs:
-            m['time'] = str(m['time'])
-            m['is_me'] = (m['sender_id'] == user_name)
-            
-        return jsonify({"messages": msgs}), 200
+        if request.args.get("stream") == "1":
+            query = StreamingQuery(*msgs_query(user_name, since))
+            batch = MsgBatch(query, user_name, since)
+            return stream_response(query, "messages", rows=batch, tail=lambda: {"cursor": batch.cursor})
+
+        msgs, next_cursor = load_msgs(user_name, since)
+        return jsonify({"messages": msgs, "cursor": next_cursor}), 200
+    except Exception as e:
+        print(f"[ERROR] 获取消息失败: {e}")
+        return jsonify({"message": "服务器错误"}), 500
+
+# 长轮询等待新消息
+# 参数: since (get_msgs/poll_msgs 返回的 cursor，还没有任何消息时 cursor 为 null，此时不传)，
+# after (上次 poll_msgs 返回的 after), timeout (秒，0 ~ POLL_MAX_TIMEOUT)
+# 没有新消息时只在进程内等待，不访问数据库
+POLL_MAX_TIMEOUT = 30
+
+@interaction_bp.route("/poll_msgs", methods=["GET"])
+def poll_msgs():
+    token = request.headers.get("Authorization")
+    user_name = verify_token(token)
+    if not user_name:
+        return jsonify({"message": "未登录"}), 403
+
+    since = None
+    if request.args.get("since"):
+        since = decode_cursor(request.args["since"], 2)
+        if not since:
+            return jsonify({"message": "无效的 since 游标"}), 400
+
+    try:
+        after = float(request.args.get("after", 0))
+        timeout = float(request.args.get("timeout", 25))
+    except ValueError:
+        return jsonify({"message": "参数格式错误"}), 400
+    if not (math.isfinite(after) and math.isfinite(timeout)):
+        return jsonify({"message": "参数格式错误"}), 400
+    timeout = min(max(timeout, 0.0), POLL_MAX_TIMEOUT)
+
+    if not message_hub.wait(user_name, after, timeout):
+        return jsonify({"messages": [], "cursor": encode_cursor(*since) if since else None, "after": after}), 200
+
+    # 先记下时间再查询，查询期间到达的消息会在下一次轮询立即返回
+    now = message_hub.now()
+    try:
+        if request.args.get("stream") == "1":
+            query = StreamingQuery(*msgs_query(user_name, since))
+            batch = MsgBatch(query, user_name, since)
+            return stream_response(query, "messages", rows=batch,
+                                   tail=lambda: {"cursor": batch.cursor, "after": now})
+
+        msgs, next_cursor = load_msgs(user_name, since)
+        return jsonify({"messages": msgs, "cursor": next_cursor, "after": now}), 200
     except Exception as e:
         print(f"[ERROR] 获取消息失败: {e}")
         return jsonify({"message": "服务器错误"}), 500
-    finally:
-        cursor.close()
-        conn.close()
\ No newline at end of file
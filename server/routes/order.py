@@ -1,6 +1,13 @@
 from flask import Blueprint, request, jsonify
-from db import get_db_connection
-from utils import verify_token
+from db import get_db_connection, StreamingQuery
+from utils import verify_token, AdmissionGate
+from search import product_index
+from routes.product import invalidate_products, load_category_names
+from cache import product_cache
+from fastjson import stream_response
+from sales import DAILY_SALES_SQL, LISTING_BASE_SQL
+from datetime import date, timedelta
+from decimal import Decimal
 import pymysql
 import uuid
 
@@ -10,6 +17,75 @@ def generate_uuid():
     return uuid.uuid4().hex
 
 # 购买商品
+# 同一商品的购买请求先经过进程内的准入队列: 同时只有 concurrency 个访问数据库，其余排队，
+# 队列满或等待超时返回 429；商品售出后仍在排队的请求直接返回 409，不再争抢同一行锁
+PURCHASE_CONFIG = {
+    'concurrency': 1,       # 每个商品同时执行购买的请求数
+    'max_waiting': 32,      # 每个商品排队的请求数上限
+    'wait_timeout': 2.0,    # 排队最长等待 (秒)
+}
+
+purchase_gate = AdmissionGate(**PURCHASE_CONFIG)
+
+PURCHASE_RESULTS = {
+    "sold": (409, "手慢了，商品已售出"),
+    "not_found": (404, "商品不存在"),
+    "own": (400, "不能购买自己发布的商品"),
+    AdmissionGate.BUSY: (429, "抢购人数过多，请稍后重试"),
+}
+
+# 存储过程 buy_product (migrations/0005，0010 重建) 不存在时退回下面的条件更新，两者结果一致
+_use_procedure = True
+
+def purchase_with_sql(cursor, conn, order_id, user_name, product_id):
+    cursor.execute("""
+        UPDATE products SET status = 'sold'
+        WHERE product_id = %s AND status = 'active' AND owner_id <> %s
+    """, (product_id, user_name))
+    if cursor.rowcount == 1:
+        # 不能用 INSERT ... SELECT FROM products: orders 上的触发器会更新 products (MySQL 错误 1442)
+        cursor.execute("SELECT owner_id FROM products WHERE product_id = %s", (product_id,))
+        seller_id = cursor.fetchone()[0]
+        cursor.execute("""
+            INSERT INTO orders (order_id, order_status, buyer_id, seller_id, product_id, created_time)
+            VALUES (%s, 'completed', %s, %s, %s, NOW())
+        """, (order_id, user_name, seller_id, product_id))
+        conn.commit()
+        return "ok"
+    conn.rollback()
+    cursor.execute("SELECT owner_id, status FROM products WHERE product_id = %s", (product_id,))
+    row = cursor.fetchone()
+    if not row:
+        return "not_found"
+    return "sold" if row[1] != "active" else "own"
+
+def purchase(order_id, user_name, product_id):
+    """原子地把商品从 active 改为 sold 并生成订单，返回 ok / sold / own / not_found"""
+    global _use_procedure
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        if _use_procedure:
+            try:
+                # 一次往返: 条件更新 + 插入订单都在存储过程中完成
+                cursor.execute("CALL buy_product(%s, %s, %s)", (order_id, user_name, product_id))
+                result = cursor.fetchone()[0]
+                while cursor.nextset():
+                    pass
+                return result
+            except pymysql.MySQLError as e:
+                if not (e.args and e.args[0] == 1305):
+                    raise
+                print("[WARN] 存储过程 buy_product 不存在 (未执行迁移 0005)，改用条件更新")
+                _use_procedure = False
+        return purchase_with_sql(cursor, conn, order_id, user_name, product_id)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
 @order_bp.route("/buy_product/<product_id>", methods=["POST"])
 def buy_product(product_id):
     # 补全 Token 验证代码
@@ -18,50 +94,50 @@ def buy_product(product_id):
     if not user_name:
         return jsonify({"message": "未登录"}), 403
 
-    conn = get_db_connection()
-    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    rejected = purchase_gate.acquire(product_id)
+    if rejected:
+        status, message = PURCHASE_RESULTS[rejected]
+        response = jsonify({"message": message})
+        if status == 429:
+            response.headers["Retry-After"] = "1"
+        return response, status
 
+    result = None
     try:
-        # 1. 检查商品状态
-        cursor.execute("SELECT * FROM products WHERE product_id = %s", (product_id,))
-        product = cursor.fetchone()
-
-        if not product:
-            return jsonify({"message": "商品不存在"}), 404
-        
-        if product['status'] != 'active':
-            return jsonify({"message": "手慢了，商品已售出"}), 409
-
-        # 防止买自己的商品
-        if product['owner_id'] == user_name:
-             return jsonify({"message": "不能购买自己发布的商品"}), 400
-
-        # 2. 插入订单
         order_id = generate_uuid()
-        seller_id = product['owner_id']
-        
-        insert_sql = """
-            INSERT INTO orders 
-            (order_id, order_status, buyer_id, seller_id, product_id, created_time)
-            VALUES (%s, 'completed', %s, %s, %s, NOW())
-        """
-        cursor.execute(insert_sql, (order_id, user_name, seller_id, product_id))
-
-        # 提交事务 (触发器会自动更新 products 表状态)
-        conn.commit()
-        
-        print(f"[ORDER] 订单 {order_id} 创建成功，触发器已自动更新商品状态")
-        return jsonify({"message": "购买成功", "order_id": order_id}), 200
-
+        result = purchase(order_id, user_name, product_id)
     except Exception as e:
-        conn.rollback()
         print(f"[ERROR] 购买失败: {e}")
         return jsonify({"message": "服务器内部错误"}), 500
     finally:
-        cursor.close()
-        conn.close()
+        # 已售出 / 不存在是最终结果，排队中的请求直接复用
+        final = "sold" if result in ("ok", "sold") else ("not_found" if result == "not_found" else None)
+        purchase_gate.release(product_id, final)
+
+    if result != "ok":
+        status, message = PURCHASE_RESULTS[result]
+        return jsonify({"message": message}), status
+
+    # 商品已改为 sold，同步清理搜索索引和商品缓存
+    product_index.remove(product_id)
+    invalidate_products(product_id)
+
+    print(f"[ORDER] 订单 {order_id} 创建成功")
+    return jsonify({"message": "购买成功", "order_id": order_id}), 200
+
+# 获取订单列表，stream=1 时用服务端游标边查边输出
+# price 保持原来的字符串格式 ("12.50")，不经过 fastjson 的 Decimal -> float
+ORDERS_SQL = """
+    SELECT o.order_id, o.order_status, o.created_time,
+           o.product_id, 
+           p.product_title, p.img_url, CAST(p.price AS CHAR) AS price,
+           o.seller_id
+    FROM orders o
+    JOIN products p ON o.product_id = p.product_id
+    WHERE o.buyer_id = %s
+    ORDER BY o.created_time DESC
+"""
 
-# 获取订单列表
 @order_bp.route("/get_orders", methods=["GET"])
 def get_orders():
     token = request.headers.get("Authorization")
@@ -69,27 +145,21 @@ def get_orders():
     if not user_name:
         return jsonify({"message": "未登录"}), 403
 
+    if request.args.get("stream") == "1":
+        try:
+            query = StreamingQuery(ORDERS_SQL, (user_name,))
+        except Exception as e:
+            print(f"[ERROR] 获取订单失败: {e}")
+            return jsonify({"message": "服务器内部错误"}), 500
+        return stream_response(query, "orders", head={"message": "获取成功"})
+
     conn = get_db_connection()
     cursor = conn.cursor(pymysql.cursors.DictCursor)
 
     try:
-        sql = """
-            SELECT o.order_id, o.order_status, o.created_time,
-                   o.product_id, 
-                   p.product_title, p.img_url, p.price,
-                   o.seller_id
-            FROM orders o
-            JOIN products p ON o.product_id = p.product_id
-            WHERE o.buyer_id = %s
-            ORDER BY o.created_time DESC
-        """
-        cursor.execute(sql, (user_name,))
+        cursor.execute(ORDERS_SQL, (user_name,))
         orders = cursor.fetchall()
 
-        # 格式化时间
-        for order in orders:
-            order['created_time'] = str(order['created_time'])
-
         return jsonify({"orders": orders, "message": "获取成功"}), 200
 
     except Exception as e:
@@ -97,4 +167,75 @@ def get_orders():
         return jsonify({"message": "服务器内部错误"}), 500
     finally:
         cursor.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+# 卖家看板: 最近 days 天的逐日销售额、售出件数、在售商品数，以及按分类的汇总
+# 只读取触发器维护的 seller_sales_daily (migrations/0009)，不扫描 orders / products
+SELLER_DASHBOARD_MAX_DAYS = 365
+
+def seller_dashboard(cursor, seller_id, days):
+    start = date.today() - timedelta(days=days - 1)
+    cursor.execute(LISTING_BASE_SQL, (seller_id, start))
+    listings = {row["category_id"]: int(row["listings"]) for row in cursor.fetchall()}
+    active = sum(listings.values())
+
+    daily = {start + timedelta(days=i): {"revenue": Decimal(0), "units": 0, "delta": 0} for i in range(days)}
+    sales = {}
+    cursor.execute(DAILY_SALES_SQL, (seller_id, start))
+    for row in cursor.fetchall():
+        day = daily.setdefault(row["day"], {"revenue": Decimal(0), "units": 0, "delta": 0})
+        day["revenue"] += row["revenue"]
+        day["units"] += row["units"]
+        day["delta"] += row["listing_delta"]
+        category = sales.setdefault(row["category_id"], {"revenue": Decimal(0), "units": 0})
+        category["revenue"] += row["revenue"]
+        category["units"] += row["units"]
+        listings[row["category_id"]] = listings.get(row["category_id"], 0) + row["listing_delta"]
+
+    series = []
+    for day in sorted(daily):
+        active += daily[day]["delta"]
+        series.append({"date": day.isoformat(), "revenue": daily[day]["revenue"],
+                       "units": daily[day]["units"], "active_listings": active})
+
+    names = product_cache.get_or_load("categories:names", lambda: load_category_names(cursor))
+    categories = [
+        {"category_id": category_id or None, "category_name": names.get(category_id),
+         **sales.get(category_id, {"revenue": Decimal(0), "units": 0}),
+         "active_listings": listings.get(category_id, 0)}
+        for category_id in set(sales) | {c for c, n in listings.items() if n}
+    ]
+    categories.sort(key=lambda c: (c["revenue"], c["active_listings"]), reverse=True)
+
+    return {
+        "summary": {
+            "revenue": sum((d["revenue"] for d in series), Decimal(0)),
+            "units": sum(d["units"] for d in series),
+            "active_listings": active,
+        },
+        "daily": series,
+        "categories": categories,
+    }
+
+@order_bp.route("/seller/dashboard", methods=["GET"])
+def get_seller_dashboard():
+    token = request.headers.get("Authorization")
+    user_name = verify_token(token)
+    if not user_name:
+        return jsonify({"message": "未登录"}), 403
+
+    try:
+        days = max(1, min(int(request.args.get("days", 30)), SELLER_DASHBOARD_MAX_DAYS))
+    except ValueError:
+        return jsonify({"message": "无效的天数"}), 400
+
+    conn = get_db_connection()
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        return jsonify({**seller_dashboard(cursor, user_name, days), "days": days, "message": "获取成功"}), 200
+    except Exception as e:
+        print(f"[ERROR] 获取卖家看板失败: {e}")
+        return jsonify({"message": "服务器内部错误"}), 500
+    finally:
+        cursor.close()
+        conn.close()
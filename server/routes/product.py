@@ -1,22 +1,71 @@
 from flask import Blueprint, request, jsonify
-from db import get_db_connection
-from utils import verify_token
+from db import get_db_connection, StreamingQuery
+from utils import verify_token, encode_cursor, decode_cursor, parse_limit, KeysetPage, STREAM_MAX_LIMIT
+from search import product_index
+from cache import product_cache
+from fastjson import projector, stream_response
+from httpcache import conditional, weak_etag
+from feed import FEED_SQL
+from similar import SIMILAR_SQL, SIMILAR_LIMIT
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from decimal import Decimal, InvalidOperation
 import pymysql
+import time
 import uuid
 
 product_bp = Blueprint('product', __name__)
 
+PRODUCT_STATUSES = {"active", "inactive", "sold", "deleted"}
+
 def generate_uuid():
     return uuid.uuid4().hex
 
+# 商品查询统一带上卖家昵称和头像，结果行由 product_from_row 转为接口返回的 JSON
+# 时间和价格保持数据库原始类型，由 fastjson 编码时统一转换
+PRODUCT_SELECT = """SELECT p.*, u.nickname as seller_name, u.avatar_url as seller_avatar
+    FROM products p
+    LEFT JOIN users u ON p.owner_id = u.user_name"""
+
+product_from_row = projector((
+    ("id", "product_id"),
+    ("name", "product_title"),
+    ("price", "price"),
+    ("image_url", "img_url"),
+    ("description", "description"),
+    ("category_id", "category_id"),
+    ("seller_id", "owner_id"),
+    ("seller_name", "seller_name"),
+    ("seller_avatar", "seller_avatar"),
+    ("created_at", "create_time"),
+    ("status", "status"),
+))
+
+# 只读接口的 ETag: 由写接口维护的版本号生成，If-None-Match 命中时不查库直接 304
+# ETag 只在同一 URL 下比较，所以不需要带上商品 id 或查询参数
+def categories_etag():
+    # 分类没有写接口 (只会手工改库)，按缓存 TTL 周期轮换
+    period = int(time.time() // product_cache.ttl)
+    return weak_etag("categories", f"{product_cache.tag('categories')}.{period:x}")
+
+def products_etag():
+    return weak_etag("products", product_cache.tag("products"))
+
+def product_etag(product_id):
+    # 详情里带有相似商品列表，similar 版本号只在 similar.py 重建出新列表时递增，单个商品的写操作不影响其他详情页
+    tag = f"{product_cache.tag(f'product:{product_id}')}.{product_cache.version('similar')}"
+    return weak_etag("product", tag)
+
 # 获取所有商品分类
+CATEGORIES_SQL = "SELECT category_id, category_name FROM categories"
+
 @product_bp.route("/get_categories", methods=["GET"])
+@conditional(categories_etag)
 def get_categories():
     conn = get_db_connection()
     cursor = conn.cursor(pymysql.cursors.DictCursor)
     try:
-        sql = "SELECT category_id, category_name FROM categories"
-        cursor.execute(sql)
+        cursor.execute(CATEGORIES_SQL)
         categories = cursor.fetchall()
         return jsonify({"categories": categories, "message": "获取成功"}), 200
     except Exception as e:
@@ -27,87 +76,202 @@ def get_categories():
         conn.close()
 
 # 1.获取商品列表
-@product_bp.route("/get_products", methods=["GET"])
-def get_products():
+# 参数: limit, cursor (上一页返回的 next_cursor), status (逗号分隔，默认 active)
+#       stream=1 时用服务端游标边查边输出，不经过缓存，limit 上限为 STREAM_MAX_LIMIT
+# 按 (create_time, product_id) 做键集分页，依赖 products(status, create_time, product_id) 索引
+# 查询构造和结果整理与异步服务模式 (asgi.py) 共用
+def parse_product_page_args(args, max_limit=100):
+    # 返回 (statuses, after, limit, cache_key) 或 错误信息
+    limit = parse_limit(args.get("limit"), maximum=max_limit)
+    statuses = [s for s in args.get("status", "active").split(",") if s]
+    if not statuses or any(s not in PRODUCT_STATUSES for s in statuses):
+        return "无效的商品状态"
+
+    after = None
+    cursor_arg = args.get("cursor")
+    if cursor_arg:
+        after = decode_cursor(cursor_arg, 2)
+        if not after:
+            return "无效的分页游标"
+
+    # 列表缓存 key 带上版本号，任何商品写操作都会让所有列表页一起失效
+    key = f"products:v{product_cache.version('products')}:{','.join(statuses)}:{limit}:{cursor_arg or ''}"
+    return statuses, after, limit, key
+
+def product_page_query(statuses, after, limit):
+    placeholders = ", ".join(["%s"] * len(statuses))
+    params = list(statuses)
+    keyset = ""
+    if after:
+        keyset = "AND (p.create_time < %s OR (p.create_time = %s AND p.product_id < %s))"
+        params += [after[0], after[0], after[1]]
+    params.append(limit + 1)
+
+    sql = f"""
+        {PRODUCT_SELECT}
+        WHERE p.status IN ({placeholders}) {keyset}
+        ORDER BY p.create_time DESC, p.product_id DESC
+        LIMIT %s
+    """
+    return sql, params
+
+def product_page_result(products, limit):
+    # 多取一行用于判断是否还有下一页
+    next_cursor = None
+    if len(products) > limit:
+        products = products[:limit]
+        last = products[-1]
+        next_cursor = encode_cursor(last["create_time"], last["product_id"])
+    
+    return {"products": [product_from_row(p) for p in products], "next_cursor": next_cursor}
+
+def load_product_page(statuses, after, limit):
     conn = get_db_connection()
     cursor = conn.cursor(pymysql.cursors.DictCursor)
-    
     try:
-        sql = """
-            SELECT p.*, u.nickname as seller_name, u.avatar_url as seller_avatar
-            FROM products p
-            LEFT JOIN users u ON p.owner_id = u.user_name
-            ORDER BY p.create_time DESC
-        """
-        cursor.execute(sql)
-        products = cursor.fetchall()
-        
-        result_list = []
-        for p in products:
-            result_list.append({
-                "id": p["product_id"],
-                "name": p["product_title"],
-                "price": float(p["price"]),
-                "image_url": p["img_url"],
-                "description": p["description"],
-                "category_id": p.get("category_id"), 
-                "seller_id": p["owner_id"],
-                "seller_name": p["seller_name"],
-                "seller_avatar": p["seller_avatar"],
-                "created_at": str(p["create_time"]),
-                "status": p["status"]
-            })
-                
-        return jsonify({"products": result_list, "message": "获取成功"}), 200
+        cursor.execute(*product_page_query(statuses, after, limit))
+        return product_page_result(cursor.fetchall(), limit)
+    finally:
+        cursor.close()
+        conn.close()
+
+@product_bp.route("/get_products", methods=["GET"])
+@conditional(products_etag)
+def get_products():
+    stream = request.args.get("stream") == "1"
+    parsed = parse_product_page_args(request.args, STREAM_MAX_LIMIT if stream else 100)
+    if isinstance(parsed, str):
+        return jsonify({"message": parsed}), 400
+    statuses, after, limit, key = parsed
+
+    try:
+        if stream:
+            query = StreamingQuery(*product_page_query(statuses, after, limit))
+            page = KeysetPage(query, limit, lambda p: (p["create_time"], p["product_id"]))
+            return stream_response(query, "products", rows=page, project=product_from_row,
+                                   head={"message": "获取成功"},
+                                   tail=lambda: {"next_cursor": page.next_cursor})
+
+        page = product_cache.get_or_load(key, lambda: load_product_page(statuses, after, limit))
+        return jsonify({**page, "message": "获取成功"}), 200
 
     except Exception as e:
         print(f"[ERROR] 获取商品列表失败: {e}")
         return jsonify({"message": "服务器内部错误"}), 500
+
+# 2. 获取商品详情
+PRODUCT_DETAIL_SQL = f"""
+    {PRODUCT_SELECT}
+    WHERE p.product_id = %s
+"""
+
+def product_detail_result(p):
+    return product_from_row(p) if p else None
+
+def load_product_detail(product_id):
+    conn = get_db_connection()
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        cursor.execute(PRODUCT_DETAIL_SQL, (product_id,))
+        return product_detail_result(cursor.fetchone())
     finally:
         cursor.close()
         conn.close()
 
-# 2. 获取商品详情
-@product_bp.route("/product/<product_id>", methods=["GET"])
-def get_product_detail(product_id):
+# 相似商品 ("收藏了这件的人还收藏了") 由 similar.py 离线写入 product_similar，单独缓存:
+# product:<id> 同时被 /products/batch 使用，不能混入这部分；缓存 key 带 similar 版本号，递增后全部失效
+similar_from_row = projector((
+    ("id", "product_id"),
+    ("name", "product_title"),
+    ("price", "price"),
+    ("image_url", "img_url"),
+    ("score", "score"),
+))
+
+def similar_cache_key(product_id):
+    return f"similar:v{product_cache.version('similar')}:{product_id}"
+
+def similar_result(rows):
+    return [similar_from_row(r) for r in rows]
+
+def load_similar(product_id):
     conn = get_db_connection()
     cursor = conn.cursor(pymysql.cursors.DictCursor)
-    
     try:
-        sql = """
-            SELECT p.*, u.nickname as seller_name, u.avatar_url as seller_avatar
-            FROM products p
-            LEFT JOIN users u ON p.owner_id = u.user_name
-            WHERE p.product_id = %s
-        """
-        cursor.execute(sql, (product_id,))
-        p = cursor.fetchone()
-        
-        if not p:
+        cursor.execute(SIMILAR_SQL, (product_id, SIMILAR_LIMIT))
+        return similar_result(cursor.fetchall())
+    finally:
+        cursor.close()
+        conn.close()
+
+@product_bp.route("/product/<product_id>", methods=["GET"])
+@conditional(product_etag)
+def get_product_detail(product_id):
+    try:
+        data = product_cache.get_or_load(f"product:{product_id}", lambda: load_product_detail(product_id))
+        if not data:
             return jsonify({"message": "商品不存在"}), 404
 
-        data = {
-            "id": p["product_id"],
-            "name": p["product_title"],
-            "price": float(p["price"]),
-            "image_url": p["img_url"],
-            "description": p["description"],
-            "category_id": p.get("category_id"), 
-            "seller_id": p["owner_id"],
-            "seller_name": p["seller_name"], 
-            "seller_avatar": p["seller_avatar"],
-            "created_at": str(p["create_time"]),
-            "status": p["status"]
-        }
-
-        return jsonify(data), 200
+        similar = product_cache.get_or_load(similar_cache_key(product_id), lambda: load_similar(product_id))
+        return jsonify({**data, "similar": similar}), 200
 
     except Exception as e:
         print(f"[ERROR] 获取商品详情失败: {e}")
         return jsonify({"message": "服务器内部错误"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+
+# 批量获取商品详情，一次 IN 查询代替逐个请求 /product/<id>
+# 参数: {"ids": [...]}，先查详情缓存，只对未命中的 id 访问数据库
+MAX_BATCH_IDS = 100
+
+@product_bp.route("/products/batch", methods=["POST"])
+def get_products_batch():
+    ids = (request.json or {}).get("ids")
+    if not isinstance(ids, list) or not all(isinstance(i, str) for i in ids):
+        return jsonify({"message": "ids 必须是字符串数组"}), 400
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > MAX_BATCH_IDS:
+        return jsonify({"message": f"一次最多查询 {MAX_BATCH_IDS} 个商品"}), 400
+
+    products = {}
+    for pid in ids:
+        cached = product_cache.backend.get(f"product:{pid}")
+        if cached is not None:
+            products[pid] = cached
+    misses = [pid for pid in ids if pid not in products]
+    product_cache.record(hits=len(products), misses=len(misses))
+
+    if misses:
+        conn = get_db_connection()
+        cursor = conn.cursor(pymysql.cursors.DictCursor)
+        try:
+            placeholders = ", ".join(["%s"] * len(misses))
+            sql = f"""
+                {PRODUCT_SELECT}
+                WHERE p.product_id IN ({placeholders})
+            """
+            cursor.execute(sql, misses)
+            for row in cursor.fetchall():
+                data = product_from_row(row)
+                products[data["id"]] = data
+                product_cache.backend.set(f"product:{data['id']}", data, product_cache.ttl)
+        except Exception as e:
+            print(f"[ERROR] 批量获取商品失败: {e}")
+            return jsonify({"message": "服务器内部错误"}), 500
+        finally:
+            cursor.close()
+            conn.close()
+
+    missing = [pid for pid in ids if pid not in products]
+    return jsonify({"products": products, "missing": missing, "message": "获取成功"}), 200
+
+def invalidate_products(*product_ids):
+    # 商品数据变化: 删除对应详情缓存，并让所有列表页失效；版本号变化后对应的 ETag 也随之失效
+    product_cache.invalidate(*(f"product:{pid}" for pid in product_ids))
+    for pid in product_ids:
+        product_cache.bump(f"product:{pid}")
+    product_cache.bump("products")
+    # 不递增 similar: 那会让所有详情页的 ETag 一起失效。售出 / 下架的邻居在缓存过期 (TTL) 后由 SIMILAR_SQL 的
+    # status 条件滤掉；凭 304 沿用旧详情的客户端要到下次重建相似商品 (bump similar) 后才看到新列表，购买时会得到 409
 
 # 3. 发布商品
 @product_bp.route("/create_product", methods=["POST"])
@@ -140,6 +304,8 @@ def create_product():
         """
         cursor.execute(sql, (new_id, title, price, img_url, desc, category_id, user_name))
         conn.commit()
+        product_index.add(new_id, title, desc)
+        invalidate_products()
         
         return jsonify({"message": "商品发布成功", "product_id": new_id}), 201
 
@@ -190,6 +356,9 @@ def modify_product():
         if affected_rows == 0:
             return jsonify({"message": "修改失败：商品不存在或您无权修改"}), 403
 
+        product_index.update(product_id, title, desc)
+        invalidate_products(product_id)
+
         return jsonify({"message": "商品修改成功"}), 200
 
     except Exception as e:
@@ -223,6 +392,9 @@ def delete_product(product_id):
         if affected_rows == 0:
             return jsonify({"message": "删除失败：商品不存在或您无权删除"}), 403
 
+        product_index.remove(product_id)
+        invalidate_products(product_id)
+
         return jsonify({"message": "商品已删除"}), 200
 
     except Exception as e:
@@ -234,6 +406,18 @@ def delete_product(product_id):
         conn.close()
 
 # 6. 搜索商品
+# 参数: keyword (空格分隔多个关键词), mode (and/or，默认 and), limit, cursor
+# 关键词匹配和相关度排序走进程内倒排索引 (search.py)，数据库只按主键取当前页
+def load_searchable_products():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT product_id, product_title, description FROM products WHERE status = 'active'")
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
 @product_bp.route("/search_products", methods=["GET"])
 def search_products():
     keyword = request.args.get("keyword", "").strip()
@@ -241,41 +425,49 @@ def search_products():
     if not keyword:
         return jsonify({"message": "请输入搜索关键词"}), 400
 
+    mode = request.args.get("mode", "and")
+    if mode not in ("and", "or"):
+        return jsonify({"message": "mode 只能是 and 或 or"}), 400
+
+    limit = parse_limit(request.args.get("limit"))
+    offset = 0
+    cursor_arg = request.args.get("cursor")
+    if cursor_arg:
+        after = decode_cursor(cursor_arg, 1)
+        if not after or not after[0].isdigit():
+            return jsonify({"message": "无效的分页游标"}), 400
+        offset = int(after[0])
+
+    try:
+        product_index.ensure_fresh(load_searchable_products)
+        ids, total = product_index.search(keyword, mode, offset, limit)
+    except Exception as e:
+        print(f"[ERROR] 搜索失败: {e}")
+        return jsonify({"message": "服务器内部错误"}), 500
+
+    next_cursor = encode_cursor(offset + limit) if offset + limit < total else None
+    if not ids:
+        return jsonify({"products": [], "count": total, "next_cursor": next_cursor, "message": "搜索完成"}), 200
+
     conn = get_db_connection()
     cursor = conn.cursor(pymysql.cursors.DictCursor)
 
     try:
-        sql = """
-            SELECT p.*, u.nickname as seller_name, u.avatar_url as seller_avatar
-            FROM products p
-            LEFT JOIN users u ON p.owner_id = u.user_name
-            WHERE p.status = 'active' 
-            AND (p.product_title LIKE %s OR p.description LIKE %s)
-            ORDER BY p.create_time DESC
+        placeholders = ", ".join(["%s"] * len(ids))
+        sql = f"""
+            {PRODUCT_SELECT}
+            WHERE p.product_id IN ({placeholders}) AND p.status = 'active'
         """
-        search_pattern = f"%{keyword}%"
-        cursor.execute(sql, (search_pattern, search_pattern))
-        products = cursor.fetchall()
-
-        result_list = []
-        for p in products:
-            result_list.append({
-                "id": p["product_id"],
-                "name": p["product_title"],
-                "price": float(p["price"]),
-                "image_url": p["img_url"],
-                "description": p["description"],
-                "category_id": p.get("category_id"), 
-                "seller_id": p["owner_id"],
-                "seller_name": p["seller_name"],
-                "seller_avatar": p["seller_avatar"],
-                "created_at": str(p["create_time"]),
-                "status": p["status"]
-            })
+        cursor.execute(sql, ids)
+        rows = {p["product_id"]: p for p in cursor.fetchall()}
+
+        # 按相关度顺序输出
+        result_list = [product_from_row(rows[i]) for i in ids if i in rows]
 
         return jsonify({
             "products": result_list, 
-            "count": len(result_list),
+            "count": total,
+            "next_cursor": next_cursor,
             "message": "搜索完成"
         }), 200
 
@@ -284,4 +476,257 @@ def search_products():
         return jsonify({"message": "服务器内部错误"}), 500
     finally:
         cursor.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+# 分面浏览
+# 参数 (query): category (分类 id，逗号分隔)、min_price (含)、max_price (不含)、seller、status (默认 active)、
+#       sort (new / price_asc / price_desc，默认 new)、limit、cursor、facets (第一页默认返回分面计数)
+# 分类 / 价格档计数来自触发器维护的 product_facet_count，按商品版本号缓存，切换筛选条件不再扫描 products；
+# 指定 seller 时按 (owner_id, status) 索引读取该卖家的商品精确计数
+PRICE_EDGES = (10, 50, 100, 200, 500, 1000, 5000)    # 与 migrations/0006 中 INTERVAL 的参数一致
+
+# sort -> (排序列, 是否倒序)
+BROWSE_SORTS = {
+    "new": ("create_time", True),
+    "price_asc": ("price", False),
+    "price_desc": ("price", True),
+}
+
+def price_bucket(price):
+    # 与 MySQL 的 INTERVAL(price, ...) 相同: 落在 [PRICE_EDGES[i-1], PRICE_EDGES[i]) 的价格属于第 i 档
+    return bisect_right(PRICE_EDGES, price)
+
+def parse_price(value):
+    if value in (None, ""):
+        return None
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(value)
+    if not price.is_finite() or price < 0:
+        raise ValueError(value)
+    return price
+
+def parse_browse_args(args):
+    # 返回筛选条件 dict 或 错误信息
+    statuses = [s for s in args.get("status", "active").split(",") if s]
+    if not statuses or any(s not in PRODUCT_STATUSES for s in statuses):
+        return "无效的商品状态"
+    sort = args.get("sort", "new")
+    if sort not in BROWSE_SORTS:
+        return "sort 只能是 new、price_asc 或 price_desc"
+    try:
+        min_price = parse_price(args.get("min_price"))
+        max_price = parse_price(args.get("max_price"))
+    except ValueError:
+        return "无效的价格"
+    if min_price is not None and max_price is not None and min_price >= max_price:
+        return "min_price 必须小于 max_price"
+
+    after = None
+    cursor_arg = args.get("cursor")
+    if cursor_arg:
+        after = decode_cursor(cursor_arg, 2)
+        if not after:
+            return "无效的分页游标"
+
+    filters = {
+        "statuses": sorted(set(statuses)),
+        "categories": sorted({c for c in args.get("category", "").split(",") if c}),
+        "min_price": min_price,
+        "max_price": max_price,
+        "seller": args.get("seller") or None,
+        "sort": sort,
+        "after": after,
+        "limit": parse_limit(args.get("limit")),
+        "facets": args.get("facets", "0" if cursor_arg else "1") == "1",
+    }
+    key_parts = [filters[name] for name in ("statuses", "categories", "min_price", "max_price", "seller",
+                                            "sort", "limit", "facets")]
+    filters["key"] = f"browse:v{product_cache.version('products')}:{key_parts}:{cursor_arg or ''}"
+    return filters
+
+def browse_query(filters):
+    placeholders = ", ".join(["%s"] * len(filters["statuses"]))
+    conditions = [f"p.status IN ({placeholders})"]
+    params = list(filters["statuses"])
+    if filters["categories"]:
+        placeholders = ", ".join(["%s"] * len(filters["categories"]))
+        conditions.append(f"p.category_id IN ({placeholders})")
+        params += filters["categories"]
+    if filters["min_price"] is not None:
+        conditions.append("p.price >= %s")
+        params.append(filters["min_price"])
+    if filters["max_price"] is not None:
+        conditions.append("p.price < %s")
+        params.append(filters["max_price"])
+    if filters["seller"]:
+        conditions.append("p.owner_id = %s")
+        params.append(filters["seller"])
+
+    column, desc = BROWSE_SORTS[filters["sort"]]
+    if filters["after"]:
+        op = "<" if desc else ">"
+        conditions.append(f"(p.{column} {op} %s OR (p.{column} = %s AND p.product_id {op} %s))")
+        params += [filters["after"][0], filters["after"][0], filters["after"][1]]
+    order = "DESC" if desc else "ASC"
+    params.append(filters["limit"] + 1)
+
+    sql = f"""
+        {PRODUCT_SELECT}
+        WHERE {" AND ".join(conditions)}
+        ORDER BY p.{column} {order}, p.product_id {order}
+        LIMIT %s
+    """
+    return sql, params
+
+def load_facet_cells(cursor, statuses):
+    placeholders = ", ".join(["%s"] * len(statuses))
+    cursor.execute(f"""
+        SELECT category_id, price_bucket, product_count
+        FROM product_facet_count
+        WHERE status IN ({placeholders}) AND product_count > 0
+    """, statuses)
+    return [[row["category_id"], row["price_bucket"], row["product_count"]] for row in cursor.fetchall()]
+
+def load_category_names(cursor):
+    cursor.execute(CATEGORIES_SQL)
+    return {row["category_id"]: row["category_name"] for row in cursor.fetchall()}
+
+def count_facets(items, categories):
+    # items: (category_id, price_bucket, 商品数, 是否满足价格条件)
+    # 分类计数不受分类筛选影响，价格档计数不受价格筛选影响，总数两者都满足
+    by_category = Counter()
+    by_price = [0] * (len(PRICE_EDGES) + 1)
+    total = 0
+    for category_id, bucket, count, in_price in items:
+        in_category = not categories or category_id in categories
+        if in_price:
+            by_category[category_id] += count
+        if in_category:
+            by_price[bucket] += count
+        if in_price and in_category:
+            total += count
+    return by_category, by_price, total
+
+def browse_facets(cursor, filters):
+    low, high = filters["min_price"], filters["max_price"]
+    if filters["seller"]:
+        placeholders = ", ".join(["%s"] * len(filters["statuses"]))
+        cursor.execute(f"""
+            SELECT category_id, price FROM products
+            WHERE owner_id = %s AND status IN ({placeholders})
+        """, [filters["seller"], *filters["statuses"]])
+        items = ((row["category_id"] or "", price_bucket(row["price"]), 1,
+                  (low is None or row["price"] >= low) and (high is None or row["price"] < high))
+                 for row in cursor.fetchall())
+        approximate = False
+    else:
+        key = f"facets:v{product_cache.version('products')}:{','.join(filters['statuses'])}"
+        cells = product_cache.get_or_load(key, lambda: load_facet_cells(cursor, filters["statuses"]))
+        # 计数表按价格档统计，价格区间不在档位边界上时按覆盖到的档位计数
+        first = price_bucket(low) if low is not None else 0
+        last = bisect_left(PRICE_EDGES, high) if high is not None else len(PRICE_EDGES)
+        items = ((category_id, bucket, count, first <= bucket <= last) for category_id, bucket, count in cells)
+        approximate = (low is not None and low != 0 and low not in PRICE_EDGES) or \
+                      (high is not None and high not in PRICE_EDGES)
+
+    by_category, by_price, total = count_facets(items, set(filters["categories"]))
+    names = product_cache.get_or_load("categories:names", lambda: load_category_names(cursor))
+    bounds = (0,) + PRICE_EDGES + (None,)
+    return {
+        "categories": [
+            {"category_id": category_id or None, "category_name": names.get(category_id), "count": count}
+            for category_id, count in by_category.most_common() if count > 0
+        ],
+        "prices": [
+            {"min_price": bounds[i], "max_price": bounds[i + 1], "count": count}
+            for i, count in enumerate(by_price)
+        ],
+        "count": total,
+        "approximate": approximate,
+    }
+
+def load_browse_page(filters):
+    conn = get_db_connection()
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        column = BROWSE_SORTS[filters["sort"]][0]
+        cursor.execute(*browse_query(filters))
+        rows = cursor.fetchall()
+        next_cursor = None
+        if len(rows) > filters["limit"]:
+            rows = rows[:filters["limit"]]
+            next_cursor = encode_cursor(rows[-1][column], rows[-1]["product_id"])
+        page = {"products": [product_from_row(p) for p in rows], "next_cursor": next_cursor}
+        if filters["facets"]:
+            page["facets"] = browse_facets(cursor, filters)
+        return page
+    finally:
+        cursor.close()
+        conn.close()
+
+def browse_etag():
+    # 分面里带有分类名称，与 categories_etag 一样按 TTL 周期轮换
+    period = int(time.time() // product_cache.ttl)
+    return weak_etag("browse", f"{product_cache.tag('products')}.{period:x}")
+
+@product_bp.route("/browse_products", methods=["GET"])
+@conditional(browse_etag)
+def browse_products():
+    filters = parse_browse_args(request.args)
+    if isinstance(filters, str):
+        return jsonify({"message": filters}), 400
+
+    try:
+        page = product_cache.get_or_load(filters["key"], lambda: load_browse_page(filters))
+        return jsonify({**page, "message": "获取成功"}), 200
+    except Exception as e:
+        print(f"[ERROR] 分面浏览失败: {e}")
+        return jsonify({"message": "服务器内部错误"}), 500
+
+# 个性化首页: 推荐列表由 feed.py 的后台任务预先写入 user_feed，这里只按主键顺序读取一段
+# 参数: limit, cursor (上一页返回的 next_cursor)；还没有推荐列表的用户返回最新商品的第一页
+def load_feed_page(user_name, after, limit):
+    conn = get_db_connection()
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        cursor.execute(FEED_SQL, (user_name, after, limit + 1))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["position"])
+    return {"products": [product_from_row(p) for p in rows], "next_cursor": next_cursor}
+
+@product_bp.route("/feed", methods=["GET"])
+def get_feed():
+    token = request.headers.get("Authorization")
+    user_name = verify_token(token)
+    if not user_name:
+        return jsonify({"message": "未登录"}), 403
+
+    limit = parse_limit(request.args.get("limit"))
+    after = 0
+    cursor_arg = request.args.get("cursor")
+    if cursor_arg:
+        values = decode_cursor(cursor_arg, 1)
+        if not values or not values[0].isdigit():
+            return jsonify({"message": "无效的分页游标"}), 400
+        after = int(values[0])
+
+    try:
+        page = load_feed_page(user_name, after, limit)
+        if page["products"] or after:
+            return jsonify({**page, "personalized": True, "message": "获取成功"}), 200
+        # 新用户或推荐尚未生成: 复用 get_products 的缓存第一页
+        key = f"products:v{product_cache.version('products')}:active:{limit}:"
+        latest = product_cache.get_or_load(key, lambda: load_product_page(["active"], None, limit))
+        return jsonify({"products": latest["products"], "next_cursor": None,
+                        "personalized": False, "message": "获取成功"}), 200
+    except Exception as e:
+        print(f"[ERROR] 获取首页推荐失败: {e}")
+        return jsonify({"message": "服务器内部错误"}), 500
@@ -1,6 +1,9 @@
 from flask import Blueprint, request, jsonify
 from db import get_db_connection
 from utils import verify_token
+from routes.product import invalidate_products
+from cache import product_cache
+from httpcache import conditional, weak_etag
 import pymysql
 
 user_bp = Blueprint('user', __name__)
@@ -70,6 +73,11 @@ def update_user_info():
         """
         cursor.execute(sql, (nickname, avatar_url, phone, intro, user_name))
         conn.commit()
+        product_cache.bump(f"user:{user_name}")
+
+        # 商品缓存里带有卖家昵称和头像，需要一并失效
+        cursor.execute("SELECT product_id FROM products WHERE owner_id = %s", (user_name,))
+        invalidate_products(*(row[0] for row in cursor.fetchall()))
 
         print(f"[UPDATE] 用户 {user_name} 更新了资料")
         return jsonify({"message": "用户信息更新成功"}), 200
@@ -84,38 +92,45 @@ def update_user_info():
 
 # 获取指定用户信息
 # API: GET /api/user/<id>
+TARGET_USER_SQL = """
+    SELECT user_name, nickname, avatar_url, phone, intro, create_time 
+    FROM users 
+    WHERE user_name = %s
+"""
+
+def target_user_result(user):
+    return {
+        "user_name": user["user_name"],
+        "nickname": user["nickname"],
+        "avatar_url": user["avatar_url"],
+        "phone": user["phone"],
+        "intro": user["intro"],
+        "created_at": str(user["create_time"]) if user["create_time"] else None,
+        "message": "获取成功"
+    }
+
+def target_user_etag(target_id):
+    # 资料只由 /update_user 修改，它会 bump 这个版本号
+    return weak_etag("user", product_cache.tag(f"user:{target_id}"))
+
 @user_bp.route("/user/<target_id>", methods=["GET"])
+@conditional(target_user_etag)
 def get_target_user_info(target_id):
     conn = get_db_connection()
     cursor = conn.cursor(pymysql.cursors.DictCursor)
 
     try:
-        sql = """
-            SELECT user_name, nickname, avatar_url, phone, intro, create_time 
-            FROM users 
-            WHERE user_name = %s
-        """
-        cursor.execute(sql, (target_id,))
+        cursor.execute(TARGET_USER_SQL, (target_id,))
         user = cursor.fetchone()
 
         if not user:
             return jsonify({"message": "用户不存在"}), 404
-        
-        response_data = {
-            "user_name": user["user_name"],
-            "nickname": user["nickname"],
-            "avatar_url": user["avatar_url"],
-            "phone": user["phone"],
-            "intro": user["intro"],
-            "created_at": str(user["create_time"]) if user["create_time"] else None,
-            "message": "获取成功"
-        }
-
-        return jsonify(response_data), 200
+
+        return jsonify(target_user_result(user)), 200
 
     except Exception as e:
         print(f"[ERROR] 获取指定用户信息失败: {e}")
         return jsonify({"message": "服务器内部错误"}), 500
     finally:
         cursor.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
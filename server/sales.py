@@ -0,0 +1,104 @@
+"""卖家销售汇总: seller_sales_daily 的查询与历史回填
+
+日常由 migrations/0009 中的触发器在下单、上下架时增量维护；首次上线或数据不一致时按卖家分批从 orders / products 重建:
+python sales.py backfill [--batch 200] [--sleep 0.1] [--seller 用户名]
+每批在一个事务内先删除这些卖家的汇总再整体写入，其他卖家的看板不受影响；历史的下架 / 删除时间取 update_time。
+"""
+import argparse
+import time
+
+from db import db_cursor
+
+SALES_CONFIG = {
+    'batch': 200,       # 每批重建的卖家数
+    'sleep': 0.1,       # 批次之间的停顿 (秒)，减轻对线上库的压力
+}
+LOCK_NAME = "buaadb_sales_backfill"
+
+# 看板: 区间内的逐日汇总 + 区间之前的在售商品数净变化，两条都是 seller_sales_daily 的主键范围读
+DAILY_SALES_SQL = """
+    SELECT day, category_id, revenue, units, listing_delta FROM seller_sales_daily
+    WHERE seller_id = %s AND day >= %s
+    ORDER BY day
+"""
+LISTING_BASE_SQL = """
+    SELECT category_id, SUM(listing_delta) AS listings FROM seller_sales_daily
+    WHERE seller_id = %s AND day < %s
+    GROUP BY category_id
+"""
+
+BACKFILL_SALES_SQL = """
+    INSERT INTO seller_sales_daily (seller_id, day, category_id, revenue, units)
+    SELECT o.seller_id, DATE(o.created_time), IFNULL(p.category_id, ''), SUM(p.price), COUNT(*)
+    FROM orders o JOIN products p ON p.product_id = o.product_id
+    WHERE o.seller_id IN ({sellers})
+    GROUP BY o.seller_id, DATE(o.created_time), IFNULL(p.category_id, '')
+"""
+# 每个商品发布当天 +1，不再在售的在售出 (或最后修改) 当天 -1，全部相加等于当前在售数
+BACKFILL_LISTINGS_SQL = """
+    INSERT INTO seller_sales_daily (seller_id, day, category_id, listing_delta)
+    SELECT owner_id, day, category_id, SUM(delta) FROM (
+        SELECT owner_id, DATE(create_time) AS day, IFNULL(category_id, '') AS category_id, 1 AS delta
+        FROM products WHERE owner_id IN ({sellers})
+        UNION ALL
+        SELECT p.owner_id, DATE(COALESCE(o.created_time, p.update_time, p.create_time)), IFNULL(p.category_id, ''), -1
+        FROM products p LEFT JOIN orders o ON o.product_id = p.product_id
+        WHERE p.owner_id IN ({sellers}) AND p.status <> 'active'
+    ) changes
+    GROUP BY owner_id, day, category_id
+    ON DUPLICATE KEY UPDATE listing_delta = VALUES(listing_delta)
+"""
+
+
+def rebuild_sellers(conn, cursor, sellers):
+    placeholders = ", ".join(["%s"] * len(sellers))
+    try:
+        cursor.execute(f"DELETE FROM seller_sales_daily WHERE seller_id IN ({placeholders})", sellers)
+        cursor.execute(BACKFILL_SALES_SQL.format(sellers=placeholders), sellers)
+        cursor.execute(BACKFILL_LISTINGS_SQL.format(sellers=placeholders), sellers * 2)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def backfill(batch=SALES_CONFIG['batch'], sleep=SALES_CONFIG['sleep'], sellers=None):
+    """按 user_name 顺序分批重建，返回重建的卖家数；另一个回填正在进行时返回 None"""
+    with db_cursor() as (conn, cursor):
+        cursor.execute("SELECT GET_LOCK(%s, 0)", (LOCK_NAME,))
+        if cursor.fetchone()[0] != 1:
+            return None
+        try:
+            if sellers:
+                rebuild_sellers(conn, cursor, sellers)
+                return len(sellers)
+
+            total, after = 0, ""
+            while True:
+                cursor.execute("SELECT user_name FROM users WHERE user_name > %s ORDER BY user_name LIMIT %s",
+                               (after, batch))
+                chunk = [row[0] for row in cursor.fetchall()]
+                if not chunk:
+                    return total
+                rebuild_sellers(conn, cursor, chunk)
+                total += len(chunk)
+                after = chunk[-1]
+                print(f"已重建 {total} 个用户 (至 {after})")
+                time.sleep(sleep)
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="卖家销售汇总")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--batch", type=int, default=SALES_CONFIG['batch'], help="每批重建的卖家数")
+    parser.add_argument("--sleep", type=float, default=SALES_CONFIG['sleep'], help="批次之间的停顿 (秒)")
+    parser.add_argument("--seller", action="append", help="只重建指定卖家，可重复")
+    args = parser.parse_args()
+
+    count = backfill(args.batch, args.sleep, args.seller)
+    if count is None:
+        print("另一个回填正在进行，跳过")
+    else:
+        print(f"✅ 重建了 {count} 个卖家的销售汇总")
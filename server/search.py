@@ -0,0 +1,206 @@
+import heapq
+import math
+import re
+import threading
+import time
+from collections import Counter
+
+# 连续的中日韩字符按字切分，其他字母数字按单词切分
+_TOKEN_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[0-9a-zA-Z]+")
+_CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+
+TITLE_WEIGHT = 2
+REBUILD_SECONDS = 300
+
+
+def tokenize(text, for_query=False):
+    """文档侧对中文同时生成单字和二元组；查询侧长度>=2 的中文只用二元组"""
+    tokens = []
+    for run in _TOKEN_RE.findall(text or ""):
+        if not _CJK_RE.match(run):
+            tokens.append(run.lower())
+            continue
+        bigrams = [run[i:i + 2] for i in range(len(run) - 1)]
+        if for_query:
+            tokens.extend(bigrams or [run])
+        else:
+            tokens.extend(run)
+            tokens.extend(bigrams)
+    return tokens
+
+
+class SearchIndex:
+    """商品标题/描述的倒排索引，BM25 排序"""
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._postings = {}     # token -> {doc_id: tf}
+        self._doc_terms = {}    # doc_id -> Counter
+        self._doc_len = {}
+        self._total_len = 0
+        self._journal = None    # 重建期间的写入日志
+        self.built_at = None
+
+    def _doc_counter(self, title, description):
+        terms = Counter()
+        for token in tokenize(title):
+            terms[token] += TITLE_WEIGHT
+        terms.update(tokenize(description))
+        return terms
+
+    def _add_locked(self, doc_id, title, description):
+        self._remove_locked(doc_id)
+        terms = self._doc_counter(title, description)
+        for token, tf in terms.items():
+            self._postings.setdefault(token, {})[doc_id] = tf
+        self._doc_terms[doc_id] = terms
+        length = sum(terms.values())
+        self._doc_len[doc_id] = length
+        self._total_len += length
+
+    def _remove_locked(self, doc_id):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for token in terms:
+            docs = self._postings.get(token)
+            if docs is not None:
+                docs.pop(doc_id, None)
+                if not docs:
+                    del self._postings[token]
+        self._total_len -= self._doc_len.pop(doc_id)
+
+    def build(self, rows):
+        # rows: (doc_id, title, description)
+        self.rebuild(lambda: rows)
+
+    def rebuild(self, loader):
+        """在新对象里建好后整体替换；从开始读取数据起的 add / update / remove 先照常作用于当前索引，
+        同时记入日志，替换前在新索引上按顺序重放，读取快照前后发生的写入都不会丢失"""
+        with self._lock:
+            self._journal = []
+        try:
+            fresh = SearchIndex(self.k1, self.b)
+            for doc_id, title, description in loader():
+                fresh._add_locked(doc_id, title, description)
+            with self._lock:
+                # 重放是幂等的: 快照里已包含的写入再执行一次结果不变
+                for op, args in self._journal:
+                    fresh._apply_locked(op, *args)
+                self._postings = fresh._postings
+                self._doc_terms = fresh._doc_terms
+                self._doc_len = fresh._doc_len
+                self._total_len = fresh._total_len
+                self.built_at = time.time()
+        finally:
+            with self._lock:
+                self._journal = None
+
+    def ensure_fresh(self, loader):
+        # 首次查询时同步建索引 (此前没有可用的索引)；之后过期时在后台线程重建，查询继续使用旧索引，
+        # 多进程部署下各进程以此定期吸收其他进程的写入
+        if self.built_at is None:
+            with self._build_lock:
+                if self.built_at is None:
+                    self.rebuild(loader)
+            return
+        if self._is_stale() and self._build_lock.acquire(blocking=False):
+            threading.Thread(target=self._rebuild_in_background, args=(loader,), daemon=True).start()
+
+    def _rebuild_in_background(self, loader):
+        try:
+            self.rebuild(loader)
+        except Exception as e:
+            print(f"[ERROR] 重建搜索索引失败: {e}")
+        finally:
+            self._build_lock.release()
+
+    def _is_stale(self):
+        return self.built_at is None or time.time() - self.built_at > REBUILD_SECONDS
+
+    def _apply_locked(self, op, doc_id, *args):
+        if op == "add":
+            self._add_locked(doc_id, *args)
+        elif op == "update":
+            # 只更新已在索引中的商品 (已售出/已删除的不会被重新加入)
+            if doc_id in self._doc_terms:
+                self._add_locked(doc_id, *args)
+        else:
+            self._remove_locked(doc_id)
+
+    def _write(self, op, *args):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((op, args))
+            if self.built_at is not None:
+                self._apply_locked(op, *args)
+
+    def add(self, doc_id, title, description):
+        self._write("add", doc_id, title, description)
+
+    def update(self, doc_id, title, description):
+        self._write("update", doc_id, title, description)
+
+    def remove(self, doc_id):
+        self._write("remove", doc_id)
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def search(self, query, mode="and", offset=0, limit=20):
+        """空格分隔多个关键词，mode=and 要求全部命中，mode=or 命中任一即可
+        返回 (当前页的 doc_id 列表, 命中总数)"""
+        keywords = [tokenize(k, for_query=True) for k in query.split()]
+        keywords = [k for k in keywords if k]
+        if not keywords:
+            return [], 0
+
+        with self._lock:
+            matched = None
+            for tokens in keywords:
+                # 一个关键词的所有 token 都出现才算命中该关键词，从最短的倒排表开始求交
+                postings = sorted((self._postings.get(t, {}) for t in tokens), key=len)
+                docs = set(postings[0])
+                for posting in postings[1:]:
+                    if not docs:
+                        break
+                    docs.intersection_update(posting.keys())
+                if matched is None:
+                    matched = docs
+                elif mode == "or":
+                    matched |= docs
+                else:
+                    matched &= docs
+
+            if not matched:
+                return [], 0
+
+            n = len(self._doc_terms)
+            avg_len = self._total_len / n
+            weighted = []
+            for token in {t for tokens in keywords for t in tokens}:
+                posting = self._postings.get(token)
+                if posting:
+                    idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                    weighted.append((idf, posting))
+
+            k1, b, doc_len = self.k1, self.b, self._doc_len
+            scores = {}
+            for doc_id in matched:
+                norm = k1 * (1 - b + b * doc_len[doc_id] / avg_len)
+                score = 0.0
+                for idf, posting in weighted:
+                    tf = posting.get(doc_id)
+                    if tf:
+                        score += idf * tf * (k1 + 1) / (tf + norm)
+                scores[doc_id] = score
+
+        # 只需要前 offset+limit 名，用堆代替全量排序
+        top = heapq.nsmallest(offset + limit, scores, key=lambda d: (-scores[d], d))
+        return top[offset:], len(scores)
+
+
+product_index = SearchIndex()
@@ -0,0 +1,237 @@
+"""相似商品: 由收藏 (favorite_item) 与购买 (orders) 的共现离线计算每个商品的前 K 个邻居，写入 product_similar
+
+用户 x 商品的 0/1 稀疏矩阵 X，共现矩阵 C = Xᵀ·X，C[i][j] 为同时收藏 / 购买过 i 和 j 的人数；
+相似度取 cosine = C[i][j] / sqrt(n_i·n_j) 或 jaccard = C[i][j] / (n_i + n_j - C[i][j])，n_i 为 i 的人数。
+计算量约为每个用户商品数的平方之和，只统计 window_days 内的行为、每个用户只取最近 max_items_per_user 件，
+重建耗时因此有上界；写回时只改动邻居列表发生变化的商品。
+
+需要 numpy、scipy (只有本脚本使用，服务进程不需要):
+python similar.py build [--metric cosine|jaccard]
+python similar.py bench --favorites 1000000     (合成数据测量构建耗时，不访问数据库)
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from cache import product_cache
+from db import StreamingQuery, db_cursor
+
+SIMILAR_CONFIG = {
+    'top_k': 20,                # 每个商品保存的邻居数；详情页只展示其中在售的前 SIMILAR_LIMIT 个
+    'metric': 'cosine',         # cosine 或 jaccard
+    'min_common': 2,            # 共现人数少于该值的商品对视为噪声
+    'window_days': 365,         # 只统计最近一段时间的收藏 / 购买
+    'max_items_per_user': 200,  # 每个用户只取最近的若干件，避免少数重度用户让 Xᵀ·X 的计算量平方增长
+    'write_batch': 500,         # 每个事务写回的商品数
+}
+LOCK_NAME = "buaadb_similar"
+SIMILAR_LIMIT = 10
+
+INTERACTIONS_SQL = """
+    SELECT f.user_id, fi.product_id, fi.created_time
+    FROM favorites f JOIN favorite_item fi ON fi.favorite_id = f.favorite_id
+    WHERE fi.created_time >= %s
+    UNION ALL
+    SELECT buyer_id, product_id, created_time FROM orders WHERE created_time >= %s
+"""
+
+# 详情接口: product_similar 主键范围扫描 + 按主键取商品，已售出 / 下架的邻居跳过
+SIMILAR_SQL = """
+    SELECT p.product_id, p.product_title, p.price, p.img_url, s.score
+    FROM product_similar s
+    JOIN products p ON p.product_id = s.similar_id
+    WHERE s.product_id = %s AND p.status = 'active'
+    ORDER BY s.position
+    LIMIT %s
+"""
+
+
+def encode_interactions(rows):
+    """(user_id, product_id, 时间) 序列 -> 整数编号的 numpy 数组 (users, items, times) 与编号到商品 id 的列表"""
+    import numpy as np
+
+    user_index, item_index, item_ids = {}, {}, []
+    users, items, times = [], [], []
+    for user_id, product_id, created in rows:
+        users.append(user_index.setdefault(user_id, len(user_index)))
+        item = item_index.get(product_id)
+        if item is None:
+            item = item_index[product_id] = len(item_ids)
+            item_ids.append(product_id)
+        items.append(item)
+        times.append(created.timestamp())
+    return (np.array(users, dtype=np.int64), np.array(items, dtype=np.int64),
+            np.array(times, dtype=np.float64), item_ids)
+
+
+def _rank_in_group(groups):
+    # groups 已排好序: 返回每个元素在所属分组中的序号 (0, 1, 2, ...)
+    import numpy as np
+
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    sizes = np.diff(np.r_[starts, len(groups)])
+    return np.arange(len(groups)) - np.repeat(starts, sizes)
+
+
+def bound_interactions(users, items, times, max_items_per_user):
+    """去掉重复的 (用户, 商品) 对，每个用户只保留最近的 max_items_per_user 件"""
+    import numpy as np
+
+    n_items = int(items.max()) + 1 if len(items) else 0
+    pairs = users * n_items + items
+    order = np.lexsort((-times, pairs))
+    _, first = np.unique(pairs[order], return_index=True)
+    keep = order[first]
+    users, items, times = users[keep], items[keep], times[keep]
+
+    order = np.lexsort((-times, users))
+    users, items = users[order], items[order]
+    recent = _rank_in_group(users) < max_items_per_user
+    return users[recent], items[recent]
+
+
+def top_neighbours(users, items, n_items, config=SIMILAR_CONFIG):
+    """返回 (商品, 邻居, 得分) 三个数组，按商品、得分从高到低排序，每个商品至多 top_k 个邻居"""
+    import numpy as np
+    from scipy import sparse
+
+    n_users = int(users.max()) + 1 if len(users) else 0
+    x = sparse.csr_matrix((np.ones(len(users), dtype=np.int32), (users, items)), shape=(n_users, n_items))
+    counts = np.bincount(items, minlength=n_items)
+
+    co = (x.T @ x).tocoo()
+    mask = (co.row != co.col) & (co.data >= config['min_common'])
+    rows, cols, common = co.row[mask], co.col[mask], co.data[mask].astype(np.float64)
+    if config['metric'] == 'jaccard':
+        scores = common / (counts[rows] + counts[cols] - common)
+    else:
+        scores = common / np.sqrt(counts[rows].astype(np.float64) * counts[cols])
+
+    order = np.lexsort((cols, -scores, rows))
+    rows, cols, scores = rows[order], cols[order], scores[order]
+    top = _rank_in_group(rows) < config['top_k']
+    return rows[top], cols[top], scores[top]
+
+
+def neighbour_lists(rows, cols, scores, item_ids):
+    """转为 {商品 id: [(邻居 id, 得分), ...]}；得分保留 6 位小数，写回时据此判断列表是否变化"""
+    lists = {}
+    for row, col, score in zip(rows.tolist(), cols.tolist(), scores.tolist()):
+        lists.setdefault(item_ids[row], []).append((item_ids[col], round(score, 6)))
+    return lists
+
+
+def compute(rows, config=SIMILAR_CONFIG):
+    """从 (user_id, product_id, 时间) 行计算邻居列表，返回 (lists, 各阶段耗时与规模)"""
+    stats = {}
+    started = time.perf_counter()
+    users, items, times, item_ids = encode_interactions(rows)
+    stats['interactions'] = len(users)
+    stats['load_s'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    users, items = bound_interactions(users, items, times, config['max_items_per_user'])
+    stats['kept'] = len(users)
+    rows, cols, scores = top_neighbours(users, items, len(item_ids), config)
+    stats['pairs'] = len(rows)
+    stats['compute_s'] = time.perf_counter() - started
+
+    lists = neighbour_lists(rows, cols, scores, item_ids)
+    stats['products'] = len(lists)
+    return lists, stats
+
+
+def load_current(cursor):
+    cursor.execute("SELECT product_id, similar_id, score FROM product_similar ORDER BY product_id, position")
+    current = {}
+    for product_id, similar_id, score in cursor.fetchall():
+        current.setdefault(product_id, []).append((similar_id, round(score, 6)))
+    return current
+
+
+def write_changes(conn, cursor, lists, current, batch):
+    """只重写邻居列表变化的商品，不再有邻居的商品删除；返回 (更新数, 删除数)"""
+    changed = [pid for pid, neighbours in lists.items() if current.get(pid) != neighbours]
+    removed = [pid for pid in current if pid not in lists]
+    stale = changed + removed
+    for i in range(0, len(stale), batch):
+        chunk = stale[i:i + batch]
+        placeholders = ", ".join(["%s"] * len(chunk))
+        cursor.execute(f"DELETE FROM product_similar WHERE product_id IN ({placeholders})", chunk)
+        values = [(pid, position + 1, similar_id, score)
+                  for pid in chunk for position, (similar_id, score) in enumerate(lists.get(pid, ()))]
+        if values:
+            cursor.executemany("INSERT INTO product_similar (product_id, position, similar_id, score) "
+                               "VALUES (%s, %s, %s, %s)", values)
+        conn.commit()
+    return len(changed), len(removed)
+
+
+def build(config=SIMILAR_CONFIG):
+    """重建 product_similar，返回统计信息；另一个进程正在构建时返回 None"""
+    with db_cursor() as (conn, cursor):
+        cursor.execute("SELECT GET_LOCK(%s, 0)", (LOCK_NAME,))
+        if cursor.fetchone()[0] != 1:
+            return None
+        try:
+            since = datetime.now() - timedelta(days=config['window_days'])
+            query = StreamingQuery(INTERACTIONS_SQL, (since, since))
+            rows = ((r["user_id"], r["product_id"], r["created_time"]) for r in query)
+            lists, stats = compute(rows, config)
+
+            started = time.perf_counter()
+            stats['updated'], stats['removed'] = write_changes(conn, cursor, lists, load_current(cursor),
+                                                               config['write_batch'])
+            stats['write_s'] = time.perf_counter() - started
+            if stats['updated'] or stats['removed']:
+                # 详情接口的相似商品缓存和 ETag 随版本号失效 (内存缓存后端在各进程内，最迟 TTL 后更新)
+                product_cache.bump("similar")
+            return stats
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+
+
+def synthetic(favorites, users, products, seed=0):
+    """合成收藏数据: 商品热度服从长尾分布，时间分布在最近一年内"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / (np.arange(products) + 10)
+    item = rng.choice(products, size=favorites, p=weights / weights.sum())
+    user = rng.integers(0, users, size=favorites)
+    now = datetime.now().timestamp()
+    ts = now - rng.random(favorites) * 365 * 86400
+    return ((f"u{u}", f"p{i}", datetime.fromtimestamp(t)) for u, i, t in zip(user.tolist(), item.tolist(), ts.tolist()))
+
+
+def print_stats(stats):
+    print(f"行为 {stats['interactions']} 条 (截断后 {stats['kept']})，"
+          f"{stats['products']} 个商品共 {stats['pairs']} 个邻居")
+    print(f"读取 {stats['load_s']:.2f}s  计算 {stats['compute_s']:.2f}s" +
+          (f"  写回 {stats['write_s']:.2f}s (更新 {stats['updated']}，删除 {stats['removed']})"
+           if 'write_s' in stats else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="离线计算相似商品")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_p = sub.add_parser("build", help="从数据库重建 product_similar")
+    bench_p = sub.add_parser("bench", help="合成数据测量构建耗时")
+    bench_p.add_argument("--favorites", type=int, default=1000000)
+    bench_p.add_argument("--users", type=int, default=100000)
+    bench_p.add_argument("--products", type=int, default=50000)
+    for p in (build_p, bench_p):
+        p.add_argument("--metric", choices=["cosine", "jaccard"], default=SIMILAR_CONFIG['metric'])
+        p.add_argument("--top-k", type=int, default=SIMILAR_CONFIG['top_k'])
+    args = parser.parse_args()
+
+    config = {**SIMILAR_CONFIG, 'metric': args.metric, 'top_k': args.top_k}
+    if args.command == "build":
+        stats = build(config)
+        if stats is None:
+            print("另一个进程正在构建，跳过")
+        else:
+            print_stats(stats)
+    else:
+        _, stats = compute(synthetic(args.favorites, args.users, args.products), config)
+        print_stats(stats)
@@ -0,0 +1,219 @@
+"""慢查询日志: 按 SQL 指纹聚合耗时，超过阈值的语句打印日志并抓取一次 EXPLAIN
+
+服务内查看: GET /metrics/slow_queries?top=20&sort=total_ms (需设置 BUAADB_ADMIN_TOKEN 并带请求头 X-Admin-Token)
+命令行查看: python slowlog.py --url http://127.0.0.1:5000 --top 20 --sort p99_ms --plan
+"""
+import argparse
+import hmac
+import json
+import os
+import queue
+import re
+import threading
+from collections import deque
+from functools import lru_cache
+
+SLOW_QUERY_CONFIG = {
+    'threshold_ms': 100,        # 超过该耗时的语句记为慢查询并打印日志
+    'explain': True,            # 每个指纹第一次变慢时在后台执行一次 EXPLAIN
+    'max_fingerprints': 500,    # 最多跟踪的指纹数
+    'samples': 1000,            # 每个指纹保留最近多少次耗时用于计算分位数
+    # 访问 /metrics/slow_queries 需带请求头 X-Admin-Token；未设置时接口一律拒绝 (统计中含 SQL 原文和执行计划)
+    'admin_token': os.environ.get("BUAADB_ADMIN_TOKEN"),
+}
+
+SORT_KEYS = ("total_ms", "p99_ms", "count", "slow_count")
+
+_COMMENT_RE = re.compile(r"/\*.*?\*/|--[^\n]*", re.S)
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_ROWS_RE = re.compile(r"\(\?\+\)(?:\s*,\s*\(\?\+\))+")
+_SPACE_RE = re.compile(r"\s+")
+_EXPLAINABLE_RE = re.compile(r"^\(?\s*(select|update|delete|insert|replace)\b")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """去掉字面量和占位符差异: IN (%s, %s, ...) 与多行 VALUES 折叠为一个，空白归一"""
+    sql = _COMMENT_RE.sub(" ", sql)
+    sql = _STRING_RE.sub("?", sql)
+    sql = sql.replace("%s", "?")
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _LIST_RE.sub("(?+)", sql)
+    sql = _ROWS_RE.sub("(?+)", sql)
+    return _SPACE_RE.sub(" ", sql).strip().lower()
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms=100, explain=True, max_fingerprints=500, samples=1000):
+        self.threshold = threshold_ms / 1000
+        self.explain = explain
+        self.max_fingerprints = max_fingerprints
+        self.samples = samples
+        self.dropped = 0
+        self._stats = {}    # fingerprint -> dict
+        self._lock = threading.Lock()
+        self._explain_queue = queue.Queue(maxsize=100)
+        self._worker = None
+
+    def record(self, sql, params, seconds):
+        if isinstance(sql, bytes):
+            sql = sql.decode("utf-8", "replace")
+        fp = fingerprint(sql)
+        if fp.startswith("explain"):
+            return
+        slow = seconds >= self.threshold
+        with self._lock:
+            stat = self._stats.get(fp)
+            if stat is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    self.dropped += 1
+                    return
+                stat = self._stats[fp] = {
+                    "count": 0, "slow_count": 0, "total": 0.0, "max": 0.0,
+                    "recent": deque(maxlen=self.samples), "plan": None,
+                }
+            stat["count"] += 1
+            stat["total"] += seconds
+            stat["max"] = max(stat["max"], seconds)
+            stat["recent"].append(seconds)
+            need_plan = False
+            if slow:
+                stat["slow_count"] += 1
+                need_plan = self.explain and stat["plan"] is None and _EXPLAINABLE_RE.match(fp)
+                if need_plan:
+                    stat["plan"] = "pending"
+        if slow:
+            print(f"[SLOW] {seconds * 1000:.1f}ms {fp}")
+        if need_plan:
+            self._queue_explain(fp, sql, params)
+
+    def _queue_explain(self, fp, sql, params):
+        # executemany 的参数是多组，取第一组即可得到执行计划
+        if isinstance(params, list) and params and isinstance(params[0], (tuple, list, dict)):
+            params = params[0]
+        try:
+            self._explain_queue.put_nowait((fp, sql, params))
+        except queue.Full:
+            self._set_plan(fp, None)
+            return
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._explain_loop, daemon=True)
+                    self._worker.start()
+
+    def _explain_loop(self):
+        # 在独立连接上执行 EXPLAIN，不影响触发它的请求
+        import pymysql
+        from db import db_cursor
+        while True:
+            fp, sql, params = self._explain_queue.get()
+            try:
+                with db_cursor(pymysql.cursors.DictCursor) as (conn, cursor):
+                    cursor.execute("EXPLAIN " + sql, params)
+                    plan = list(cursor.fetchall())
+            except Exception as e:
+                print(f"[ERROR] EXPLAIN 失败: {e}")
+                plan = [{"error": str(e)}]
+            self._set_plan(fp, plan)
+
+    def _set_plan(self, fp, plan):
+        # 统计可能已被清空，指纹不在时直接丢弃
+        with self._lock:
+            stat = self._stats.get(fp)
+            if stat is not None:
+                stat["plan"] = plan
+
+    def top(self, n=20, sort="total_ms"):
+        with self._lock:
+            items = [(fp, dict(stat, recent=sorted(stat["recent"]))) for fp, stat in self._stats.items()]
+        rows = []
+        for fp, stat in items:
+            recent = stat["recent"]
+            rows.append({
+                "fingerprint": fp,
+                "count": stat["count"],
+                "slow_count": stat["slow_count"],
+                "total_ms": round(stat["total"] * 1000, 3),
+                "avg_ms": round(stat["total"] / stat["count"] * 1000, 3),
+                "p50_ms": round(percentile(recent, 0.50) * 1000, 3),
+                "p95_ms": round(percentile(recent, 0.95) * 1000, 3),
+                "p99_ms": round(percentile(recent, 0.99) * 1000, 3),
+                "max_ms": round(stat["max"] * 1000, 3),
+                "plan": stat["plan"],
+            })
+        rows.sort(key=lambda row: row[sort if sort in SORT_KEYS else "total_ms"], reverse=True)
+        return rows[:n]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.dropped = 0
+
+
+slow_log = SlowQueryLog(**{k: v for k, v in SLOW_QUERY_CONFIG.items() if k != 'admin_token'})
+
+
+def init_app(app):
+    from flask import jsonify, request
+
+    import db
+    from utils import parse_limit
+
+    db.query_hooks.append(slow_log.record)
+
+    @app.route("/metrics/slow_queries", methods=["GET", "DELETE"])
+    def slow_queries():
+        token = SLOW_QUERY_CONFIG['admin_token']
+        if not token:
+            return jsonify({"message": "未启用: 设置 BUAADB_ADMIN_TOKEN 后访问"}), 403
+        # compare_digest 只接受 ASCII 字符串，按字节比较，非 ASCII 的请求头同样返回 403
+        if not hmac.compare_digest(request.headers.get("X-Admin-Token", "").encode(), token.encode()):
+            return jsonify({"message": "无权限"}), 403
+        if request.method == "DELETE":
+            slow_log.reset()
+            return jsonify({"message": "已清空"}), 200
+        limit = parse_limit(request.args.get("top"), default=20, maximum=500)
+        return jsonify({
+            "threshold_ms": slow_log.threshold * 1000,
+            "dropped": slow_log.dropped,
+            "queries": slow_log.top(limit, request.args.get("sort", "total_ms")),
+        }), 200
+
+
+def main():
+    from urllib.request import Request, urlopen
+
+    parser = argparse.ArgumentParser(description="查看服务端慢查询统计")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--sort", choices=SORT_KEYS, default="total_ms")
+    parser.add_argument("--plan", action="store_true", help="同时打印 EXPLAIN 结果")
+    args = parser.parse_args()
+
+    req = Request(f"{args.url.rstrip('/')}/metrics/slow_queries?top={args.top}&sort={args.sort}")
+    if SLOW_QUERY_CONFIG['admin_token']:
+        req.add_header("X-Admin-Token", SLOW_QUERY_CONFIG['admin_token'])
+    with urlopen(req) as resp:
+        data = json.load(resp)
+
+    print(f"阈值 {data['threshold_ms']:.0f}ms，未跟踪的指纹 {data['dropped']}")
+    print(f"{'count':>8} {'slow':>6} {'total_ms':>10} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  fingerprint")
+    for row in data["queries"]:
+        print(f"{row['count']:>8} {row['slow_count']:>6} {row['total_ms']:>10.1f} {row['p50_ms']:>8.2f} "
+              f"{row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['max_ms']:>8.2f}  {row['fingerprint']}")
+        if args.plan and isinstance(row["plan"], list):
+            for step in row["plan"]:
+                print(f"{'':>8} {json.dumps(step, ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,222 @@
+import base64
 import hashlib
+import hmac
+import json
+import os
 import secrets
+import threading
 import time
 
-token_store = {}
+from cache import CACHE_CONFIG
+
 TOKEN_EXPIRE_SECONDS = 24 * 3600
+# 所有 worker 必须使用同一个密钥，生产环境通过环境变量注入；
+# 未设置时使用进程内随机密钥 (只适合单进程开发，重启后已签发的 token 全部失效)，不能用写在代码里的固定值
+TOKEN_SECRET = os.environ.get("BUAADB_TOKEN_SECRET", "").encode("utf-8")
+if not TOKEN_SECRET:
+    print("[WARN] 未设置 BUAADB_TOKEN_SECRET，使用随机生成的 token 密钥；多 worker 部署必须设置该环境变量")
+    TOKEN_SECRET = secrets.token_bytes(32)
 
 def md5(text: str):
     return hashlib.md5(text.encode("utf-8")).hexdigest()
 
+
+class RevokedTokens:
+    """已注销 token 的 id 集合，条目在 token 自身过期后清除，内存只与有效期内的注销次数有关"""
+
+    def __init__(self):
+        self._expire = {}
+        self._lock = threading.Lock()
+        self._next_purge = 0
+
+    def add(self, jti: str, expire: float):
+        now = time.time()
+        with self._lock:
+            self._expire[jti] = expire
+            if now >= self._next_purge:
+                self._expire = {k: v for k, v in self._expire.items() if v > now}
+                self._next_purge = now + 60
+
+    def __contains__(self, jti: str) -> bool:
+        return jti in self._expire
+
+
+class RedisRevokedTokens:
+    """多 worker 共享的注销集合，依赖 Redis 的 key 过期自动清理"""
+
+    def __init__(self, url: str):
+        import redis
+        self._client = redis.Redis.from_url(url)
+
+    def add(self, jti: str, expire: float):
+        ttl = int(expire - time.time()) + 1
+        if ttl > 0:
+            self._client.set(f"revoked:{jti}", 1, ex=ttl)
+
+    def __contains__(self, jti: str) -> bool:
+        return bool(self._client.exists(f"revoked:{jti}"))
+
+
+revoked_tokens = RedisRevokedTokens(CACHE_CONFIG['redis_url']) if CACHE_CONFIG['backend'] == 'redis' else RevokedTokens()
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _sign(payload: str) -> str:
+    return _b64encode(_signature(payload.encode("ascii")))
+
+def _signature(payload: bytes) -> bytes:
+    return hmac.new(TOKEN_SECRET, payload, hashlib.sha256).digest()
+
 def generate_token(user_name: str) -> str:
-    token = secrets.token_urlsafe(32)
-    expire_time = time.time() + TOKEN_EXPIRE_SECONDS
-    token_store[token] = {
-        "user_name": user_name,
-        "expire": expire_time
+    # token = base64(载荷).base64(HMAC-SHA256 签名)，校验时无需查询任何共享状态
+    claims = {
+        "u": user_name,
+        "exp": int(time.time()) + TOKEN_EXPIRE_SECONDS,
+        "jti": secrets.token_hex(8),
     }
-    return token
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    return f"{payload}.{_sign(payload)}"
+
+def _decode_token(token: str) -> dict | None:
+    # token 来自请求头，任何格式错误都视为无效 token，不能抛出异常 (限流层对每个请求都会调用)
+    if not isinstance(token, str) or token.count(".") != 1:
+        return None
+    payload, signature = token.split(".")
+    try:
+        if not hmac.compare_digest(_b64decode(signature), _signature(payload.encode("ascii"))):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except (ValueError, TypeError, UnicodeError):
+        return None
+    if (not isinstance(claims, dict) or type(claims.get("exp")) is not int
+            or not isinstance(claims.get("u"), str) or not isinstance(claims.get("jti"), str)):
+        return None
+    if time.time() > claims["exp"] or claims["jti"] in revoked_tokens:
+        return None
+    return claims
 
 def verify_token(token: str) -> str | None:
-    if token not in token_store:
+    claims = _decode_token(token)
+    return claims["u"] if claims else None
+
+def revoke_token(token: str) -> bool:
+    claims = _decode_token(token)
+    if not claims:
+        return False
+    revoked_tokens.add(claims["jti"], claims["exp"])
+    return True
+
+def encode_cursor(*values) -> str:
+    # 分页游标: 把排序键编码成不透明字符串
+    raw = json.dumps([str(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str, size: int) -> list | None:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
         return None
-    data = token_store[token]
-    if time.time() > data["expire"]:
-        del token_store[token]
+    if not isinstance(values, list) or len(values) != size:
         return None
-    return data["user_name"]
\ No newline at end of file
+    return values
+
+# stream=1 时单页允许的最大行数
+STREAM_MAX_LIMIT = 100000
+
+def parse_limit(value, default: int = 20, maximum: int = 100) -> int:
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, maximum))
+
+class KeysetPage:
+    """流式分页: 查询取 limit + 1 行，只产出前 limit 行，多出一行时用最后产出的行生成 next_cursor"""
+
+    def __init__(self, rows, limit: int, cursor_of):
+        self._rows = rows
+        self._limit = limit
+        self._cursor_of = cursor_of
+        self.next_cursor = None
+
+    def __iter__(self):
+        last = None
+        for i, row in enumerate(self._rows):
+            if i == self._limit:
+                self.next_cursor = encode_cursor(*self._cursor_of(last))
+                return
+            last = row
+            yield row
+
+class AdmissionGate:
+    """按 key (如商品 id) 限制同时执行的请求数，超出的在进程内排队，队列满或等待超时返回 "busy"
+
+    release 时可给出最终结果 (例如商品已售出)，仍在排队的请求直接拿到该结果，不再访问数据库。
+    """
+
+    BUSY = "busy"
+
+    def __init__(self, concurrency=1, max_waiting=32, wait_timeout=2.0):
+        self.concurrency = concurrency
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.rejected = 0
+        self._slots = {}    # key -> {"cond", "active", "waiting", "final"}，无人使用时删除
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        """获得执行权时返回 None，否则返回 "busy" 或前一个请求留下的最终结果"""
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._slots[key] = {"cond": threading.Condition(self._lock),
+                                           "active": 0, "waiting": 0, "final": None}
+            if slot["final"] is None and slot["active"] >= self.concurrency:
+                if slot["waiting"] >= self.max_waiting:
+                    self.rejected += 1
+                    return self.BUSY
+                deadline = time.monotonic() + self.wait_timeout
+                slot["waiting"] += 1
+                while slot["final"] is None and slot["active"] >= self.concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    slot["cond"].wait(remaining)
+                slot["waiting"] -= 1
+                if slot["final"] is None and slot["active"] >= self.concurrency:
+                    self.rejected += 1
+                    self._discard(key, slot)
+                    return self.BUSY
+            if slot["final"] is not None:
+                final = slot["final"]
+                self._discard(key, slot)
+                return final
+            slot["active"] += 1
+            return None
+
+    def release(self, key, final=None):
+        with self._lock:
+            slot = self._slots[key]
+            slot["active"] -= 1
+            if final is not None:
+                slot["final"] = final
+                slot["cond"].notify_all()
+            else:
+                slot["cond"].notify()
+            self._discard(key, slot)
+
+    def _discard(self, key, slot):
+        if slot["active"] == 0 and slot["waiting"] == 0:
+            self._slots.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "keys": len(self._slots),
+                "waiting": sum(slot["waiting"] for slot in self._slots.values()),
+                "rejected": self.rejected,
+            }
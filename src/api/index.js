@@ -10,8 +10,9 @@ export const uploadFile = (data) => request.post('/upload', data, {
   headers: { 'Content-Type': 'multipart/form-data' }
 })
 
-export const getProducts = () => request.get('/get_products')
+export const getProducts = (params) => request.get('/get_products', { params })
 export const getProductDetail = (id) => request.get(`/product/${id}`)
+export const getProductsBatch = (ids) => request.post('/products/batch', { ids })
 export const createProduct = (data) => request.post('/create_product', data)
 export const modifyProduct = (data) => request.post('/modify_product', data)
 export const deleteProduct = (id) => request.delete(`/delete_product/${id}`)
@@ -47,7 +48,9 @@ export const deleteFavorite = (folderId, productId) =>
   request.delete(`/delete_favorite/${folderId}/product/${productId}`)
 
 export const publishComment = (data) => request.post('/publish_comment', data)
-export const getComments = (id) => request.get(`/get_comments/${id}`)
+export const getComments = (id, params) => request.get(`/get_comments/${id}`, { params })
 export const deleteComment = (id) => request.delete(`/delete_comment/${id}`)
 export const sendMsg = (data) => request.post('/send_msg', data)
-export const getMsgs = () => request.get('/get_msgs')
\ No newline at end of file
+export const getMsgs = (params) => request.get('/get_msgs', { params })
+// 长轮询，服务端最长挂起 30 秒
+export const pollMsgs = (params) => request.get('/poll_msgs', { params, timeout: 35000 })
\ No newline at end of file